@@ -0,0 +1,53 @@
+"""Corpus user story tổng hợp (có seed) cho benchmark.
+
+Gồm các story dạng "As a ..., I want to ... so that ..." (cả biến thể "As an",
+không có "so that") và free-text ("Export invoices as PDF", "The admin can ...").
+"""
+import random
+from typing import List
+
+ROLES = [
+    "user", "admin", "manager", "customer", "guest", "editor", "reviewer", "developer",
+    "registered member", "support agent", "account owner", "product owner",
+]
+ACTIONS = [
+    "view", "create", "delete", "update", "approve", "export", "search", "share",
+    "download", "upload", "archive", "schedule", "reset", "filter", "comment on",
+]
+OBJECTS = [
+    "report", "invoice", "profile", "order", "comment", "dashboard", "ticket", "document",
+    "password", "monthly sales report", "team calendar", "shopping cart", "user account",
+]
+BENEFITS = [
+    "I can save time", "I can track progress", "the team stays informed", "I do not lose data",
+    "I can find information quickly", "customers get faster answers",
+]
+FREE_TEXT = [
+    "{Action} the {object} from the settings page",
+    "The {role} can {action} every {object}",
+    "{Object} should be {action}ed automatically at night",
+    "Allow {role}s to {action} a {object} without logging in",
+    "Improve loading time of the {object} page",
+]
+
+
+def _article(word: str) -> str:
+    return "an" if word[0] in "aeiou" else "a"
+
+
+def make_story(rng: random.Random, free_text_ratio: float = 0.3) -> str:
+    role, action, obj = rng.choice(ROLES), rng.choice(ACTIONS), rng.choice(OBJECTS)
+    if rng.random() < free_text_ratio:
+        template = rng.choice(FREE_TEXT)
+        return template.format(role=role, action=action, object=obj,
+                               Action=action.capitalize(), Object=obj.capitalize())
+    story = f"As {_article(role)} {role}, I want to {action} the {obj}"
+    if rng.random() < 0.6:
+        story += f" so that {rng.choice(BENEFITS)}"
+    return story
+
+
+def generate_corpus(size: int, seed: int = 42, free_text_ratio: float = 0.3) -> List[str]:
+    """`size` story, cùng seed cho cùng corpus giữa các lần chạy / commit."""
+    rng = random.Random(seed)
+    return [make_story(rng, free_text_ratio) for _ in range(size)]
@@ -0,0 +1,282 @@
+"""Benchmark Phase1 -> Phase4 và route POST /api/analyze trên corpus tổng hợp.
+
+Mặc định chạy với STORAGE_BACKEND=memory và GRAPH_BACKEND=memory (không cần MySQL /
+Neo4j) để đo riêng chi phí NLP; dùng --database-url / --graph neo4j để đo cả I/O thật:
+
+    python -m benchmarks.pipeline_benchmark --sizes 100 10000 --output bench.json
+    python -m benchmarks.pipeline_benchmark --sizes 100000 --modes phases --request-size 1000
+    python -m benchmarks.pipeline_benchmark --profiles full deps-only fast
+
+Corpus được chia thành các request `--request-size` story. Với mỗi phase báo cáo
+stories/sec, latency p50/p95/p99 theo request, số round-trip DB (câu lệnh SQL) và
+graph (câu lệnh Cypher, theo batch UNWIND), và thay đổi RSS hiện tại của process
+(/proc/self/statm) qua phase; `process_peak_rss_mb` là peak từ lúc process khởi động
+(ru_maxrss, cộng dồn). Mỗi profile pipeline Phase1 (`--profiles`) được đo riêng trên cùng corpus;
+phase1 kèm số story đi qua regex fast path. Kết quả JSON kèm commit hiện tại để so
+sánh giữa các commit.
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import generate_corpus
+
+PHASES = ("phase1", "phase2", "phase3", "phase4")
+_BATCH_METHODS = ("merge_nodes", "merge_relationships", "delete_nodes")
+
+
+def _configure(storage: str, graph: str, database_url: str = None):
+    """Chọn backend trước khi import constant / database (đọc env lúc import)."""
+    os.environ["STORAGE_BACKEND"] = storage
+    os.environ["GRAPH_BACKEND"] = graph
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS của cả process từ lúc khởi động (cộng dồn, không đo riêng được từng phase)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class RoundTripCounter:
+    """Đếm câu lệnh SQL trên engine và câu lệnh graph qua CountingGraph."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.db = 0
+        self.graph = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.db += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"db": self.db, "graph": self.graph}
+
+
+class CountingGraph:
+    """Proxy của GraphDB / InMemoryGraphDB đếm số câu lệnh sẽ gửi tới Neo4j."""
+
+    def __init__(self, graph, counter: RoundTripCounter):
+        self._graph = graph
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._graph, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            if name in _BATCH_METHODS:
+                # GraphDB._run_batched: một tx.run mỗi batch_size rows
+                rows = kwargs.get("rows", kwargs.get("values", args[-1] if args else []))
+                batch_size = kwargs.get("batch_size", 1000)
+                self._counter.graph += math.ceil(len(rows) / max(batch_size, 1))
+            else:
+                self._counter.graph += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+def _latency_stats(seconds: List[float]) -> Dict[str, float]:
+    ms = np.array(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _summary(stories: int, seconds: List[float], round_trips: Dict[str, int]) -> Dict[str, Any]:
+    total = sum(seconds)
+    return {
+        "stories": stories,
+        "requests": len(seconds),
+        "seconds": round(total, 4),
+        "stories_per_sec": round(stories / total, 1) if total > 0 else None,
+        "latency": _latency_stats(seconds),
+        "db_round_trips": round_trips["db"],
+        "graph_round_trips": round_trips["graph"],
+        "process_peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _chunks(stories: List[str], size: int):
+    for offset in range(0, len(stories), size):
+        yield stories[offset:offset + size]
+
+
+def run_phases(stories: List[str], request_size: int, graph, counter: RoundTripCounter,
+               profile: str = "full") -> Dict[str, Any]:
+    """Chạy Phase1 -> Phase4 cho từng request, đo từng phase riêng."""
+    from services.phase1 import Phase1
+    from services.phase2 import Phase2
+    from services.phase3 import Phase3
+    from services.phase4 import Phase4
+    from services.model_registry import _current_rss_bytes
+
+    seconds = {name: [] for name in PHASES}
+    trips = {name: {"db": 0, "graph": 0} for name in PHASES}
+    # RSS hiện tại (không phải ru_maxrss) trước / sau mỗi lần chạy phase, bytes
+    rss_deltas = {name: [] for name in PHASES}
+    fast_path_stories = 0
+
+    def timed(name, fn, *args):
+        before = counter.snapshot()
+        rss_before = _current_rss_bytes()
+        started = time.perf_counter()
+        result = fn(*args)
+        seconds[name].append(time.perf_counter() - started)
+        rss_deltas[name].append(_current_rss_bytes() - rss_before)
+        after = counter.snapshot()
+        for key in trips[name]:
+            trips[name][key] += after[key] - before[key]
+        return result
+
+    for chunk in _chunks(stories, request_size):
+        phase1 = Phase1(profile=profile)
+        p1 = timed("phase1", phase1.process_text, chunk)
+        fast_path_stories += phase1.fast_path_stories
+        p2 = timed("phase2", Phase2().analyze_concepts, p1)
+        p3 = timed("phase3", Phase3().process_wordnet, p2)
+        timed("phase4", Phase4().persist_graph, p1, p3, graph)
+
+    report = {}
+    for name in PHASES:
+        report[name] = _summary(len(stories), seconds[name], trips[name])
+        # Tổng thay đổi RSS qua các request và lần tăng lớn nhất của một request (có thể âm)
+        report[name]["rss_delta_mb"] = round(sum(rss_deltas[name]) / (1024 * 1024), 1)
+        report[name]["rss_delta_max_mb"] = round(max(rss_deltas[name], default=0) / (1024 * 1024), 1)
+    report["phase1"]["fast_path_stories"] = fast_path_stories
+    totals = {key: sum(trips[name][key] for name in PHASES) for key in ("db", "graph")}
+    report["pipeline"] = _summary(len(stories), [sum(s) for s in zip(*seconds.values())], totals)
+    return report
+
+
+def run_http(stories: List[str], request_size: int, counter: RoundTripCounter) -> Dict[str, Any]:
+    """POST /api/analyze (qua pipeline executor như production) cho từng request."""
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    client = TestClient(app)  # không chạy lifespan: schema / model đã được chuẩn bị sẵn
+    seconds = []
+    before = counter.snapshot()
+    for chunk in _chunks(stories, request_size):
+        started = time.perf_counter()
+        response = client.post("/api/analyze", json={"user_stories": chunk})
+        seconds.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /api/analyze returned {response.status_code}: {response.text[:200]}")
+    after = counter.snapshot()
+    return _summary(len(stories), seconds, {key: after[key] - before[key] for key in before})
+
+
+def run(sizes: List[int], modes: List[str], request_size: int, seed: int, free_text_ratio: float,
+        profiles: List[str] = ("full",)) -> Dict[str, Any]:
+    import graphdb
+    import services.phase1
+    from constant import GRAPH_BACKEND, SPACY_MODEL, STORAGE_BACKEND
+    from database import get_database_manager
+    from services.model_registry import get_model_registry
+    from services.phase1.helpers import pipeline_disabled
+    from services.phase3.wordnet_index import get_lemma_index
+
+    from warmup import get_warmup_state
+
+    # Migrations qua bước warm-up "database" (route HTTP trả 503 khi bước này chưa ready)
+    warmup = get_warmup_state()
+    warmup.run(["database"])
+    if not warmup.is_ready(["database"]):
+        raise RuntimeError(f"database warm-up failed: {warmup.components['database']['error']}")
+    db_manager = get_database_manager()
+    counter = RoundTripCounter(db_manager.engine)
+    # Mọi caller của get_graph_db() (kể cả route HTTP) dùng proxy đếm round-trip
+    graph = CountingGraph(graphdb.get_graph_db(), counter)
+    graphdb._graph_db = graph
+
+    # Load model / lemma index trước khi đo
+    for profile in profiles:
+        get_model_registry().preload(SPACY_MODEL, pipeline_disabled(profile))
+    get_lemma_index()
+
+    results = []
+    for size in sizes:
+        stories = generate_corpus(size, seed=seed, free_text_ratio=free_text_ratio)
+        for profile in profiles:
+            entry = {"size": size, "profile": profile}
+            if "phases" in modes:
+                entry["phases"] = run_phases(stories, request_size, graph, counter, profile)
+            if "http" in modes:
+                # Phase1() trong route đọc profile mặc định từ module services.phase1
+                services.phase1.PHASE1_PROFILE = profile
+                entry["http"] = run_http(stories, request_size, counter)
+            results.append(entry)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "storage_backend": STORAGE_BACKEND,
+            "database": db_manager.engine.dialect.name,
+            "graph_backend": GRAPH_BACKEND,
+            "spacy_model": SPACY_MODEL,
+            "request_size": request_size,
+            "profiles": list(profiles),
+            "seed": seed,
+            "free_text_ratio": free_text_ratio,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000])
+    parser.add_argument('--modes', nargs='+', choices=['phases', 'http'], default=['phases', 'http'])
+    parser.add_argument('--request-size', type=int, default=100, help='số story mỗi request')
+    parser.add_argument('--storage', choices=['memory', 'sqlite', 'mysql'], default='memory')
+    parser.add_argument('--database-url', help='ghi đè --storage (vd. mysql+pymysql://u:p@host/bench)')
+    parser.add_argument('--graph', choices=['memory', 'neo4j'], default='memory')
+    parser.add_argument('--profiles', nargs='+', choices=['full', 'deps-only', 'fast'], default=['full'],
+                        help='profile pipeline Phase1 cần đo')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--free-text-ratio', type=float, default=0.3)
+    parser.add_argument('--output', help='ghi kết quả JSON ra file')
+    args = parser.parse_args()
+
+    _configure(args.storage, args.graph, args.database_url)
+    report = run(args.sizes, args.modes, args.request_size, args.seed, args.free_text_ratio,
+                 args.profiles)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark insert / lookup của concepts trước và sau migration index (0002).
+
+Chạy trên một database trống (bảng sẽ bị drop!):
+
+    python -m benchmarks.schema_benchmark --database-url mysql+pymysql://u:p@host/bench --stories 20000
+
+Chạy lại với UUID_STORAGE=binary để so sánh VARCHAR(36) với BINARY(16).
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, insert, select
+
+from constant import UUID_STORAGE
+from migrations import run_migrations, schema_migrations
+from migrations.versions import v0002_lookup_indexes
+from models.models import Base, Concept, ProcessingSession, UserStory
+
+ROLES = ["user", "admin", "manager", "customer", "guest", "editor", "reviewer", "developer"]
+ACTIONS = ["view", "create", "delete", "update", "approve", "export", "search", "share"]
+OBJECTS = ["report", "invoice", "profile", "order", "comment", "dashboard", "ticket", "document"]
+
+
+def _insert_stories(engine, count: int, batch_size: int = 1000) -> dict:
+    now = datetime.utcnow()
+    story_ids = []
+    started = time.perf_counter()
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        stories = [
+            {'id': str(uuid.uuid4()), 'story_id': str(uuid.uuid4()),
+             'original_text': f"story {offset + i}", 'created_at': now}
+            for i in range(size)
+        ]
+        concepts = [
+            {'id': str(uuid.uuid4()), 'user_story_id': s['id'], 'role': random.choice(ROLES),
+             'action': random.choice(ACTIONS), 'object': random.choice(OBJECTS), 'created_at': now}
+            for s in stories
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(UserStory.__table__).values(stories))
+            conn.execute(insert(Concept.__table__).values(concepts))
+        story_ids.extend((s['id'], s['story_id']) for s in stories)
+    elapsed = time.perf_counter() - started
+    return {'rows': count * 2, 'seconds': round(elapsed, 4), 'rows_per_sec': round(count * 2 / elapsed, 1),
+            'story_ids': story_ids}
+
+
+def _timed(fn, repeat: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - started
+    return {'queries': repeat, 'seconds': round(elapsed, 4), 'avg_ms': round(elapsed / repeat * 1000, 3)}
+
+
+def _lookups(engine, story_ids, repeat: int) -> dict:
+    sample = random.sample(story_ids, min(len(story_ids), repeat))
+    with engine.connect() as conn:
+        def story_text_lookup():
+            db_id, _ = random.choice(sample)
+            conn.execute(select(Concept.id).where(
+                Concept.user_story_id == db_id, Concept.role == random.choice(ROLES)
+            )).all()
+
+        def story_prefetch():
+            chunk = [sid for _, sid in random.sample(sample, min(len(sample), 200))]
+            conn.execute(select(Concept.id, UserStory.story_id)
+                         .join(UserStory, Concept.user_story_id == UserStory.id)
+                         .where(UserStory.story_id.in_(chunk))).all()
+
+        def session_status():
+            conn.execute(select(func.count()).select_from(ProcessingSession)
+                         .where(ProcessingSession.status == 'started')).scalar()
+
+        return {
+            'concept_by_story_and_text': _timed(story_text_lookup, repeat),
+            'phase3_prefetch_200_stories': _timed(story_prefetch, max(repeat // 10, 1)),
+            'processing_session_by_status': _timed(session_status, repeat),
+        }
+
+
+def run(database_url: str, stories: int, repeat: int) -> dict:
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    schema_migrations.drop(bind=engine, checkfirst=True)
+    run_migrations(engine)
+
+    # "before": schema như trước migration 0002 (chỉ có PK / FK)
+    with engine.begin() as conn:
+        v0002_lookup_indexes.downgrade(conn)
+    with engine.begin() as conn:
+        conn.execute(insert(ProcessingSession.__table__).values([
+            {'id': str(uuid.uuid4()), 'status': random.choice(['started', 'completed', 'failed']),
+             'created_at': datetime.utcnow()} for _ in range(1000)
+        ]))
+    before_insert = _insert_stories(engine, stories)
+    story_ids = before_insert.pop('story_ids')
+    before_lookup = _lookups(engine, story_ids, repeat)
+
+    # "after": áp dụng lại migration 0002
+    with engine.begin() as conn:
+        v0002_lookup_indexes.upgrade(conn)
+    after_lookup = _lookups(engine, story_ids, repeat)
+    after_insert = _insert_stories(engine, stories)
+    after_insert.pop('story_ids')
+
+    return {
+        'database': engine.dialect.name,
+        'uuid_storage': UUID_STORAGE,
+        'stories': stories,
+        'before': {'insert': before_insert, 'lookup': before_lookup},
+        'after': {'insert': after_insert, 'lookup': after_lookup},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--stories', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--output', help='ghi kết quả JSON ra file')
+    args = parser.parse_args()
+
+    report = run(args.database_url, args.stories, args.repeat)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,19 +3,98 @@ from dotenv import load_dotenv
 
 # Load .env nếu đang chạy local (khi deploy thật thì Aiven / Docker sẽ tự inject env)
 load_dotenv()
-URL_CONNECTION_GRAPH_DB = os.environ["URL_CONNECTION_GRAPH_DB"]
-USER_GRAPH_DB = os.environ["USER_GRAPH_DB"]
-PASSWORD_GRAPH_DB = os.environ["PASSWORD_GRAPH_DB"]
-
-MYSQL_HOST = os.environ["MYSQL_HOST"]
-MYSQL_PORT = int(os.environ["MYSQL_PORT"])
-MYSQL_USERNAME = os.environ["MYSQL_USERNAME"]
-MYSQL_PASSWORD = os.environ["MYSQL_PASSWORD"]
-MYSQL_DATABASE = os.environ["MYSQL_DATABASE"]
-
-
-# Kết nối SQLAlchemy
-DATABASE_URL = (
-    f"mysql+pymysql://{MYSQL_USERNAME}:{MYSQL_PASSWORD}"
-    f"@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
-)
+
+# Backend lưu trữ (benchmark / chạy local không cần MySQL, Neo4j):
+#   STORAGE_BACKEND: "mysql" (mặc định) | "sqlite" (file SQLITE_PATH) | "memory" (SQLite in-memory)
+#   GRAPH_BACKEND:   "neo4j" (mặc định) | "memory" (graph trong process)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mysql").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "user_stories.db")
+GRAPH_BACKEND = os.environ.get("GRAPH_BACKEND", "neo4j").lower()
+
+# Chỉ bắt buộc với backend tương ứng, kiểm tra khi tạo kết nối (không phải lúc import)
+URL_CONNECTION_GRAPH_DB = os.environ.get("URL_CONNECTION_GRAPH_DB", "")
+USER_GRAPH_DB = os.environ.get("USER_GRAPH_DB", "")
+PASSWORD_GRAPH_DB = os.environ.get("PASSWORD_GRAPH_DB", "")
+
+MYSQL_HOST = os.environ.get("MYSQL_HOST", "")
+MYSQL_PORT = int(os.environ.get("MYSQL_PORT", "3306"))
+MYSQL_USERNAME = os.environ.get("MYSQL_USERNAME", "")
+MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD", "")
+MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE", "")
+
+# spaCy model dùng cho Phase1 (được preload khi app khởi động)
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+PRELOAD_NLP_MODELS = os.environ.get("PRELOAD_NLP_MODELS", "true").lower() in ("1", "true", "yes")
+# Phase1 batching: số story mỗi batch nlp.pipe và số process (1 = chạy trong process hiện tại)
+PHASE1_BATCH_SIZE = int(os.environ.get("PHASE1_BATCH_SIZE", "64"))
+PHASE1_N_PROCESS = int(os.environ.get("PHASE1_N_PROCESS", "1"))
+# Profile pipeline của Phase1: full | deps-only (tắt NER khi không cần entities) |
+# fast (deps-only + bỏ qua parse khi regex user story đã đủ role / action / object)
+PHASE1_PROFILE = os.environ.get("PHASE1_PROFILE", "full")
+# Parse cache của Phase1: LRU trong process + (tuỳ chọn) SQLite file trên đĩa
+PARSE_CACHE_ENABLED = os.environ.get("PARSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PARSE_CACHE_MAX_ENTRIES = int(os.environ.get("PARSE_CACHE_MAX_ENTRIES", "50000"))
+PARSE_CACHE_TTL_SECONDS = float(os.environ.get("PARSE_CACHE_TTL_SECONDS", "0"))  # 0 = không hết hạn
+PARSE_CACHE_PATH = os.environ.get("PARSE_CACHE_PATH", "")  # rỗng = chỉ dùng LRU
+# Số story mỗi multi-row INSERT (user_stories + concepts), commit một lần mỗi batch
+PHASE1_INSERT_BATCH_SIZE = int(os.environ.get("PHASE1_INSERT_BATCH_SIZE", "500"))
+
+# Phase3: lemma index dựng từ WordNet, cache ra file (rỗng = dựng lại mỗi lần khởi động)
+WORDNET_INDEX_PATH = os.environ.get("WORDNET_INDEX_PATH", "")
+WORDNET_MAX_SYNONYMS = int(os.environ.get("WORDNET_MAX_SYNONYMS", "10"))
+# WordNet chưa có: Phase3 chạy với index rỗng và chỉ thử dựng lại sau ngần này giây
+WORDNET_RETRY_SECONDS = float(os.environ.get("WORDNET_RETRY_SECONDS", "60"))
+# Phase3 similarity (Wu-Palmer): chỉ giữ cặp có score >= threshold, tối đa top_k cặp mỗi concept
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", "0.8"))
+SIMILARITY_TOP_K = int(os.environ.get("SIMILARITY_TOP_K", "5"))
+SIMILARITY_BLOCK_SIZE = int(os.environ.get("SIMILARITY_BLOCK_SIZE", "512"))  # số hàng mỗi block ma trận
+# Số rows mỗi multi-row INSERT của Phase3 (concept_synonyms, concept_similarities)
+PHASE3_INSERT_BATCH_SIZE = int(os.environ.get("PHASE3_INSERT_BATCH_SIZE", "1000"))
+
+# Phase2: số (type, text) mỗi batch upsert vào concept_frequency; top-N mặc định của API
+CONCEPT_FREQUENCY_BATCH_SIZE = int(os.environ.get("CONCEPT_FREQUENCY_BATCH_SIZE", "500"))
+CONCEPT_FREQUENCY_TOP_N = int(os.environ.get("CONCEPT_FREQUENCY_TOP_N", "20"))
+
+# Phát hiện story gần trùng (MinHash + LSH): num_perm = bands * rows mỗi band
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_NUM_PERM = int(os.environ.get("DEDUP_NUM_PERM", "128"))
+DEDUP_BANDS = int(os.environ.get("DEDUP_BANDS", "32"))
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.7"))  # Jaccard ước lượng tối thiểu
+DEDUP_TOP_K = int(os.environ.get("DEDUP_TOP_K", "5"))
+DEDUP_MAX_CANDIDATES = int(os.environ.get("DEDUP_MAX_CANDIDATES", "200"))  # mỗi story
+
+# Pipeline chạy trong thread pool riêng: số job chạy song song và số job được chờ
+PIPELINE_MAX_WORKERS = int(os.environ.get("PIPELINE_MAX_WORKERS", "2"))
+PIPELINE_MAX_QUEUE = int(os.environ.get("PIPELINE_MAX_QUEUE", "8"))
+PIPELINE_RETRY_AFTER_SECONDS = int(os.environ.get("PIPELINE_RETRY_AFTER_SECONDS", "10"))
+# Pool riêng cho async jobs (POST /api/analyze/jobs)
+JOB_MAX_WORKERS = int(os.environ.get("JOB_MAX_WORKERS", "2"))
+JOB_MAX_QUEUE = int(os.environ.get("JOB_MAX_QUEUE", "100"))
+
+# Profiling theo request (POST /api/analyze?profile=cprofile|sample): tắt mặc định;
+# PROFILING_TOKEN (nếu đặt) phải khớp header X-Profile-Token
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))  # giây giữa hai mẫu
+# Retention của PROFILE_DIR: giữ tối đa PROFILE_MAX_FILES file mới nhất, xoá file cũ hơn
+# PROFILE_MAX_AGE_SECONDS (0 = không giới hạn)
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_AGE_SECONDS = float(os.environ.get("PROFILE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+# Cách lưu UUID trong MySQL: "char" = VARCHAR(36) (mặc định), "binary" = BINARY(16)
+UUID_STORAGE = os.environ.get("UUID_STORAGE", "char").lower()
+
+
+# Kết nối SQLAlchemy: DATABASE_URL (nếu có) được ưu tiên, ngược lại suy ra từ STORAGE_BACKEND
+if os.environ.get("DATABASE_URL"):
+    DATABASE_URL = os.environ["DATABASE_URL"]
+elif STORAGE_BACKEND == "memory":
+    DATABASE_URL = "sqlite://"
+elif STORAGE_BACKEND == "sqlite":
+    DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+else:
+    DATABASE_URL = (
+        f"mysql+pymysql://{MYSQL_USERNAME}:{MYSQL_PASSWORD}"
+        f"@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+    )
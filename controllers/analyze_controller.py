@@ -1,22 +1,97 @@
-from typing import Dict, Any
+import json
+import logging
+from typing import Dict, Any, Iterator, Optional
+from constant import PHASE1_BATCH_SIZE
+from database import DatabaseSession
+from metrics import RunMetrics, finish_run, iter_phase, phase, save_run_metrics, track_run, use_run
+from services.incremental import delete_stories, load_backlog_stories, plan_backlog_diff, resolve_story_entries
 from services.phase1 import Phase1
 from services.phase2 import Phase2
 from services.phase3 import Phase3
 from services.phase4 import Phase4
 
 
-def analyze_stories_controller(data, graph) -> Dict[str, Any]:
+def analyze_stories_controller(data, graph, session_id: Optional[str] = None) -> Dict[str, Any]:
     """Controller function that orchestrates Phase1 -> Phase2 -> Phase3 -> Phase4.
 
     Args:
         data: request payload (expects attribute `user_stories` - list of texts)
         graph: GraphDB instance used for persisting results
+        session_id: existing ProcessingSession id (async jobs); a new one is created when omitted
 
     Returns:
         dict containing outputs from phase1, phase2 and phase3
     """
+    if getattr(data, "incremental", False):
+        return incremental_analyze_controller(data, graph, session_id=session_id)
+
+    with track_run(len(data.user_stories)) as run:
+        phase1 = Phase1()
+        p1 = phase1.process_text(data.user_stories, processing_session_id=session_id,
+                                 backlog_key=getattr(data, "backlog_key", None),
+                                 story_keys=getattr(data, "story_keys", None))
+
+        phase2 = Phase2()
+        p2 = phase2.analyze_concepts(p1)
+
+        phase3 = Phase3()
+        p3 = phase3.process_wordnet(p2)
+
+        # Persist to graph via Phase4
+        phase4 = Phase4()
+        phase4.persist_graph(p1, p3, graph)
+
+        # Breakdown theo phase -> ProcessingSession.metadata_info['metrics']
+        save_run_metrics(run, p1["session_id"])
+
+    return {"phase1": p1, "phase2": p2, "phase3": p3}
+
+
+def incremental_analyze_controller(data, graph, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Re-analyse a backlog, running Phase1 -> Phase4 only for added / modified stories.
+
+    Stories are matched against the stored stories of `data.backlog_key` by
+    `data.story_keys` (or the content hash when no key is given). Unchanged
+    stories reuse their stored concepts; stories missing from the payload and
+    old versions of modified stories are deleted from Neo4j and then from the
+    database, so a run that fails before the graph update is reconciled on retry.
+
+    Returns:
+        same shape as analyze_stories_controller; phase1 concepts cover the whole
+        payload (each with a "status"), phase2/phase3 cover only the delta, plus
+        an "incremental" summary
+
+    Raises:
+        ValueError: missing backlog_key, story_keys / user_stories length mismatch
+            or duplicate story_keys
+    """
+    with track_run(len(data.user_stories)) as run:
+        result = _incremental_analyze(data, graph, session_id)
+        save_run_metrics(run, result["phase1"]["session_id"])
+    return result
+
+
+def _incremental_analyze(data, graph, session_id: Optional[str] = None) -> Dict[str, Any]:
+    backlog_key = getattr(data, "backlog_key", None)
+    if not backlog_key:
+        raise ValueError("backlog_key is required for incremental analysis")
+    entries = resolve_story_entries(data.user_stories, getattr(data, "story_keys", None))
+
+    with phase("incremental"), DatabaseSession() as session:
+        current, stale = load_backlog_stories(session, backlog_key)
+    plan = plan_backlog_diff(entries, current)
+    changed = plan["added"] + plan["modified"]
+
     phase1 = Phase1()
-    p1 = phase1.process_text(data.user_stories)
+    p1 = phase1.process_text(
+        [e["text"] for e in changed],
+        processing_session_id=session_id,
+        backlog_key=backlog_key,
+        story_keys=[e["story_key"] for e in changed],
+    )
+
+    replaced_ids = [current[e["story_key"]]["db_id"] for e in plan["modified"]]
+    removed_ids = [s["db_id"] for s in plan["removed"]] + replaced_ids + stale
 
     phase2 = Phase2()
     p2 = phase2.analyze_concepts(p1)
@@ -24,8 +99,123 @@ def analyze_stories_controller(data, graph) -> Dict[str, Any]:
     phase3 = Phase3()
     p3 = phase3.process_wordnet(p2)
 
-    # Persist to graph via Phase4
     phase4 = Phase4()
-    phase4.persist_graph(p1, p3, graph)
+    phase4.persist_graph(p1, p3, graph, removed_story_ids=removed_ids)
 
-    return {"phase1": p1, "phase2": p2, "phase3": p3}
+    # Bản cũ của story đã sửa / đã xoá chỉ bị xoá khỏi DB sau khi graph đã được cập nhật:
+    # nếu Phase2-4 lỗi, lần chạy lại vẫn thấy chúng (removed / stale) và xoá lại khỏi graph
+    with phase("incremental"), DatabaseSession() as session:
+        delete_stories(session, removed_ids)
+
+    # Kết quả Phase1 cho toàn bộ payload, theo thứ tự payload
+    status = {e["story_key"]: name for name in ("added", "modified", "unchanged") for e in plan[name]}
+    fresh = {e["story_key"]: c for e, c in zip(changed, p1["concepts"])}
+    concepts = []
+    for entry in entries:
+        key = entry["story_key"]
+        if key in fresh:
+            concept = dict(fresh[key])
+        else:
+            stored = current[key]
+            concept = {
+                "id": stored["story_id"],
+                "db_id": stored["db_id"],
+                "concept_id": stored["concept_id"],
+                "original_text": stored["original_text"],
+                "role": stored["role"],
+                "action": stored["action"],
+                "object": stored["object"],
+            }
+        concepts.append({**concept, "story_key": key, "status": status[key]})
+
+    summary = {
+        "backlog_key": backlog_key,
+        "added": len(plan["added"]),
+        "modified": len(plan["modified"]),
+        "unchanged": len(plan["unchanged"]),
+        "removed": len(plan["removed"]),
+        "removed_story_ids": [s["story_id"] for s in plan["removed"]],
+    }
+    logging.info(
+        f"✅ Incremental analyze of backlog '{backlog_key}': {summary['added']} added, "
+        f"{summary['modified']} modified, {summary['unchanged']} unchanged, {summary['removed']} removed"
+    )
+    return {"phase1": phase1.build_output(concepts), "phase2": p2, "phase3": p3, "incremental": summary}
+
+
+def _ndjson(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def stream_analyze_controller(data, graph) -> Iterator[str]:
+    """Streaming variant of analyze_stories_controller producing NDJSON lines.
+
+    One {"type": "story", ...} record is emitted per story as soon as Phase1 has
+    persisted it, followed by {"type": "phase2"}, {"type": "phase3"} and a final
+    {"type": "done"} record. Only the slim per-story concepts are kept in memory
+    for Phase2/Phase3; visual narrator output is streamed and dropped.
+    Errors after the first byte are reported as a {"type": "error"} record.
+
+    Incremental requests run incremental_analyze_controller first and then emit
+    the same record types (the "done" record carries the incremental summary).
+    """
+    if getattr(data, "incremental", False):
+        yield from _stream_incremental(data, graph)
+        return
+
+    # Story records carry visual narrator entities, so NER stays enabled
+    phase1 = Phase1(entities=True)
+    concepts = []
+    # Run chỉ được kích hoạt quanh từng đoạn không yield (xem metrics.iter_phase)
+    run = RunMetrics(len(data.user_stories))
+    try:
+        # Small insert batches keep time to first byte low
+        stories = phase1.iter_stories(data.user_stories, insert_batch_size=PHASE1_BATCH_SIZE,
+                                      include_visual=True, backlog_key=getattr(data, "backlog_key", None),
+                                      story_keys=getattr(data, "story_keys", None))
+        for record in iter_phase(run, "phase1", stories):
+            visual = record.pop("visual_narrator", None)
+            concepts.append(record)
+            yield _ndjson({"type": "story", **record, "visual_narrator": visual})
+
+        p1 = phase1.build_output(concepts)
+
+        with use_run(run):
+            phase2 = Phase2()
+            p2 = phase2.analyze_concepts(p1)
+        yield _ndjson({"type": "phase2", **p2})
+
+        with use_run(run):
+            phase3 = Phase3()
+            p3 = phase3.process_wordnet(p2)
+        yield _ndjson({"type": "phase3", **p3})
+
+        with use_run(run):
+            phase4 = Phase4()
+            phase4.persist_graph(p1, p3, graph)
+            save_run_metrics(run, p1["session_id"])
+        finish_run(run, "completed")
+
+        yield _ndjson({"type": "done", "session_id": p1["session_id"], "stories": len(concepts)})
+    except Exception as e:
+        finish_run(run, "failed")
+        logging.error(f"❌ Streaming analyze failed: {e}")
+        yield _ndjson({"type": "error", "detail": str(e)})
+
+
+def _stream_incremental(data, graph) -> Iterator[str]:
+    try:
+        result = incremental_analyze_controller(data, graph)
+        for record in result["phase1"]["concepts"]:
+            yield _ndjson({"type": "story", **record})
+        yield _ndjson({"type": "phase2", **result["phase2"]})
+        yield _ndjson({"type": "phase3", **result["phase3"]})
+        yield _ndjson({
+            "type": "done",
+            "session_id": result["phase1"]["session_id"],
+            "stories": len(result["phase1"]["concepts"]),
+            "incremental": result["incremental"],
+        })
+    except Exception as e:
+        logging.error(f"❌ Streaming analyze failed: {e}")
+        yield _ndjson({"type": "error", "detail": str(e)})
@@ -0,0 +1,12 @@
+from typing import Any, Dict, Optional
+
+from constant import CONCEPT_FREQUENCY_TOP_N
+from database import DatabaseSession
+from services.phase2.helpers import top_concept_frequencies
+
+
+def top_concepts_controller(concept_type: Optional[str] = None, limit: int = CONCEPT_FREQUENCY_TOP_N) -> Dict[str, Any]:
+    """Top-N concept theo tần suất toàn corpus cho từng type (hoặc một type)."""
+    with DatabaseSession() as session:
+        top = top_concept_frequencies(session, concept_type=concept_type, limit=limit)
+    return {"limit": limit, "concepts": top}
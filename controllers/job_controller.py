@@ -0,0 +1,145 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+
+from controllers.analyze_controller import analyze_stories_controller
+from database import DatabaseSession
+from models.models import Concept, ProcessingSession, UserStory
+from pipeline_executor import PipelineSaturatedError, get_job_executor
+
+
+def _update_job(session_id: str, phase_completed: Optional[int] = None, **fields):
+    """Merge trạng thái job vào ProcessingSession.metadata_info['job']."""
+    with DatabaseSession() as session:
+        processing_session = session.query(ProcessingSession).filter_by(id=session_id).first()
+        if processing_session:
+            if phase_completed is not None:
+                processing_session.phase_completed = phase_completed
+            meta = dict(processing_session.metadata_info or {})
+            meta['job'] = {**meta.get('job', {}), **fields}
+            processing_session.metadata_info = meta
+
+
+def submit_analyze_job(data, graph) -> Dict[str, Any]:
+    """Tạo ProcessingSession và đưa pipeline vào job pool; trả về ngay job id.
+
+    Raises:
+        PipelineSaturatedError: job pool đã đầy
+    """
+    with DatabaseSession() as session:
+        processing_session = ProcessingSession(
+            session_name=f"job_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+            total_stories=len(data.user_stories),
+            phase_completed=0,
+            status="queued",
+            metadata_info={'job': {'status': 'queued', 'submitted_at': datetime.utcnow().isoformat()}},
+        )
+        session.add(processing_session)
+        session.flush()
+        session_id = processing_session.id
+
+    try:
+        get_job_executor().submit(run_analyze_job, session_id, data, graph)
+    except PipelineSaturatedError:
+        _update_job(session_id, status='rejected')
+        raise
+
+    return {"job_id": session_id, "status": "queued"}
+
+
+def run_analyze_job(session_id: str, data, graph) -> Dict[str, Any]:
+    """Chạy Phase1 -> Phase4 cho một job trong worker pool."""
+    _update_job(session_id, status='running', started_at=datetime.utcnow().isoformat())
+    try:
+        result = analyze_stories_controller(data, graph, session_id=session_id)
+    except Exception as e:
+        logging.error(f"❌ Analyze job {session_id} failed: {e}")
+        _update_job(session_id, status='failed', error=str(e), finished_at=datetime.utcnow().isoformat())
+        raise
+
+    summary = {
+        "stories": len(result["phase1"].get("concepts", [])),
+        "roles": len(result["phase1"].get("roles", [])),
+        "actions": len(result["phase1"].get("actions", [])),
+        "objects": len(result["phase1"].get("objects", [])),
+        "svo_relationships": len(result["phase3"].get("subject_verb_object", [])),
+    }
+    # Phase4 không tự cập nhật ProcessingSession
+    _update_job(session_id, phase_completed=4, status='completed', summary=summary, finished_at=datetime.utcnow().isoformat())
+    logging.info(f"✅ Analyze job {session_id} completed")
+    return summary
+
+
+def get_job_status(session_id: str) -> Optional[Dict[str, Any]]:
+    with DatabaseSession() as session:
+        processing_session = session.query(ProcessingSession).filter_by(id=session_id).first()
+        if not processing_session:
+            return None
+        meta = processing_session.metadata_info or {}
+        job = meta.get('job', {})
+        progress = meta.get('progress', {})
+        return {
+            "job_id": processing_session.id,
+            "status": job.get('status', processing_session.status),
+            "phase_completed": processing_session.phase_completed,
+            "total_stories": processing_session.total_stories,
+            "stories_processed": progress.get('stories_processed', 0),
+            "stories_per_sec": progress.get('stories_per_sec'),
+            "elapsed_seconds": progress.get('elapsed_seconds'),
+            "created_at": processing_session.created_at,
+            "completed_at": processing_session.completed_at,
+            "error": job.get('error'),
+            "summary": job.get('summary'),
+            "metrics": meta.get('metrics'),
+        }
+
+
+def get_job_results(session_id: str, page: int = 1, page_size: int = 100) -> Optional[Dict[str, Any]]:
+    """Một trang kết quả Phase1 (theo thứ tự story trong payload) của job."""
+    with DatabaseSession() as session:
+        processing_session = session.query(ProcessingSession).filter_by(id=session_id).first()
+        if not processing_session:
+            return None
+
+        stories = session.query(UserStory).filter(
+            UserStory.processing_session_id == session_id
+        ).order_by(UserStory.position).offset((page - 1) * page_size).limit(page_size).all()
+        # Số story đã lưu (story rỗng bị bỏ qua nên có thể ít hơn total_stories);
+        # dùng index (processing_session_id, position)
+        total = session.query(func.count(UserStory.id)).filter(
+            UserStory.processing_session_id == session_id
+        ).scalar()
+
+        concepts = {}
+        if stories:
+            rows = session.query(Concept).filter(
+                Concept.user_story_id.in_([s.id for s in stories])
+            ).order_by(Concept.created_at).all()
+            for concept in rows:
+                # concept đầu tiên của story là concept do Phase1 tạo
+                concepts.setdefault(concept.user_story_id, concept)
+
+        items = []
+        for story in stories:
+            concept = concepts.get(story.id)
+            meta = (concept.metadata_json or {}) if concept else {}
+            items.append({
+                "id": story.story_id,
+                "db_id": story.id,
+                "position": story.position,
+                "original_text": story.original_text,
+                "role": (concept.role if concept else None) or "",
+                "action": (concept.action if concept else None) or "",
+                "object": (concept.object if concept else None) or "",
+                "visual_narrator": meta.get('visual_narrator'),
+            })
+
+        return {
+            "job_id": session_id,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "items": items,
+        }
@@ -0,0 +1,12 @@
+from typing import Any, Dict
+
+from constant import DEDUP_TOP_K
+from database import DatabaseSession
+from services.dedup import find_near_duplicates
+
+
+def similar_stories_controller(text: str, k: int = DEDUP_TOP_K, min_similarity: float = 0.0) -> Dict[str, Any]:
+    """Top-k story đã lưu giống `text` nhất (Jaccard ước lượng bằng MinHash, ứng viên lấy từ LSH)."""
+    with DatabaseSession() as session:
+        matches = find_near_duplicates(session, [text], threshold=min_similarity, top_k=k)[0]
+    return {"text": text, "matches": matches}
@@ -1,13 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
-from constant import MYSQL_HOST, MYSQL_PASSWORD, MYSQL_USERNAME, MYSQL_PORT, MYSQL_DATABASE
-from models.models import Base
+from sqlalchemy.pool import StaticPool
+from metrics import instrument_engine, timed_commit
+from constant import DATABASE_URL, STORAGE_BACKEND, MYSQL_HOST, MYSQL_PASSWORD, MYSQL_USERNAME, MYSQL_PORT, MYSQL_DATABASE
 from typing import Optional
 import logging
+import os
 
 class DatabaseManager:
-    """Quản lý kết nối và session với MySQL database"""
+    """Quản lý kết nối và session với database (MySQL, hoặc SQLite file / in-memory)"""
     
     def __init__(self, database_url: str):
         self.database_url = database_url
@@ -21,9 +24,10 @@ class DatabaseManager:
             self.engine = create_engine(
                 self.database_url,
                 echo=False,  # Set True để debug SQL queries
-                pool_pre_ping=True,  # Kiểm tra connection trước khi sử dụng
-                pool_recycle=3600    # Recycle connection sau 1 giờ
+                **self._engine_options(self.database_url)
             )
+            # Đếm / đo mọi câu lệnh SQL (xem metrics.py)
+            instrument_engine(self.engine)
             self.SessionLocal = sessionmaker(
                 bind=self.engine, 
                 expire_on_commit=False  # Prevent objects from being detached after commit
@@ -33,11 +37,27 @@ class DatabaseManager:
             logging.error(f"❌ Failed to create database engine: {e}")
             raise
     
+    @staticmethod
+    def _engine_options(database_url: str) -> dict:
+        url = make_url(database_url)
+        if url.get_backend_name() != "sqlite":
+            return {
+                "pool_pre_ping": True,  # Kiểm tra connection trước khi sử dụng
+                "pool_recycle": 3600,   # Recycle connection sau 1 giờ
+            }
+        # Pipeline chạy trong thread pool nên connection SQLite phải dùng được ở thread khác
+        options = {"connect_args": {"check_same_thread": False}}
+        if url.database in (None, "", ":memory:"):
+            # In-memory: mọi session dùng chung một connection, nếu không mỗi connection là một DB rỗng
+            options["poolclass"] = StaticPool
+        return options
+
     def create_tables(self):
-        """Tạo tất cả bảng trong database"""
+        """Tạo / nâng cấp schema bằng versioned migrations (xem package migrations)"""
+        from migrations import run_migrations
         try:
-            Base.metadata.create_all(bind=self.engine)
-            logging.info("✅ All tables created successfully")
+            applied = run_migrations(self.engine)
+            logging.info(f"✅ Database schema up to date (applied: {applied or 'none'})")
         except SQLAlchemyError as e:
             logging.error(f"❌ Failed to create tables: {e}")
             raise
@@ -50,7 +70,7 @@ class DatabaseManager:
         """Test kết nối database"""
         try:
             with self.get_session() as session:
-                session.execute("SELECT 1")
+                session.execute(text("SELECT 1"))
             logging.info("✅ Database connection test successful")
             return True
         except SQLAlchemyError as e:
@@ -91,10 +111,14 @@ def get_database_manager(database_url: str = None) -> DatabaseManager:
     
     if _db_manager is None:
         if database_url is None:
-            # Sử dụng cấu hình mặc định
-            config = DatabaseConfig.get_default_config()
-            database_url = DatabaseConfig.get_database_url(**config)
-        
+            # Sử dụng cấu hình mặc định (STORAGE_BACKEND / DATABASE_URL trong constant.py)
+            database_url = DATABASE_URL
+            if STORAGE_BACKEND == "mysql" and not os.environ.get("DATABASE_URL") and not (MYSQL_HOST and MYSQL_DATABASE):
+                raise RuntimeError(
+                    "MYSQL_HOST / MYSQL_DATABASE are required for STORAGE_BACKEND=mysql "
+                    "(or set STORAGE_BACKEND=sqlite|memory, or DATABASE_URL)"
+                )
+
         _db_manager = DatabaseManager(database_url)
     
     return _db_manager
@@ -123,7 +147,7 @@ class DatabaseSession:
             logging.error(f"Database transaction rolled back due to error: {exc_val}")
         else:
             try:
-                self.session.commit()
+                timed_commit(self.session)
             except SQLAlchemyError as e:
                 self.session.rollback()
                 logging.error(f"Failed to commit transaction: {e}")
@@ -1,40 +1,186 @@
-from neo4j import GraphDatabase
-from typing import Optional, Dict, Any
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from metrics import timed_graph
+
+# Số rows mỗi câu lệnh UNWIND
+DEFAULT_GRAPH_BATCH_SIZE = 1000
+
+# Label -> property dùng làm key khi MERGE; mỗi cặp có uniqueness constraint (kèm index)
+DEFAULT_GRAPH_SCHEMA = {
+    "UserStory": "id",
+    "Role": "name",
+    "Object": "name",
+}
 
 class GraphDB:
     def __init__(self, uri="bolt://localhost:7687", user="neo4j", password="12345678"):
+        # Import lazy: GRAPH_BACKEND=memory không cần cài driver neo4j
+        from neo4j import GraphDatabase
+
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self._schema_ready = set()
+        self._schema_lock = threading.Lock()
 
     def close(self):
         self.driver.close()
 
+    def verify_connectivity(self):
+        self.driver.verify_connectivity()
+
+    def ensure_schema(self, schema: Optional[Dict[str, str]] = None):
+        """
+        Tạo uniqueness constraint (Neo4j tự tạo index đi kèm) cho từng label/key dùng trong MERGE.
+        Idempotent: dùng IF NOT EXISTS và chỉ chạy một lần cho mỗi cặp trong process.
+        """
+        for label, key in (schema or DEFAULT_GRAPH_SCHEMA).items():
+            self._ensure_key(label, key)
+
+    def _ensure_key(self, label: str, key: str):
+        """Đảm bảo constraint cho (label, key) trước lần ghi đầu tiên."""
+        if (label, key) in self._schema_ready:
+            return
+        with self._schema_lock:
+            if (label, key) in self._schema_ready:
+                return
+            query = (
+                f"CREATE CONSTRAINT {label.lower()}_{key}_unique IF NOT EXISTS "
+                f"FOR (n:{label}) REQUIRE n.{key} IS UNIQUE"
+            )
+            from neo4j.exceptions import ClientError, DatabaseError
+
+            try:
+                with self.driver.session() as session:
+                    session.run(query).consume()
+                logging.info(f"✅ Neo4j constraint ensured for :{label}({key})")
+            except (ClientError, DatabaseError) as e:
+                # Vd. đã có node trùng key (ConstraintCreationFailed) hoặc thiếu quyền schema:
+                # MERGE vẫn đúng nhưng chậm hơn, không thử lại cho mỗi lần ghi
+                logging.error(f"❌ Neo4j constraint for :{label}({key}) could not be created: {e}")
+            # Đánh dấu đã thử để các lần ghi sau không bị chặn bởi lỗi schema
+            self._schema_ready.add((label, key))
+
+    def explain_merge_plans(self, schema: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Chẩn đoán: chạy EXPLAIN cho các câu MERGE / MATCH theo key và trả về các operator
+        của plan, kèm cờ uses_index (False nghĩa là đang full label scan).
+        """
+        schema = schema or DEFAULT_GRAPH_SCHEMA
+        report = {}
+        with self.driver.session() as session:
+            for label, key in schema.items():
+                query = f"EXPLAIN MERGE (n:{label} {{{key}: $value}}) RETURN n"
+                plan = session.run(query, value="").consume().plan or {}
+                operators = self._plan_operators(plan)
+                report[label] = {
+                    "key": key,
+                    "operators": operators,
+                    "uses_index": any("Index" in op for op in operators),
+                }
+        return report
+
+    @classmethod
+    def _plan_operators(cls, plan: Dict[str, Any]) -> List[str]:
+        operators = [plan.get("operatorType", "")]
+        for child in plan.get("children", []):
+            operators.extend(cls._plan_operators(child))
+        return [op for op in operators if op]
+
+    @timed_graph
     def create_node(self, label: str, properties: Dict[str, Any], key: str = "id"):
         """
         Tạo node nếu chưa tồn tại (theo field key).
         """
+        self._ensure_key(label, key)
         with self.driver.session() as session:
             props = {k: v for k, v in properties.items() if v is not None}
             query = f"MERGE (n:{label} {{{key}: ${key}}}) SET n += $props RETURN n"
             session.run(query, **properties, props=props)
 
+    @timed_graph
+    def merge_nodes(self, label: str, key: str, rows: List[Dict[str, Any]],
+                    batch_size: int = DEFAULT_GRAPH_BATCH_SIZE) -> int:
+        """
+        MERGE nhiều node theo field key bằng UNWIND, tất cả trong một transaction.
+        Mỗi row là dict properties của node (phải có field key).
+        """
+        self._ensure_key(label, key)
+        payload = [
+            {"key": row[key], "props": {k: v for k, v in row.items() if v is not None}}
+            for row in rows if row.get(key) is not None
+        ]
+        query = f"UNWIND $rows AS row MERGE (n:{label} {{{key}: row.key}}) SET n += row.props"
+        return self._run_batched(query, payload, batch_size)
+
+    @timed_graph
+    def merge_relationships(self, start_label: str, start_key: str, rel_type: str,
+                            end_label: str, end_key: str, rows: List[Dict[str, Any]],
+                            batch_size: int = DEFAULT_GRAPH_BATCH_SIZE) -> int:
+        """
+        MERGE nhiều quan hệ bằng UNWIND, tất cả trong một transaction.
+        Mỗi row có dạng {"start": ..., "end": ..., "props": {...}}.
+        """
+        self._ensure_key(start_label, start_key)
+        self._ensure_key(end_label, end_key)
+        payload = [
+            {"start": row["start"], "end": row["end"], "props": row.get("props") or {}}
+            for row in rows
+        ]
+        query = (
+            f"UNWIND $rows AS row "
+            f"MATCH (a:{start_label} {{{start_key}: row.start}}) "
+            f"MATCH (b:{end_label} {{{end_key}: row.end}}) "
+            f"MERGE (a)-[r:{rel_type}]->(b) "
+            f"SET r += row.props"
+        )
+        return self._run_batched(query, payload, batch_size)
+
+    @timed_graph
+    def delete_nodes(self, label: str, key: str, values: List[Any],
+                     batch_size: int = DEFAULT_GRAPH_BATCH_SIZE) -> int:
+        """
+        DETACH DELETE nhiều node theo field key bằng UNWIND, tất cả trong một transaction.
+        """
+        self._ensure_key(label, key)
+        payload = [value for value in values if value is not None]
+        query = f"UNWIND $rows AS value MATCH (n:{label} {{{key}: value}}) DETACH DELETE n"
+        return self._run_batched(query, payload, batch_size)
+
+    def _run_batched(self, query: str, rows: List[Dict[str, Any]], batch_size: int) -> int:
+        """Chạy query với $rows theo từng chunk trong một explicit transaction."""
+        if not rows:
+            return 0
+        batch_size = max(batch_size, 1)
+        with self.driver.session() as session:
+            with session.begin_transaction() as tx:
+                for offset in range(0, len(rows), batch_size):
+                    tx.run(query, rows=rows[offset:offset + batch_size]).consume()
+                tx.commit()
+        return len(rows)
+
+    @timed_graph
     def get_node(self, label: str, key: str, value: str) -> Optional[Dict[str, Any]]:
         with self.driver.session() as session:
             query = f"MATCH (n:{label} {{{key}: $value}}) RETURN n"
             result = session.run(query, value=value).single()
             return dict(result["n"]) if result else None
 
+    @timed_graph
     def update_node(self, label: str, key: str, value: str, new_props: Dict[str, Any]):
         with self.driver.session() as session:
             query = f"MATCH (n:{label} {{{key}: $value}}) SET n += $props RETURN n"
             result = session.run(query, value=value, props=new_props).single()
             return dict(result["n"]) if result else None
 
+    @timed_graph
     def delete_node(self, label: str, key: str, value: str):
         with self.driver.session() as session:
             query = f"MATCH (n:{label} {{{key}: $value}}) DETACH DELETE n RETURN COUNT(*) as deleted"
             result = session.run(query, value=value).single()
             return result["deleted"] if result else 0
 
+    @timed_graph
     def list_nodes(self, label: str):
         with self.driver.session() as session:
             query = f"MATCH (n:{label}) RETURN n"
@@ -42,12 +188,15 @@ class GraphDB:
             return [dict(r["n"]) for r in result]
 
   
+    @timed_graph
     def create_relationship(self, start_label: str, start_key: str, start_val: str,
                             rel_type: str, end_label: str, end_key: str, end_val: str,
                             props: Optional[Dict[str, Any]] = None):
         """
         Tạo quan hệ giữa hai node.
         """
+        self._ensure_key(start_label, start_key)
+        self._ensure_key(end_label, end_key)
         with self.driver.session() as session:
             query = (
                 f"MATCH (a:{start_label} {{{start_key}: $start}}), (b:{end_label} {{{end_key}: $end}}) "
@@ -57,6 +206,7 @@ class GraphDB:
             )
             session.run(query, start=start_val, end=end_val, props=props or {})
 
+    @timed_graph
     def list_relationships(self, start_label: str = None, end_label: str = None):
         """
         Liệt kê các quan hệ (option filter start_label, end_label).
@@ -71,3 +221,168 @@ class GraphDB:
                 {"start": dict(r["a"]), "relationship": dict(r["r"]), "end": dict(r["b"])}
                 for r in result
             ]
+
+
+class InMemoryGraphDB:
+    """Graph trong process, cùng API với GraphDB (GRAPH_BACKEND=memory).
+
+    Dùng cho benchmark / chạy local không có Neo4j: MERGE theo key, quan hệ chỉ được
+    tạo khi cả hai node tồn tại (như MATCH ... MERGE), delete là DETACH DELETE.
+    Dữ liệu mất khi process kết thúc.
+    """
+
+    def __init__(self):
+        # label -> key MERGE đầu tiên của label; label -> {giá trị key: properties}
+        self._keys: Dict[str, str] = {}
+        self._nodes: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        # (start_label, start_id, rel_type, end_label, end_id) -> properties
+        self._relationships: Dict[Tuple[str, Any, str, str, Any], Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def close(self):
+        pass
+
+    def verify_connectivity(self):
+        pass
+
+    def ensure_schema(self, schema: Optional[Dict[str, str]] = None):
+        for label, key in (schema or DEFAULT_GRAPH_SCHEMA).items():
+            self._keys.setdefault(label, key)
+
+    def explain_merge_plans(self, schema: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        return {
+            label: {"key": key, "operators": ["InMemoryKeyLookup"], "uses_index": True}
+            for label, key in (schema or DEFAULT_GRAPH_SCHEMA).items()
+        }
+
+    def _find(self, label: str, key: str, value: Any) -> Optional[Any]:
+        """Id (giá trị key chính của label) của node có n.key = value."""
+        nodes = self._nodes.get(label, {})
+        if self._keys.get(label) == key:
+            return value if value in nodes else None
+        return next((node_id for node_id, props in nodes.items() if props.get(key) == value), None)
+
+    def _merge(self, label: str, key: str, value: Any, props: Dict[str, Any]):
+        self._keys.setdefault(label, key)
+        node_id = self._find(label, key, value)
+        if node_id is None:
+            node_id = props.get(self._keys[label], value)
+            self._nodes.setdefault(label, {})[node_id] = {key: value}
+        self._nodes[label][node_id].update(props)
+
+    def _detach_delete(self, label: str, node_id: Any):
+        del self._nodes[label][node_id]
+        for rel in [r for r in self._relationships if r[:2] == (label, node_id) or r[3:] == (label, node_id)]:
+            del self._relationships[rel]
+
+    @timed_graph
+    def create_node(self, label: str, properties: Dict[str, Any], key: str = "id"):
+        with self._lock:
+            self._merge(label, key, properties[key], {k: v for k, v in properties.items() if v is not None})
+
+    @timed_graph
+    def merge_nodes(self, label: str, key: str, rows: List[Dict[str, Any]],
+                    batch_size: int = DEFAULT_GRAPH_BATCH_SIZE) -> int:
+        rows = [row for row in rows if row.get(key) is not None]
+        with self._lock:
+            for row in rows:
+                self._merge(label, key, row[key], {k: v for k, v in row.items() if v is not None})
+        return len(rows)
+
+    @timed_graph
+    def merge_relationships(self, start_label: str, start_key: str, rel_type: str,
+                            end_label: str, end_key: str, rows: List[Dict[str, Any]],
+                            batch_size: int = DEFAULT_GRAPH_BATCH_SIZE) -> int:
+        with self._lock:
+            for row in rows:
+                self._relate(start_label, start_key, row["start"], rel_type, end_label, end_key, row["end"],
+                             row.get("props"))
+        return len(rows)
+
+    @timed_graph
+    def delete_nodes(self, label: str, key: str, values: List[Any],
+                     batch_size: int = DEFAULT_GRAPH_BATCH_SIZE) -> int:
+        values = [value for value in values if value is not None]
+        with self._lock:
+            for value in values:
+                node_id = self._find(label, key, value)
+                if node_id is not None:
+                    self._detach_delete(label, node_id)
+        return len(values)
+
+    @timed_graph
+    def get_node(self, label: str, key: str, value: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            node_id = self._find(label, key, value)
+            return dict(self._nodes[label][node_id]) if node_id is not None else None
+
+    @timed_graph
+    def update_node(self, label: str, key: str, value: str, new_props: Dict[str, Any]):
+        with self._lock:
+            node_id = self._find(label, key, value)
+            if node_id is None:
+                return None
+            self._nodes[label][node_id].update(new_props)
+            return dict(self._nodes[label][node_id])
+
+    @timed_graph
+    def delete_node(self, label: str, key: str, value: str):
+        with self._lock:
+            node_id = self._find(label, key, value)
+            if node_id is None:
+                return 0
+            self._detach_delete(label, node_id)
+            return 1
+
+    @timed_graph
+    def list_nodes(self, label: str):
+        with self._lock:
+            return [dict(props) for props in self._nodes.get(label, {}).values()]
+
+    @timed_graph
+    def create_relationship(self, start_label: str, start_key: str, start_val: str,
+                            rel_type: str, end_label: str, end_key: str, end_val: str,
+                            props: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._relate(start_label, start_key, start_val, rel_type, end_label, end_key, end_val, props)
+
+    def _relate(self, start_label: str, start_key: str, start_val: Any, rel_type: str,
+                end_label: str, end_key: str, end_val: Any, props: Optional[Dict[str, Any]]):
+        start = self._find(start_label, start_key, start_val)
+        end = self._find(end_label, end_key, end_val)
+        if start is None or end is None:
+            return
+        self._relationships.setdefault((start_label, start, rel_type, end_label, end), {}).update(props or {})
+
+    @timed_graph
+    def list_relationships(self, start_label: str = None, end_label: str = None):
+        with self._lock:
+            return [
+                {
+                    "start": dict(self._nodes[s_label][s_id]),
+                    "relationship": dict(props),
+                    "end": dict(self._nodes[e_label][e_id]),
+                }
+                for (s_label, s_id, _, e_label, e_id), props in self._relationships.items()
+                if not (start_label and end_label) or (s_label, e_label) == (start_label, end_label)
+            ]
+
+
+# Singleton pattern cho graph database
+_graph_db = None
+
+
+def get_graph_db():
+    """Lấy instance của GraphDB, hoặc InMemoryGraphDB khi GRAPH_BACKEND=memory (singleton)"""
+    global _graph_db
+
+    if _graph_db is None:
+        from constant import GRAPH_BACKEND, URL_CONNECTION_GRAPH_DB, USER_GRAPH_DB, PASSWORD_GRAPH_DB
+        if GRAPH_BACKEND == "memory":
+            _graph_db = InMemoryGraphDB()
+        else:
+            if not URL_CONNECTION_GRAPH_DB:
+                raise RuntimeError("URL_CONNECTION_GRAPH_DB is required for GRAPH_BACKEND=neo4j (or set GRAPH_BACKEND=memory)")
+            _graph_db = GraphDB(uri=URL_CONNECTION_GRAPH_DB, user=USER_GRAPH_DB, password=PASSWORD_GRAPH_DB)
+
+    return _graph_db
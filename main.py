@@ -1,10 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from routes.analyze import router
+from routes.concepts import router as concepts_router
+from routes.metrics import router as metrics_router
+from routes.stories import router as stories_router
+from routes.system import router as system_router
+from pipeline_executor import get_pipeline_executor
+from warmup import get_warmup_state
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Migrations, DB pool, Neo4j driver/constraints và spaCy model được chuẩn bị một lần
+    # khi khởi động (trong background), không nằm trong request path.
+    # Theo dõi tiến độ qua GET /api/system/ready.
+    get_warmup_state().start_background()
+    yield
+    get_pipeline_executor().shutdown(wait=False)
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router, prefix="/api")
+app.include_router(concepts_router, prefix="/api")
+app.include_router(stories_router, prefix="/api")
+app.include_router(system_router, prefix="/api")
+# Prometheus scrape endpoint (không có prefix /api)
+app.include_router(metrics_router)
 
 @app.get("/")
 def root():
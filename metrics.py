@@ -0,0 +1,376 @@
+"""Instrumentation của pipeline.
+
+Hai lớp số liệu:
+    - RunMetrics: breakdown của một lần analyze theo phase (wall time, NLP time, DB time,
+      số query, rows đã ghi, số lệnh graph), lưu vào ProcessingSession.metadata_info['metrics'].
+    - Histogram / counter tổng hợp trong process, xuất theo text format của Prometheus
+      (GET /metrics).
+
+Run hiện tại được giữ trong một ContextVar; DB query (event của engine), commit và lệnh
+GraphDB được cộng vào phase đang chạy của run đó. Ngoài run (vd. warm-up) số liệu chỉ
+vào histogram với phase="none".
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [số quan sát theo bucket (không cộng dồn), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = 'le="%s"' % bound
+                    yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                le = 'le="+Inf"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}"
+                yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+                yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PIPELINE_RUNS = REGISTRY.counter("pipeline_runs_total", "Analyze runs by final status", ["status"])
+PIPELINE_STORIES = REGISTRY.counter("pipeline_stories_total", "User stories submitted to analyze runs")
+PIPELINE_SECONDS = REGISTRY.histogram("pipeline_run_seconds", "Wall time of a whole analyze run")
+PHASE_SECONDS = REGISTRY.histogram("pipeline_phase_seconds", "Wall time per pipeline phase", ["phase"])
+NLP_SECONDS = REGISTRY.counter("pipeline_nlp_seconds_total", "Time spent in spaCy parsing / extraction", ["phase"])
+DB_QUERY_SECONDS = REGISTRY.histogram("db_query_seconds", "SQL statement execution time", ["phase"])
+DB_QUERY_ERRORS = REGISTRY.counter("db_query_errors_total", "SQL statements that raised", ["phase"])
+DB_COMMIT_SECONDS = REGISTRY.histogram("db_commit_seconds", "Database commit time", ["phase"])
+DB_ROWS_WRITTEN = REGISTRY.counter("db_rows_written_total", "Rows inserted / updated / deleted", ["phase"])
+GRAPH_CALL_SECONDS = REGISTRY.histogram("graph_call_seconds", "GraphDB call time", ["phase", "operation"])
+GRAPH_ROWS = REGISTRY.counter("graph_rows_total", "Rows sent in GraphDB batch calls", ["phase", "operation"])
+
+
+class RunMetrics:
+    """Breakdown theo phase của một lần analyze."""
+
+    FIELDS = ("wall_seconds", "nlp_seconds", "db_seconds", "db_queries", "db_errors", "db_commits",
+              "rows_written", "graph_seconds", "graph_calls", "graph_rows")
+
+    def __init__(self, stories: int = 0):
+        self.stories = stories
+        self.phase: Optional[str] = None
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, field: str, amount: float, phase: Optional[str] = None):
+        phase = phase or self.phase or "other"
+        with self._lock:
+            stats = self.phases.setdefault(phase, dict.fromkeys(self.FIELDS, 0))
+            stats[field] += amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = {
+                name: {k: round(v, 4) if isinstance(v, float) else v for k, v in stats.items()}
+                for name, stats in self.phases.items()
+            }
+        return {
+            "stories": self.stories,
+            "wall_seconds": round(time.perf_counter() - self._started, 4),
+            "phases": phases,
+        }
+
+
+_current_run: ContextVar[Optional[RunMetrics]] = ContextVar("pipeline_run_metrics", default=None)
+
+
+def current_run() -> Optional[RunMetrics]:
+    return _current_run.get()
+
+
+def _current_phase() -> str:
+    run = _current_run.get()
+    return (run.phase if run else None) or "none"
+
+
+@contextmanager
+def use_run(run: RunMetrics):
+    """Đặt run làm run hiện tại trong context này."""
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def track_run(stories: int = 0):
+    """Bắt đầu một run (hoặc dùng lại run đang chạy nếu được gọi lồng nhau)."""
+    existing = _current_run.get()
+    if existing is not None:
+        yield existing
+        return
+    run = RunMetrics(stories)
+    with use_run(run):
+        try:
+            yield run
+        except BaseException:
+            finish_run(run, "failed")
+            raise
+        finish_run(run, "completed")
+
+
+def finish_run(run: RunMetrics, status: str):
+    """Cập nhật counter / histogram tổng hợp khi run kết thúc (dùng trực tiếp khi streaming,
+    vì context của generator không giữ được ContextVar qua các lần yield)."""
+    PIPELINE_RUNS.inc(status=status)
+    PIPELINE_STORIES.inc(run.stories)
+    PIPELINE_SECONDS.observe(time.perf_counter() - run._started)
+
+
+@contextmanager
+def phase(name: str):
+    """Đo wall time của một phase; DB / graph / NLP time bên trong được tính cho phase này."""
+    run = _current_run.get()
+    previous = run.phase if run else None
+    if run:
+        run.phase = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.observe(elapsed, phase=name)
+        if run:
+            run.add("wall_seconds", elapsed, name)
+            run.phase = previous
+
+
+def iter_phase(run: Optional[RunMetrics], name: str, iterator: Iterable) -> Iterator:
+    """Duyệt iterator của một phase (vd. Phase1.iter_stories khi streaming).
+
+    Run chỉ được kích hoạt và thời gian chỉ được tính trong mỗi lần next(), không
+    tính thời gian consumer xử lý giữa các lần yield.
+    """
+    iterator = iter(iterator)
+    total = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            token = _current_run.set(run) if run else None
+            previous = run.phase if run else None
+            if run:
+                run.phase = name
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - started
+                total += elapsed
+                if run:
+                    run.add("wall_seconds", elapsed, name)
+                    run.phase = previous
+                if token is not None:
+                    _current_run.reset(token)
+            yield item
+    finally:
+        PHASE_SECONDS.observe(total, phase=name)
+
+
+@contextmanager
+def nlp_timer():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        run = _current_run.get()
+        if run:
+            run.add("nlp_seconds", elapsed)
+        NLP_SECONDS.inc(elapsed, phase=_current_phase())
+
+
+def record_db_query(elapsed: float, rows_written: int = 0, failed: bool = False):
+    run = _current_run.get()
+    name = _current_phase()
+    if run:
+        run.add("db_seconds", elapsed)
+        run.add("db_queries", 1)
+        if failed:
+            run.add("db_errors", 1)
+        if rows_written:
+            run.add("rows_written", rows_written)
+    DB_QUERY_SECONDS.observe(elapsed, phase=name)
+    if failed:
+        DB_QUERY_ERRORS.inc(phase=name)
+    if rows_written:
+        DB_ROWS_WRITTEN.inc(rows_written, phase=name)
+
+
+def timed_commit(session):
+    """session.commit() kèm đo thời gian commit."""
+    started = time.perf_counter()
+    session.commit()
+    elapsed = time.perf_counter() - started
+    run = _current_run.get()
+    if run:
+        run.add("db_seconds", elapsed)
+        run.add("db_commits", 1)
+    DB_COMMIT_SECONDS.observe(elapsed, phase=_current_phase())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    rows = 0
+    if statement.lstrip()[:6].upper() in _WRITE_STATEMENTS and cursor.rowcount and cursor.rowcount > 0:
+        rows = cursor.rowcount
+    record_db_query(time.perf_counter() - started, rows)
+
+
+def _handle_error(context):
+    """Câu lệnh raise không tới after_cursor_execute: lấy thời điểm bắt đầu ra khỏi
+    conn.info và vẫn ghi nhận query (là lỗi)."""
+    conn = context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    # Không có execution context: lỗi trước khi câu lệnh được gửi (vd. lúc connect),
+    # before_cursor_execute chưa chạy
+    if not started or context.execution_context is None:
+        return
+    record_db_query(time.perf_counter() - started.pop(), failed=True)
+
+
+def instrument_engine(engine):
+    """Đăng ký event đo mọi câu lệnh SQL của engine."""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def timed_graph(fn):
+    """Decorator cho method của GraphDB: đo thời gian và số rows của mỗi lời gọi."""
+    operation = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = kwargs.get("rows", kwargs.get("values"))
+            if rows is None and len(args) > 3 and isinstance(args[-1], list):
+                rows = args[-1]
+            run = _current_run.get()
+            name = _current_phase()
+            if run:
+                run.add("graph_seconds", elapsed)
+                run.add("graph_calls", 1)
+                run.add("graph_rows", len(rows) if rows is not None else 0)
+            GRAPH_CALL_SECONDS.observe(elapsed, phase=name, operation=operation)
+            if rows is not None:
+                GRAPH_ROWS.inc(len(rows), phase=name, operation=operation)
+
+    return wrapper
+
+
+def save_run_metrics(run: RunMetrics, session_id: Optional[str]):
+    """Ghi breakdown của run vào ProcessingSession.metadata_info['metrics']."""
+    if not session_id:
+        return
+    from database import DatabaseSession
+    from models.models import ProcessingSession
+
+    breakdown = run.to_dict()
+    try:
+        with DatabaseSession() as session:
+            processing_session = session.query(ProcessingSession).filter_by(id=session_id).first()
+            if processing_session:
+                meta = dict(processing_session.metadata_info or {})
+                meta["metrics"] = breakdown
+                processing_session.metadata_info = meta
+    except Exception as e:
+        logging.warning(f"⚠️ Failed to store run metrics for session {session_id}: {e}")
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,67 @@
+"""Versioned schema migrations cho MySQL.
+
+Mỗi module trong `migrations/versions` có:
+    VERSION      -- chuỗi version, sắp xếp tăng dần
+    DESCRIPTION  -- mô tả ngắn
+    upgrade(conn)            -- áp dụng thay đổi (phải idempotent)
+    should_apply(conn)       -- (tuỳ chọn) False để bỏ qua mà không ghi nhận version
+
+Version đã áp dụng được lưu trong bảng `schema_migrations`.
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select
+
+from . import versions
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(64), primary_key=True),
+    Column('description', String(255)),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+
+def load_migrations() -> list:
+    """Tất cả migration modules, theo thứ tự VERSION."""
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(versions.__path__)
+    ]
+    return sorted(modules, key=lambda m: m.VERSION)
+
+
+def applied_versions(engine) -> List[str]:
+    _metadata.create_all(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(select(schema_migrations.c.version))]
+
+
+def pending_migrations(engine) -> list:
+    applied = set(applied_versions(engine))
+    return [m for m in load_migrations() if m.VERSION not in applied]
+
+
+def run_migrations(engine) -> List[str]:
+    """Áp dụng các migration chưa chạy, mỗi migration trong một transaction riêng."""
+    applied = []
+    for migration in pending_migrations(engine):
+        with engine.begin() as conn:
+            should_apply = getattr(migration, 'should_apply', None)
+            if should_apply is not None and not should_apply(conn):
+                continue
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.VERSION,
+                description=migration.DESCRIPTION,
+                applied_at=datetime.utcnow(),
+            ))
+        applied.append(migration.VERSION)
+        logging.info(f"✅ Applied migration {migration.VERSION}: {migration.DESCRIPTION}")
+    return applied
@@ -0,0 +1,27 @@
+"""CLI: python -m migrations [upgrade|status]"""
+import sys
+
+from database import get_database_manager
+from . import applied_versions, load_migrations, run_migrations
+
+
+def main(argv=None):
+    command = (argv or sys.argv[1:] or ["upgrade"])[0]
+    engine = get_database_manager().engine
+
+    if command == "status":
+        applied = set(applied_versions(engine))
+        for migration in load_migrations():
+            mark = "x" if migration.VERSION in applied else " "
+            print(f"[{mark}] {migration.VERSION} {migration.DESCRIPTION}")
+    elif command == "upgrade":
+        applied = run_migrations(engine)
+        print(f"Applied: {', '.join(applied) if applied else 'nothing to do'}")
+    else:
+        print(f"Unknown command: {command}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
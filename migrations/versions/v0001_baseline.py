@@ -0,0 +1,10 @@
+from models.models import Base
+
+VERSION = "0001"
+DESCRIPTION = "baseline tables"
+
+
+def upgrade(conn):
+    # Bảng đã tồn tại (database tạo bằng create_all trước đây) được giữ nguyên;
+    # các migration sau tự kiểm tra và bổ sung phần còn thiếu.
+    Base.metadata.create_all(bind=conn, checkfirst=True)
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0002"
+DESCRIPTION = "composite lookup indexes for concepts and processing_sessions"
+
+INDEXES = [
+    ('concepts', 'ix_concepts_story_role', ['user_story_id', 'role']),
+    ('concepts', 'ix_concepts_story_action', ['user_story_id', 'action']),
+    ('concepts', 'ix_concepts_story_object', ['user_story_id', 'object']),
+    ('processing_sessions', 'ix_processing_sessions_status_created', ['status', 'created_at']),
+    ('processing_sessions', 'ix_processing_sessions_session_name', ['session_name']),
+]
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table, name, columns in INDEXES:
+        existing = {ix['name'] for ix in inspector.get_indexes(table)}
+        if name not in existing:
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(quote(c) for c in columns)})"))
+
+
+def downgrade(conn):
+    inspector = inspect(conn)
+    for table, name, _ in INDEXES:
+        existing = {ix['name'] for ix in inspector.get_indexes(table)}
+        if name in existing:
+            suffix = f" ON {table}" if conn.dialect.name == 'mysql' else ""
+            conn.execute(text(f"DROP INDEX {name}{suffix}"))
@@ -0,0 +1,58 @@
+"""Chuyển các cột UUID từ VARCHAR(36) sang BINARY(16) (chỉ MySQL, khi UUID_STORAGE=binary).
+
+Migration này là tuỳ chọn: khi UUID_STORAGE khác "binary" nó được bỏ qua và vẫn ở
+trạng thái pending, nên bật binary mode sau này rồi chạy lại migrations là đủ.
+"""
+from sqlalchemy import inspect, text
+
+from constant import UUID_STORAGE
+from models.models import Base
+from models.types import GUID
+
+VERSION = "0003"
+DESCRIPTION = "compact BINARY(16) UUID storage"
+
+
+def _uuid_columns(inspector):
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for column in table.columns:
+            if isinstance(column.type, GUID):
+                yield table.name, column
+
+
+def should_apply(conn) -> bool:
+    if UUID_STORAGE != "binary" or conn.dialect.name != "mysql":
+        return False
+    columns = {c['name']: c for c in inspect(conn).get_columns('user_stories')}
+    return 'BINARY' not in str(columns['id']['type']).upper()
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    foreign_keys = [
+        (table, fk) for table in inspector.get_table_names()
+        for fk in inspector.get_foreign_keys(table)
+    ]
+
+    # FK phải được gỡ trước khi đổi kiểu cột và tạo lại sau đó
+    for table, fk in foreign_keys:
+        conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {fk['name']}"))
+
+    for table, column in _uuid_columns(inspector):
+        null_sql = "NULL" if column.nullable and not column.primary_key else "NOT NULL"
+        conn.execute(text(f"ALTER TABLE {table} MODIFY {column.name} VARBINARY(36) {null_sql}"))
+        conn.execute(text(
+            f"UPDATE {table} SET {column.name} = UNHEX(REPLACE({column.name}, '-', '')) "
+            f"WHERE LENGTH({column.name}) = 36"
+        ))
+        conn.execute(text(f"ALTER TABLE {table} MODIFY {column.name} BINARY(16) {null_sql}"))
+
+    for table, fk in foreign_keys:
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD CONSTRAINT {fk['name']} "
+            f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
+            f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])})"
+        ))
@@ -0,0 +1,26 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0004"
+DESCRIPTION = "user_stories.processing_session_id / position for paging job results"
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    columns = {c['name'] for c in inspector.get_columns('user_stories')}
+    uuid_type = 'BINARY(16)' if _uses_binary_uuid(inspector) else 'VARCHAR(36)'
+
+    if 'processing_session_id' not in columns:
+        conn.execute(text(f"ALTER TABLE user_stories ADD COLUMN processing_session_id {uuid_type} NULL"))
+    if 'position' not in columns:
+        conn.execute(text("ALTER TABLE user_stories ADD COLUMN position INTEGER NULL"))
+
+    indexes = {ix['name'] for ix in inspector.get_indexes('user_stories')}
+    if 'ix_user_stories_session_position' not in indexes:
+        conn.execute(text(
+            "CREATE INDEX ix_user_stories_session_position ON user_stories (processing_session_id, position)"
+        ))
+
+
+def _uses_binary_uuid(inspector) -> bool:
+    columns = {c['name']: c for c in inspector.get_columns('user_stories')}
+    return 'BINARY' in str(columns['id']['type']).upper()
@@ -0,0 +1,24 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0005"
+DESCRIPTION = "user_stories.backlog_key / story_key / content_hash for incremental re-analysis"
+
+COLUMNS = [
+    ('backlog_key', 'VARCHAR(100)'),
+    ('story_key', 'VARCHAR(255)'),
+    ('content_hash', 'VARCHAR(64)'),
+]
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    columns = {c['name'] for c in inspector.get_columns('user_stories')}
+    for name, column_type in COLUMNS:
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE user_stories ADD COLUMN {name} {column_type} NULL"))
+
+    indexes = {ix['name'] for ix in inspector.get_indexes('user_stories')}
+    if 'ix_user_stories_backlog_story_key' not in indexes:
+        conn.execute(text(
+            "CREATE INDEX ix_user_stories_backlog_story_key ON user_stories (backlog_key, story_key)"
+        ))
@@ -0,0 +1,12 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0006"
+DESCRIPTION = "concept_synonyms (original_concept, synonym) index for Phase3 bulk writes"
+
+
+def upgrade(conn):
+    indexes = {ix['name'] for ix in inspect(conn).get_indexes('concept_synonyms')}
+    if 'ix_concept_synonyms_concept_synonym' not in indexes:
+        conn.execute(text(
+            "CREATE INDEX ix_concept_synonyms_concept_synonym ON concept_synonyms (original_concept, synonym)"
+        ))
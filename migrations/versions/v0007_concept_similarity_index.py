@@ -0,0 +1,12 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0007"
+DESCRIPTION = "concept_similarities (concept1, concept2) index for Phase3 bulk writes"
+
+
+def upgrade(conn):
+    indexes = {ix['name'] for ix in inspect(conn).get_indexes('concept_similarities')}
+    if 'ix_concept_similarities_pair' not in indexes:
+        conn.execute(text(
+            "CREATE INDEX ix_concept_similarities_pair ON concept_similarities (concept1, concept2)"
+        ))
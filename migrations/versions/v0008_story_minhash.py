@@ -0,0 +1,9 @@
+from models.models import StoryLSHBucket, StoryMinHash
+
+VERSION = "0008"
+DESCRIPTION = "story_minhashes / story_lsh_buckets for near-duplicate story detection"
+
+
+def upgrade(conn):
+    StoryMinHash.__table__.create(bind=conn, checkfirst=True)
+    StoryLSHBucket.__table__.create(bind=conn, checkfirst=True)
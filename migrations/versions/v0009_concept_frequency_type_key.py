@@ -0,0 +1,59 @@
+from sqlalchemy import inspect, text
+
+from models.models import ConceptFrequency
+
+VERSION = "0009"
+DESCRIPTION = "concept_frequency unique on (concept_type, concept_text) for global frequency counters"
+
+UNIQUE_INDEX = 'uq_concept_frequency_type_text'
+TOP_INDEX = 'ix_concept_frequency_type_frequency'
+
+
+def _text_only_uniques(inspector):
+    """Tên unique constraint / unique index chỉ trên concept_text (từ bảng cũ)."""
+    names = {
+        uc['name'] for uc in inspector.get_unique_constraints('concept_frequency')
+        if uc['column_names'] == ['concept_text']
+    }
+    names |= {
+        ix['name'] for ix in inspector.get_indexes('concept_frequency')
+        if ix.get('unique') and ix['column_names'] == ['concept_text']
+    }
+    return names
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if not inspector.has_table('concept_frequency'):
+        ConceptFrequency.__table__.create(bind=conn)
+        return
+
+    old_uniques = _text_only_uniques(inspector)
+    if old_uniques:
+        rows = conn.execute(text("SELECT COUNT(*) FROM concept_frequency")).scalar()
+        if not rows:
+            # Bảng chưa từng được ghi: tạo lại theo model
+            ConceptFrequency.__table__.drop(bind=conn)
+            ConceptFrequency.__table__.create(bind=conn)
+            return
+        if conn.dialect.name == 'mysql':
+            for name in old_uniques:
+                conn.execute(text(f"ALTER TABLE concept_frequency DROP INDEX {name}"))
+        else:
+            # SQLite không DROP CONSTRAINT được: copy sang bảng mới
+            conn.execute(text("ALTER TABLE concept_frequency RENAME TO concept_frequency_old"))
+            ConceptFrequency.__table__.create(bind=conn)
+            conn.execute(text(
+                "INSERT INTO concept_frequency (id, concept_text, frequency, concept_type, updated_at) "
+                "SELECT id, concept_text, frequency, concept_type, updated_at FROM concept_frequency_old"
+            ))
+            conn.execute(text("DROP TABLE concept_frequency_old"))
+            return
+
+    indexes = {ix['name'] for ix in inspect(conn).get_indexes('concept_frequency')}
+    if UNIQUE_INDEX not in indexes:
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON concept_frequency (concept_type, concept_text)"
+        ))
+    if TOP_INDEX not in indexes:
+        conn.execute(text(f"CREATE INDEX {TOP_INDEX} ON concept_frequency (concept_type, frequency)"))
@@ -0,0 +1,27 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0010"
+DESCRIPTION = "concept_synonyms unique on (original_concept, synonym) so concurrent Phase3 runs cannot duplicate pairs"
+
+UNIQUE_INDEX = 'uq_concept_synonyms_concept_synonym'
+OLD_INDEX = 'ix_concept_synonyms_concept_synonym'
+
+
+def upgrade(conn):
+    indexes = {ix['name'] for ix in inspect(conn).get_indexes('concept_synonyms')}
+    if UNIQUE_INDEX not in indexes:
+        # Giữ một dòng cho mỗi cặp (bảng dẫn xuất để MySQL cho phép xoá trên cùng bảng)
+        conn.execute(text(
+            "DELETE FROM concept_synonyms WHERE id NOT IN ("
+            "SELECT id FROM (SELECT MIN(id) AS id FROM concept_synonyms "
+            "GROUP BY original_concept, synonym) AS keep_rows)"
+        ))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON concept_synonyms (original_concept, synonym)"
+        ))
+    if OLD_INDEX in indexes:
+        # Unique index đã bao phủ index cũ của 0006
+        if conn.dialect.name == 'mysql':
+            conn.execute(text(f"DROP INDEX {OLD_INDEX} ON concept_synonyms"))
+        else:
+            conn.execute(text(f"DROP INDEX {OLD_INDEX}"))
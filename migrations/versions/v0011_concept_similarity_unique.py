@@ -0,0 +1,31 @@
+from sqlalchemy import inspect, text
+
+VERSION = "0011"
+DESCRIPTION = "concept_similarities unique on (concept1, concept2, similarity_type) so concurrent Phase3 runs cannot duplicate pairs"
+
+UNIQUE_INDEX = 'uq_concept_similarities_pair'
+OLD_INDEX = 'ix_concept_similarities_pair'
+
+
+def upgrade(conn):
+    indexes = {ix['name'] for ix in inspect(conn).get_indexes('concept_similarities')}
+    if UNIQUE_INDEX not in indexes:
+        # Dòng cũ không có similarity_type là Wu-Palmer (default của model)
+        conn.execute(text(
+            "UPDATE concept_similarities SET similarity_type = 'Wu-Palmer' WHERE similarity_type IS NULL"
+        ))
+        # Giữ một dòng cho mỗi cặp (bảng dẫn xuất để MySQL cho phép xoá trên cùng bảng)
+        conn.execute(text(
+            "DELETE FROM concept_similarities WHERE id NOT IN ("
+            "SELECT id FROM (SELECT MIN(id) AS id FROM concept_similarities "
+            "GROUP BY concept1, concept2, similarity_type) AS keep_rows)"
+        ))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON concept_similarities (concept1, concept2, similarity_type)"
+        ))
+    if OLD_INDEX in indexes:
+        # Unique index đã bao phủ index cũ của 0007
+        if conn.dialect.name == 'mysql':
+            conn.execute(text(f"DROP INDEX {OLD_INDEX} ON concept_similarities"))
+        else:
+            conn.execute(text(f"DROP INDEX {OLD_INDEX}"))
@@ -6,8 +6,10 @@ from .concept_synonym import ConceptSynonym
 from .concept_similarity import ConceptSimilarity
 from .svo_relationship import SVORelationship
 from .processing_session import ProcessingSession
+from .story_minhash import StoryMinHash, StoryLSHBucket
 
 __all__ = [
     'Base', 'UserStory', 'Concept', 'ConceptFrequency', 'ConceptSynonym',
-    'ConceptSimilarity', 'SVORelationship', 'ProcessingSession'
+    'ConceptSimilarity', 'SVORelationship', 'ProcessingSession',
+    'StoryMinHash', 'StoryLSHBucket'
 ]
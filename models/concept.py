@@ -1,16 +1,23 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, JSON, ForeignKey
+from sqlalchemy import Index, Column, String, DateTime, JSON, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class Concept(Base):
     """Bảng lưu trữ concepts từ Phase 1"""
     __tablename__ = 'concepts'
+    __table_args__ = (
+        # Lookup concept theo story + text (Phase1/Phase3), cột đầu cũng phục vụ FK
+        Index('ix_concepts_story_role', 'user_story_id', 'role'),
+        Index('ix_concepts_story_action', 'user_story_id', 'action'),
+        Index('ix_concepts_story_object', 'user_story_id', 'object'),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_story_id = Column(String(36), ForeignKey('user_stories.id'), nullable=False)
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), nullable=False)
     role = Column(String(255))
     action = Column(String(255))
     object = Column(String(255))
@@ -1,15 +1,22 @@
 import uuid
-from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy import Index, Column, String, Integer, DateTime
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class ConceptFrequency(Base):
     """Bảng lưu trữ tần suất concepts từ Phase 2"""
     __tablename__ = 'concept_frequency'
+    __table_args__ = (
+        # Một counter cho mỗi (type, text): cùng text có thể vừa là role vừa là object
+        Index('uq_concept_frequency_type_text', 'concept_type', 'concept_text', unique=True),
+        # Top-N concept theo type
+        Index('ix_concept_frequency_type_frequency', 'concept_type', 'frequency'),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    concept_text = Column(String(255), unique=True, nullable=False)
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    concept_text = Column(String(255), nullable=False)
     frequency = Column(Integer, default=1)
     concept_type = Column(String(50))  # 'role', 'object', 'action'
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,14 +1,19 @@
 import uuid
-from sqlalchemy import Column, String, Float, DateTime
+from sqlalchemy import Index, Column, String, Float, DateTime
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class ConceptSimilarity(Base):
     """Bảng lưu trữ similarity scores từ Phase 3"""
     __tablename__ = 'concept_similarities'
+    __table_args__ = (
+        # Mỗi cặp một dòng cho mỗi loại similarity; Phase3 insert bỏ qua cặp đã có
+        Index('uq_concept_similarities_pair', 'concept1', 'concept2', 'similarity_type', unique=True),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
     concept1 = Column(String(255), nullable=False)
     concept2 = Column(String(255), nullable=False)
     similarity_score = Column(Float, nullable=False)
@@ -1,14 +1,19 @@
 import uuid
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Index, Column, String, DateTime
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class ConceptSynonym(Base):
     """Bảng lưu trữ synonyms từ WordNet"""
     __tablename__ = 'concept_synonyms'
+    __table_args__ = (
+        # Mỗi cặp (concept, synonym) một dòng; Phase3 insert bỏ qua cặp đã có
+        Index('uq_concept_synonyms_concept_synonym', 'original_concept', 'synonym', unique=True),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
     original_concept = Column(String(255), nullable=False)
     synonym = Column(String(255), nullable=False)
     source = Column(String(50), default='wordnet')
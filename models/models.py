@@ -1,7 +1,8 @@
 import uuid
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, JSON, ForeignKey
+from sqlalchemy import Index, BigInteger, Column, Integer, LargeBinary, String, Text, Float, DateTime, JSON, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from .types import GUID
 from datetime import datetime
 
 Base = declarative_base()
@@ -9,11 +10,23 @@ Base = declarative_base()
 class UserStory(Base):
     """Bảng lưu trữ user stories gốc"""
     __tablename__ = 'user_stories'
+    __table_args__ = (
+        Index('ix_user_stories_session_position', 'processing_session_id', 'position'),
+        Index('ix_user_stories_backlog_story_key', 'backlog_key', 'story_key'),
+    )
     
     # Use UUID strings for primary key and external story identifier
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    story_id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    story_id = Column(GUID(), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     original_text = Column(Text, nullable=False)
+    # ProcessingSession đã tạo story và vị trí trong payload (phân trang kết quả job)
+    processing_session_id = Column(GUID())
+    position = Column(Integer)
+    # Incremental re-analysis: story thuộc backlog nào, key ổn định (do caller cung cấp
+    # hoặc = content_hash) và sha256 của text để phát hiện story đã thay đổi
+    backlog_key = Column(String(100))
+    story_key = Column(String(255))
+    content_hash = Column(String(64))
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -23,9 +36,15 @@ class UserStory(Base):
 class Concept(Base):
     """Bảng lưu trữ concepts từ Phase 1"""
     __tablename__ = 'concepts'
+    __table_args__ = (
+        # Lookup concept theo story + text (Phase1/Phase3), cột đầu cũng phục vụ FK
+        Index('ix_concepts_story_role', 'user_story_id', 'role'),
+        Index('ix_concepts_story_action', 'user_story_id', 'action'),
+        Index('ix_concepts_story_object', 'user_story_id', 'object'),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_story_id = Column(String(36), ForeignKey('user_stories.id'), nullable=False)
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), nullable=False)
     role = Column(String(255))
     action = Column(String(255))
     object = Column(String(255))
@@ -39,9 +58,15 @@ class Concept(Base):
 class ConceptFrequency(Base):
     """Bảng lưu trữ tần suất concepts từ Phase 2"""
     __tablename__ = 'concept_frequency'
+    __table_args__ = (
+        # Một counter cho mỗi (type, text): cùng text có thể vừa là role vừa là object
+        Index('uq_concept_frequency_type_text', 'concept_type', 'concept_text', unique=True),
+        # Top-N concept theo type
+        Index('ix_concept_frequency_type_frequency', 'concept_type', 'frequency'),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    concept_text = Column(String(255), unique=True, nullable=False)
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    concept_text = Column(String(255), nullable=False)
     frequency = Column(Integer, default=1)
     concept_type = Column(String(50))  # 'role', 'object', 'action'
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -51,8 +76,12 @@ class ConceptFrequency(Base):
 class ConceptSynonym(Base):
     """Bảng lưu trữ synonyms từ WordNet"""
     __tablename__ = 'concept_synonyms'
+    __table_args__ = (
+        # Mỗi cặp (concept, synonym) một dòng; Phase3 insert bỏ qua cặp đã có
+        Index('uq_concept_synonyms_concept_synonym', 'original_concept', 'synonym', unique=True),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
     original_concept = Column(String(255), nullable=False)
     synonym = Column(String(255), nullable=False)
     source = Column(String(50), default='wordnet')
@@ -61,8 +90,12 @@ class ConceptSynonym(Base):
 class ConceptSimilarity(Base):
     """Bảng lưu trữ similarity scores từ Phase 3"""
     __tablename__ = 'concept_similarities'
+    __table_args__ = (
+        # Mỗi cặp một dòng cho mỗi loại similarity; Phase3 insert bỏ qua cặp đã có
+        Index('uq_concept_similarities_pair', 'concept1', 'concept2', 'similarity_type', unique=True),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
     concept1 = Column(String(255), nullable=False)
     concept2 = Column(String(255), nullable=False)
     similarity_score = Column(Float, nullable=False)
@@ -73,8 +106,8 @@ class SVORelationship(Base):
     """Bảng lưu trữ Subject-Verb-Object relationships"""
     __tablename__ = 'svo_relationships'
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_story_id = Column(String(36), ForeignKey('user_stories.id'), nullable=False)
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), nullable=False)
     subject = Column(String(255))
     verb = Column(String(255))
     object = Column(String(255))
@@ -83,12 +116,38 @@ class SVORelationship(Base):
     # Relationships
     user_story = relationship("UserStory", back_populates="svo_relationships")
 
+class StoryMinHash(Base):
+    """MinHash signature của user story (phát hiện story gần trùng)"""
+    __tablename__ = 'story_minhashes'
+
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), primary_key=True)
+    num_perm = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # num_perm x uint32
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class StoryLSHBucket(Base):
+    """LSH bucket (band, hash của band) của từng story"""
+    __tablename__ = 'story_lsh_buckets'
+    __table_args__ = (
+        Index('ix_story_lsh_buckets_hash_band', 'bucket_hash', 'band'),
+        Index('ix_story_lsh_buckets_story', 'user_story_id'),
+    )
+
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    band = Column(Integer, nullable=False)
+    bucket_hash = Column(BigInteger, nullable=False)
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), nullable=False)
+
 # Removed several auxiliary tables for simplification. Keep a lightweight ProcessingSession
 class ProcessingSession(Base):
     """Lightweight processing session tracking"""
     __tablename__ = 'processing_sessions'
+    __table_args__ = (
+        Index('ix_processing_sessions_status_created', 'status', 'created_at'),
+        Index('ix_processing_sessions_session_name', 'session_name'),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
     session_name = Column(String(100))
     phase_completed = Column(Integer, default=0)
     total_stories = Column(Integer)
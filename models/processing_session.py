@@ -1,14 +1,19 @@
 import uuid
-from sqlalchemy import Column, String, Integer, DateTime, JSON
+from sqlalchemy import Index, Column, String, Integer, DateTime, JSON
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class ProcessingSession(Base):
     """Lightweight processing session tracking"""
     __tablename__ = 'processing_sessions'
+    __table_args__ = (
+        Index('ix_processing_sessions_status_created', 'status', 'created_at'),
+        Index('ix_processing_sessions_session_name', 'session_name'),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
     session_name = Column(String(100))
     phase_completed = Column(Integer, default=0)
     total_stories = Column(Integer)
@@ -0,0 +1,29 @@
+import uuid
+from sqlalchemy import Index, BigInteger, Column, Integer, LargeBinary, DateTime, ForeignKey
+from datetime import datetime
+from .base import Base
+from .types import GUID
+
+
+class StoryMinHash(Base):
+    """MinHash signature của user story (phát hiện story gần trùng)"""
+    __tablename__ = 'story_minhashes'
+
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), primary_key=True)
+    num_perm = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # num_perm x uint32
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class StoryLSHBucket(Base):
+    """LSH bucket (band, hash của band) của từng story"""
+    __tablename__ = 'story_lsh_buckets'
+    __table_args__ = (
+        Index('ix_story_lsh_buckets_hash_band', 'bucket_hash', 'band'),
+        Index('ix_story_lsh_buckets_story', 'user_story_id'),
+    )
+
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    band = Column(Integer, nullable=False)
+    bucket_hash = Column(BigInteger, nullable=False)
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), nullable=False)
@@ -3,14 +3,15 @@ from sqlalchemy import Column, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class SVORelationship(Base):
     """Bảng lưu trữ Subject-Verb-Object relationships"""
     __tablename__ = 'svo_relationships'
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_story_id = Column(String(36), ForeignKey('user_stories.id'), nullable=False)
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_story_id = Column(GUID(), ForeignKey('user_stories.id'), nullable=False)
     subject = Column(String(255))
     verb = Column(String(255))
     object = Column(String(255))
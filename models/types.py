@@ -0,0 +1,42 @@
+import uuid
+from sqlalchemy import String
+from sqlalchemy.dialects.mysql import BINARY
+from sqlalchemy.types import TypeDecorator
+from constant import UUID_STORAGE
+
+
+class GUID(TypeDecorator):
+    """UUID column lưu dạng VARCHAR(36) (mặc định) hoặc BINARY(16) trên MySQL.
+
+    Phía Python luôn làm việc với UUID string, nên việc đổi storage mode
+    (UUID_STORAGE=binary) không ảnh hưởng code của các phase.
+    """
+
+    impl = String(36)
+    cache_ok = True
+
+    def __init__(self, binary: bool = None):
+        super().__init__()
+        self.binary = UUID_STORAGE == "binary" if binary is None else binary
+
+    def _use_binary(self, dialect) -> bool:
+        return self.binary and dialect.name == "mysql"
+
+    def load_dialect_impl(self, dialect):
+        if self._use_binary(dialect):
+            return dialect.type_descriptor(BINARY(16))
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if self._use_binary(dialect):
+            return value.bytes if isinstance(value, uuid.UUID) else uuid.UUID(str(value)).bytes
+        return str(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray)):
+            return str(uuid.UUID(bytes=bytes(value)))
+        return str(value)
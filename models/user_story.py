@@ -1,18 +1,31 @@
 import uuid
-from sqlalchemy import Column, String, Text, DateTime
+from sqlalchemy import Index, Column, Integer, String, Text, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
+from .types import GUID
 
 
 class UserStory(Base):
     """Bảng lưu trữ user stories gốc"""
     __tablename__ = 'user_stories'
+    __table_args__ = (
+        Index('ix_user_stories_session_position', 'processing_session_id', 'position'),
+        Index('ix_user_stories_backlog_story_key', 'backlog_key', 'story_key'),
+    )
     
     # Use UUID strings for primary key and external story identifier
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    story_id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    id = Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()))
+    story_id = Column(GUID(), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     original_text = Column(Text, nullable=False)
+    # ProcessingSession đã tạo story và vị trí trong payload (phân trang kết quả job)
+    processing_session_id = Column(GUID())
+    position = Column(Integer)
+    # Incremental re-analysis: story thuộc backlog nào, key ổn định (do caller cung cấp
+    # hoặc = content_hash) và sha256 của text để phát hiện story đã thay đổi
+    backlog_key = Column(String(100))
+    story_key = Column(String(255))
+    content_hash = Column(String(64))
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
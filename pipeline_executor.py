@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from constant import JOB_MAX_QUEUE, JOB_MAX_WORKERS, PIPELINE_MAX_QUEUE, PIPELINE_MAX_WORKERS
+
+
+class PipelineSaturatedError(Exception):
+    """Pool đã đầy (đang chạy + đang chờ), request nên được retry sau."""
+
+
+class PipelineExecutor:
+    """Bounded thread pool chạy pipeline Phase1-4 ngoài event loop.
+
+    Tối đa `max_workers` job chạy đồng thời và `max_queue` job chờ; vượt quá thì
+    submit ném PipelineSaturatedError ngay (backpressure) thay vì xếp hàng vô hạn.
+    """
+
+    def __init__(self, max_workers: int = PIPELINE_MAX_WORKERS, max_queue: int = PIPELINE_MAX_QUEUE):
+        self.max_workers = max(max_workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def acquire_slot(self):
+        """Giữ một slot (không chờ); ném PipelineSaturatedError nếu pool đã đầy."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logging.warning("⚠️ Pipeline pool saturated, rejecting request")
+            raise PipelineSaturatedError("Pipeline pool is saturated, retry later")
+        with self._lock:
+            self._in_flight += 1
+
+    def release_slot(self, *_):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        self.acquire_slot()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self.release_slot()
+            raise
+        future.add_done_callback(self.release_slot)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Chạy fn trong pool và await kết quả mà không chặn event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight
+            rejected = self._rejected
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "running": min(in_flight, self.max_workers),
+            "queued": max(in_flight - self.max_workers, 0),
+            "rejected": rejected,
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+# Singleton pattern cho pipeline executor
+_pipeline_executor: Optional[PipelineExecutor] = None
+_job_executor: Optional[PipelineExecutor] = None
+
+
+def get_pipeline_executor() -> PipelineExecutor:
+    """Lấy instance của PipelineExecutor (singleton)"""
+    global _pipeline_executor
+
+    if _pipeline_executor is None:
+        _pipeline_executor = PipelineExecutor()
+
+    return _pipeline_executor
+
+
+def get_job_executor() -> PipelineExecutor:
+    """Pool riêng cho async jobs, để job lớn không chiếm slot của request đồng bộ"""
+    global _job_executor
+
+    if _job_executor is None:
+        _job_executor = PipelineExecutor(max_workers=JOB_MAX_WORKERS, max_queue=JOB_MAX_QUEUE)
+
+    return _job_executor
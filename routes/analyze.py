@@ -1,13 +1,21 @@
+import os
+import threading
 import uuid
 
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import List
-from constant import PASSWORD_GRAPH_DB, URL_CONNECTION_GRAPH_DB, USER_GRAPH_DB
+from fastapi import APIRouter, Header, Query
+from pydantic import BaseModel, model_validator
+from typing import List, Optional
 from fastapi import HTTPException
 
-from graphdb import GraphDB
-from controllers.analyze_controller import analyze_stories_controller
+from graphdb import get_graph_db
+from constant import PIPELINE_RETRY_AFTER_SECONDS, PROFILING_ENABLED, PROFILING_TOKEN
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from controllers.analyze_controller import analyze_stories_controller, stream_analyze_controller
+from controllers.job_controller import get_job_results, get_job_status, submit_analyze_job
+from pipeline_executor import PipelineSaturatedError, get_pipeline_executor
+from services.profiling import PROFILE_MODES, ProfilerBusyError, get_profile_path, run_profiled
+from warmup import get_warmup_state
 
 router = APIRouter()
 # ---- Models ----
@@ -16,14 +24,137 @@ class StoryInput(BaseModel):
 
 class StoriesInput(BaseModel):
     user_stories: List[str]
+    # Incremental re-analysis: chỉ story thêm mới / đã sửa của backlog đi qua Phase1-4
+    backlog_key: Optional[str] = None
+    story_keys: Optional[List[str]] = None
+    incremental: bool = False
+
+    @model_validator(mode="after")
+    def check_incremental(self):
+        if self.story_keys is not None and len(self.story_keys) != len(self.user_stories):
+            raise ValueError("story_keys must have the same length as user_stories")
+        if self.story_keys is not None:
+            keys = [key for key in self.story_keys if key]
+            if len(set(keys)) != len(keys):
+                raise ValueError("story_keys must be unique")
+        if self.incremental and not self.backlog_key:
+            raise ValueError("backlog_key is required for incremental analysis")
+        return self
+
+def _require_warm():
+    """503 khi đang warm-up hoặc bước bắt buộc (database) chưa ready; khởi động lại warm-up nếu nó đã dừng."""
+    state = get_warmup_state()
+    if state.can_serve():
+        return
+    if not state.running:
+        state.start_background()
+    raise HTTPException(status_code=503, detail="Service is warming up", headers={"Retry-After": "5"})
+
+
+def _profile_mode(profile: Optional[str], token: Optional[str]) -> Optional[str]:
+    """Mode profiling được yêu cầu (query `profile` hoặc header X-Profile), chỉ khi config cho phép."""
+    if not profile:
+        return None
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled")
+    if PROFILING_TOKEN and token != PROFILING_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    if profile not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {sorted(PROFILE_MODES)}")
+    return profile
 
-graph = GraphDB(uri=URL_CONNECTION_GRAPH_DB , user=USER_GRAPH_DB, password=PASSWORD_GRAPH_DB)
 
 @router.post("/analyze")
-async def analyze_stories(data: StoriesInput):
+async def analyze_stories(data: StoriesInput,
+                          profile: Optional[str] = Query(None, description="cprofile | sample"),
+                          x_profile: Optional[str] = Header(None),
+                          x_profile_token: Optional[str] = Header(None)):
+    _require_warm()
+    mode = _profile_mode(profile or x_profile, x_profile_token)
     try:
-        result = analyze_stories_controller(data, graph)
+        # Pipeline (spaCy, PyMySQL, neo4j driver) là blocking: chạy trong bounded pool
+        executor = get_pipeline_executor()
+        if mode:
+            result = await executor.run(run_profiled, mode, analyze_stories_controller, data, get_graph_db())
+        else:
+            result = await executor.run(analyze_stories_controller, data, get_graph_db())
         return result
+    except PipelineSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(PIPELINE_RETRY_AFTER_SECONDS)})
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/analyze/{session_id}/profile")
+def download_profile(session_id: str, x_profile_token: Optional[str] = Header(None)):
+    """Tải profile (.prof pstats hoặc collapsed stacks) của một ProcessingSession."""
+    _profile_mode("cprofile", x_profile_token)
+    found = get_profile_path(session_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path, mode = found
+    media_type = "application/octet-stream" if mode == "cprofile" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
+
+@router.post("/analyze/stream")
+def analyze_stories_stream(data: StoriesInput):
+    """NDJSON streaming: một dòng cho mỗi story, sau đó là phase2 / phase3."""
+    _require_warm()
+    try:
+        graph = get_graph_db()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    executor = get_pipeline_executor()
+    # Streaming chạy ngoài pool nhưng vẫn chiếm một slot để giữ giới hạn concurrency
+    try:
+        executor.acquire_slot()
+    except PipelineSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(PIPELINE_RETRY_AFTER_SECONDS)})
+
+    once = threading.Lock()
+
+    def release():
+        # Gọi từ cả generator lẫn background task; chỉ release đúng một lần
+        if once.acquire(blocking=False):
+            executor.release_slot()
+
+    def body():
+        try:
+            yield from stream_analyze_controller(data, graph)
+        finally:
+            release()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+
+@router.post("/analyze/jobs", status_code=202)
+def create_analyze_job(data: StoriesInput):
+    """Async mode cho payload lớn: trả về ngay job id (ProcessingSession id)."""
+    _require_warm()
+    try:
+        return submit_analyze_job(data, get_graph_db())
+    except PipelineSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(PIPELINE_RETRY_AFTER_SECONDS)})
+
+
+@router.get("/analyze/jobs/{job_id}")
+def analyze_job_status(job_id: str):
+    status = get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
 
+@router.get("/analyze/jobs/{job_id}/results")
+def analyze_job_results(job_id: str, page: int = Query(1, ge=1), page_size: int = Query(100, ge=1, le=1000)):
+    results = get_job_results(job_id, page=page, page_size=page_size)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return results
@@ -0,0 +1,18 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from constant import CONCEPT_FREQUENCY_TOP_N
+from controllers.concept_controller import top_concepts_controller
+
+router = APIRouter()
+
+
+@router.get("/concepts/top")
+def top_concepts(type: Optional[Literal["role", "action", "object"]] = None,
+                 limit: int = Query(CONCEPT_FREQUENCY_TOP_N, ge=1, le=1000)):
+    """Top-N concept theo tần suất toàn corpus (đọc từ bảng concept_frequency)."""
+    try:
+        return top_concepts_controller(concept_type=type, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from constant import DEDUP_TOP_K
+from controllers.story_controller import similar_stories_controller
+
+router = APIRouter()
+
+
+class SimilarStoriesInput(BaseModel):
+    text: str
+    k: int = Field(DEDUP_TOP_K, ge=1, le=100)
+    min_similarity: float = Field(0.0, ge=0.0, le=1.0)
+
+
+@router.post("/stories/similar")
+def similar_stories(data: SimilarStoriesInput):
+    """Top-k story tương tự một đoạn text (MinHash/LSH trên toàn bộ story đã lưu)."""
+    try:
+        return similar_stories_controller(data.text, k=data.k, min_similarity=data.min_similarity)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+from graphdb import get_graph_db
+from pipeline_executor import get_pipeline_executor
+from services.model_registry import get_model_registry
+from services.phase1.cache import get_parse_cache
+from services.phase3.wordnet_index import get_lemma_index
+from warmup import get_warmup_state
+
+router = APIRouter()
+
+
+@router.get("/system/ready")
+def readiness():
+    """Readiness probe: 200 khi database, Neo4j và spaCy model đều đã warm, ngược lại 503."""
+    state = get_warmup_state()
+    if not state.is_ready() and not state.running:
+        # Thử lại các thành phần lỗi (vd. Neo4j khởi động chậm hơn app)
+        state.start_background()
+    report = state.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@router.get("/system/models")
+def loaded_models():
+    """Load time và memory footprint của các spaCy pipeline đã load."""
+    return get_model_registry().stats()
+
+
+@router.get("/system/graph/plans")
+def graph_query_plans():
+    """EXPLAIN các câu MERGE theo key để kiểm tra Neo4j có dùng index hay không."""
+    try:
+        return get_graph_db().explain_merge_plans()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/system/pipeline")
+def pipeline_pool():
+    """Số job đang chạy / đang chờ / bị từ chối của pipeline pool."""
+    return get_pipeline_executor().stats()
+
+
+@router.get("/system/parse-cache")
+def parse_cache_stats():
+    """Hit/miss counters và kích thước của parse cache Phase1."""
+    cache = get_parse_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+@router.get("/system/wordnet")
+def wordnet_index_stats():
+    """Kích thước, thời gian dựng và memo hit/miss của lemma index WordNet (Phase3)."""
+    return get_lemma_index().stats()
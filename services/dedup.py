@@ -0,0 +1,243 @@
+"""Phát hiện user story gần trùng bằng MinHash + LSH.
+
+Mỗi story được biểu diễn bằng tập character 5-gram của text đã chuẩn hoá. MinHash
+signature (num_perm giá trị) ước lượng Jaccard giữa hai tập; signature được chia
+thành `bands` band, story có ít nhất một band trùng hash là ứng viên. Signature và
+bucket được lưu trong `story_minhashes` / `story_lsh_buckets` ngay khi Phase1 insert
+story, nên tìm story gần trùng chỉ tốn vài lookup theo index thay vì so với toàn bộ corpus.
+
+    python -m services.dedup      # backfill signature cho story được tạo trước migration 0008
+"""
+import hashlib
+import logging
+import re
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select, tuple_
+
+from constant import DEDUP_BANDS, DEDUP_MAX_CANDIDATES, DEDUP_NUM_PERM, DEDUP_THRESHOLD, DEDUP_TOP_K
+from models.models import StoryLSHBucket, StoryMinHash, UserStory
+
+SHINGLE_SIZE = 5
+# Số nguyên tố lớn nhất < 2^32: a, b, x < p nên a * x + b < 2^64 (không tràn uint64)
+_PRIME = 4294967291
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CHUNK = 1000
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hash 32-bit (blake2b) của các character k-gram (text lowercase, chỉ giữ chữ / số).
+
+    Không dùng crc32: crc32 tuyến tính nên kết hợp với hash (a * x + b) mod p cho
+    ước lượng Jaccard lệch rất nhiều với các shingle giống nhau về cấu trúc.
+    """
+    normalized = " ".join(_TOKEN_RE.findall(text.lower()))
+    if not normalized:
+        return np.empty(0, dtype=np.uint64)
+    grams = {normalized} if len(normalized) <= k else {
+        normalized[i:i + k] for i in range(len(normalized) - k + 1)
+    }
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.uint64, count=len(grams),
+    )
+
+
+class MinHasher:
+    """MinHash với num_perm hàm hash (a * x + b) mod p; seed cố định để signature ổn định giữa các lần chạy."""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, bands: int = DEDUP_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        values = shingles(text) % np.uint64(_PRIME)
+        if not values.size:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        hashed = (values[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_PRIME)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def band_hashes(self, signature: np.ndarray) -> List[int]:
+        """Hash 64-bit (signed, vừa BIGINT) của từng band."""
+        return [
+            int.from_bytes(
+                hashlib.blake2b(signature[i * self.rows:(i + 1) * self.rows].tobytes(), digest_size=8).digest(),
+                "big", signed=True,
+            )
+            for i in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """Jaccard ước lượng giữa một signature và từng hàng của `others`."""
+        return (others == signature[None, :]).mean(axis=1)
+
+
+_minhasher: Optional[MinHasher] = None
+
+
+def get_minhasher() -> MinHasher:
+    """Lấy instance của MinHasher (singleton)"""
+    global _minhasher
+
+    if _minhasher is None:
+        _minhasher = MinHasher()
+
+    return _minhasher
+
+
+def index_stories(session, stories: Sequence[Tuple[str, str]], signatures: Optional[List[np.ndarray]] = None) -> int:
+    """Lưu signature + LSH buckets của các story vừa insert (multi-row INSERT, không commit).
+
+    Args:
+        stories: (user_story db id, text)
+        signatures: signature đã tính sẵn (cùng thứ tự), tính lại nếu None
+    """
+    if not stories:
+        return 0
+    hasher = get_minhasher()
+    signatures = signatures or [hasher.signature(text) for _, text in stories]
+    now = datetime.utcnow()
+    signature_rows = []
+    bucket_rows = []
+    for (db_id, _), signature in zip(stories, signatures):
+        signature_rows.append({
+            'user_story_id': db_id, 'num_perm': hasher.num_perm,
+            'signature': signature.tobytes(), 'created_at': now,
+        })
+        bucket_rows.extend(
+            {'id': str(uuid.uuid4()), 'band': band, 'bucket_hash': bucket_hash, 'user_story_id': db_id}
+            for band, bucket_hash in enumerate(hasher.band_hashes(signature))
+        )
+    session.execute(insert(StoryMinHash.__table__).values(signature_rows))
+    for offset in range(0, len(bucket_rows), _CHUNK):
+        session.execute(insert(StoryLSHBucket.__table__).values(bucket_rows[offset:offset + _CHUNK]))
+    return len(signature_rows)
+
+
+def find_near_duplicates(session, texts: Sequence[str], exclude_ids: Optional[Sequence[Optional[str]]] = None,
+                         signatures: Optional[List[np.ndarray]] = None, threshold: float = DEDUP_THRESHOLD,
+                         top_k: int = DEDUP_TOP_K) -> List[List[Dict[str, Any]]]:
+    """Story đã lưu gần trùng với từng text (Jaccard ước lượng >= threshold, tối đa top_k).
+
+    Chi phí mỗi text là `bands` bucket lookup cộng tối đa DEDUP_MAX_CANDIDATES
+    phép so sánh signature, không phụ thuộc kích thước corpus.
+
+    Args:
+        exclude_ids: db id cần bỏ qua cho từng text (vd. chính story đó)
+    """
+    hasher = get_minhasher()
+    signatures = signatures or [hasher.signature(text) for text in texts]
+    exclude_ids = exclude_ids or [None] * len(texts)
+    bands = [hasher.band_hashes(signature) for signature in signatures]
+
+    # 1. Bucket lookup theo (band, bucket_hash) cho mọi band của mọi text. Mỗi bucket chỉ
+    # trả về tối đa DEDUP_MAX_CANDIDATES + 1 story (+1 cho chính story bị exclude), nên
+    # backlog gửi lại nhiều lần (cùng bucket) không làm lookup tăng theo số bản sao
+    wanted = sorted({(band, h) for hashes in bands for band, h in enumerate(hashes)})
+    bucket_members: Dict[Tuple[int, int], List[str]] = {}
+    for offset in range(0, len(wanted), _CHUNK):
+        rank = func.row_number().over(
+            partition_by=(StoryLSHBucket.band, StoryLSHBucket.bucket_hash),
+            order_by=StoryLSHBucket.user_story_id,
+        ).label("rank")
+        ranked = select(StoryLSHBucket.band, StoryLSHBucket.bucket_hash, StoryLSHBucket.user_story_id, rank).where(
+            tuple_(StoryLSHBucket.band, StoryLSHBucket.bucket_hash).in_(wanted[offset:offset + _CHUNK])
+        ).subquery()
+        rows = session.execute(
+            select(ranked.c.band, ranked.c.bucket_hash, ranked.c.user_story_id).where(
+                ranked.c.rank <= DEDUP_MAX_CANDIDATES + 1
+            )
+        ).all()
+        for row in rows:
+            bucket_members.setdefault((row.band, row.bucket_hash), []).append(row.user_story_id)
+
+    candidates = []
+    for hashes, exclude in zip(bands, exclude_ids):
+        found = {}
+        for band, bucket_hash in enumerate(hashes):
+            for story_id in bucket_members.get((band, bucket_hash), ()):
+                if story_id != exclude:
+                    found.setdefault(story_id, None)
+            if len(found) >= DEDUP_MAX_CANDIDATES:
+                break
+        candidates.append(list(found)[:DEDUP_MAX_CANDIDATES])
+
+    # 2. Signature + text của các ứng viên
+    candidate_ids = sorted({c for cs in candidates for c in cs})
+    stored = {}
+    for offset in range(0, len(candidate_ids), _CHUNK):
+        rows = session.query(
+            StoryMinHash.user_story_id, StoryMinHash.signature, UserStory.story_id, UserStory.original_text
+        ).join(UserStory, StoryMinHash.user_story_id == UserStory.id).filter(
+            StoryMinHash.user_story_id.in_(candidate_ids[offset:offset + _CHUNK]),
+            StoryMinHash.num_perm == hasher.num_perm,
+        ).all()
+        for row in rows:
+            stored[row.user_story_id] = row
+
+    # 3. Jaccard ước lượng, lọc theo threshold và top_k
+    results = []
+    for signature, ids in zip(signatures, candidates):
+        ids = [i for i in ids if i in stored]
+        if not ids:
+            results.append([])
+            continue
+        others = np.stack([np.frombuffer(stored[i].signature, dtype=np.uint32) for i in ids])
+        scores = hasher.similarity(signature, others)
+        order = np.argsort(-scores, kind="stable")
+        matches = []
+        for idx in order[:top_k]:
+            score = float(scores[idx])
+            if score < threshold:
+                break
+            row = stored[ids[idx]]
+            matches.append({
+                "id": row.story_id,
+                "db_id": row.user_story_id,
+                "original_text": row.original_text,
+                "similarity": round(score, 4),
+            })
+        results.append(matches)
+    return results
+
+
+def delete_story_index(session, db_ids: Sequence[str]):
+    """Xoá signature / buckets của các story (trước khi xoá UserStory vì FK)."""
+    for offset in range(0, len(db_ids), _CHUNK):
+        chunk = list(db_ids[offset:offset + _CHUNK])
+        session.execute(delete(StoryLSHBucket).where(StoryLSHBucket.user_story_id.in_(chunk)))
+        session.execute(delete(StoryMinHash).where(StoryMinHash.user_story_id.in_(chunk)))
+
+
+def backfill_story_index(db_manager=None, batch_size: int = _CHUNK) -> int:
+    """Tạo signature cho các story chưa có (vd. story tạo trước migration 0008)."""
+    from database import DatabaseSession
+
+    total = 0
+    while True:
+        with DatabaseSession(db_manager) as session:
+            rows = session.query(UserStory.id, UserStory.original_text).outerjoin(
+                StoryMinHash, StoryMinHash.user_story_id == UserStory.id
+            ).filter(StoryMinHash.user_story_id.is_(None)).limit(batch_size).all()
+            if not rows:
+                break
+            index_stories(session, [(row.id, row.original_text) for row in rows])
+        total += len(rows)
+        logging.info(f"💾 Indexed {total} stories for near-duplicate detection")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed {backfill_story_index()} stories")
@@ -0,0 +1,127 @@
+"""Incremental re-analysis: so sánh payload với các story đã lưu của cùng backlog.
+
+Story được nhận diện bằng key do caller cung cấp hoặc content hash của text.
+Story không đổi dùng lại Concept đã lưu, chỉ story thêm mới / đã sửa đi qua Phase1-4,
+story bị xoá khỏi payload được xoá khỏi DB và Neo4j.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+
+from models.models import Concept, SVORelationship, UserStory
+from services.dedup import delete_story_index
+from services.phase1.helpers import story_content_hash
+from services.phase2.helpers import count_stored_concepts, decrement_concept_frequencies
+
+_CHUNK = 1000
+
+
+def resolve_story_entries(user_stories: List[str], story_keys: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Các story (đã bỏ story rỗng) kèm key và content hash, theo thứ tự payload.
+
+    Story có cùng text mà không có key (key là content hash) chỉ được giữ lần xuất
+    hiện đầu tiên.
+
+    Raises:
+        ValueError: story_keys không cùng độ dài với user_stories, hoặc có key trùng nhau
+    """
+    if story_keys is not None and len(story_keys) != len(user_stories):
+        raise ValueError("story_keys must have the same length as user_stories")
+
+    entries = []
+    seen = set()
+    for i, text in enumerate(user_stories):
+        if not text.strip():
+            continue
+        content_hash = story_content_hash(text)
+        caller_key = story_keys[i] if story_keys is not None else None
+        key = caller_key or content_hash
+        if key in seen:
+            if caller_key:
+                raise ValueError(f"duplicate story_key in payload: {caller_key}")
+            continue
+        seen.add(key)
+        entries.append({"text": text, "story_key": key, "content_hash": content_hash})
+    return entries
+
+
+def load_backlog_stories(session, backlog_key: str) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Story hiện tại của backlog, mỗi story kèm concept do Phase1 tạo.
+
+    Returns:
+        (current, stale): current map story_key -> story đã lưu gần nhất; stale là
+        db id của các bản cũ hơn cùng key (vd. do chạy non-incremental nhiều lần)
+    """
+    stories = session.query(
+        UserStory.id, UserStory.story_id, UserStory.story_key, UserStory.content_hash, UserStory.original_text
+    ).filter(UserStory.backlog_key == backlog_key).order_by(UserStory.created_at.desc()).all()
+
+    current = {}
+    stale = []
+    for row in stories:
+        if row.story_key in current:
+            stale.append(row.id)
+            continue
+        current[row.story_key] = {
+            "db_id": row.id,
+            "story_id": row.story_id,
+            "content_hash": row.content_hash,
+            "original_text": row.original_text,
+        }
+
+    concepts = {}
+    db_ids = [s["db_id"] for s in current.values()]
+    for offset in range(0, len(db_ids), _CHUNK):
+        rows = session.query(
+            Concept.id, Concept.user_story_id, Concept.role, Concept.action, Concept.object
+        ).filter(
+            Concept.user_story_id.in_(db_ids[offset:offset + _CHUNK])
+        ).order_by(Concept.created_at).all()
+        for row in rows:
+            # concept đầu tiên của story là concept do Phase1 tạo
+            concepts.setdefault(row.user_story_id, row)
+
+    for story in current.values():
+        concept = concepts.get(story["db_id"])
+        story["concept_id"] = concept.id if concept else None
+        story["role"] = (concept.role if concept else None) or ""
+        story["action"] = (concept.action if concept else None) or ""
+        story["object"] = (concept.object if concept else None) or ""
+    return current, stale
+
+
+def plan_backlog_diff(entries: List[Dict[str, Any]], current: Dict[str, Dict[str, Any]]) -> Dict[str, List]:
+    """Chia story thành added / modified / unchanged (theo thứ tự payload) và removed."""
+    plan = {"added": [], "modified": [], "unchanged": [], "removed": []}
+    incoming = set()
+    for entry in entries:
+        incoming.add(entry["story_key"])
+        stored = current.get(entry["story_key"])
+        if stored is None:
+            plan["added"].append(entry)
+        elif stored["content_hash"] != entry["content_hash"]:
+            plan["modified"].append(entry)
+        else:
+            plan["unchanged"].append(entry)
+    plan["removed"] = [
+        {"story_key": key, **stored} for key, stored in current.items() if key not in incoming
+    ]
+    return plan
+
+
+def delete_stories(session, db_ids: List[str]) -> int:
+    """Xoá UserStory cùng Concept / SVORelationship / MinHash index của chúng (theo chunk).
+
+    Concept của các story bị xoá được trừ khỏi counter concept_frequency.
+    """
+    for offset in range(0, len(db_ids), _CHUNK):
+        chunk = db_ids[offset:offset + _CHUNK]
+        decrement_concept_frequencies(session, count_stored_concepts(session, chunk))
+        delete_story_index(session, chunk)
+        session.execute(delete(SVORelationship).where(SVORelationship.user_story_id.in_(chunk)))
+        session.execute(delete(Concept).where(Concept.user_story_id.in_(chunk)))
+        session.execute(delete(UserStory).where(UserStory.id.in_(chunk)))
+    if db_ids:
+        logging.info(f"✅ Removed {len(db_ids)} outdated user stories")
+    return len(db_ids)
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def _current_rss_bytes() -> int:
+    """Resident set size của process hiện tại (bytes), 0 nếu không đo được."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss là KB trên Linux, bytes trên macOS; chỉ dùng làm fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
+
+
+class ModelRegistry:
+    """Process-wide registry cho các spaCy pipeline.
+
+    Mỗi pipeline được load đúng một lần, theo key (model_name, disabled components),
+    và được dùng chung giữa các request / các phase.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+        self._stats: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, Tuple[str, ...]], threading.Lock] = {}
+
+    @staticmethod
+    def _make_key(model_name: str, disable: Optional[Iterable[str]]) -> Tuple[str, Tuple[str, ...]]:
+        return model_name, tuple(sorted(set(disable or ())))
+
+    def get(self, model_name: str = "en_core_web_sm", disable: Optional[Iterable[str]] = None):
+        """Trả về pipeline đã load, load lần đầu nếu cần (thread-safe)."""
+        key = self._make_key(model_name, disable)
+        nlp = self._models.get(key)
+        if nlp is not None:
+            return nlp
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Lock theo từng key để load model này không chặn request dùng model khác
+        with key_lock:
+            nlp = self._models.get(key)
+            if nlp is None:
+                nlp = self._load(key)
+            return nlp
+
+    def _load(self, key: Tuple[str, Tuple[str, ...]]):
+        import spacy
+
+        model_name, disable = key
+        rss_before = _current_rss_bytes()
+        started = time.perf_counter()
+        try:
+            nlp = spacy.load(model_name, disable=list(disable))
+        except OSError:
+            from spacy.cli import download
+            logging.warning(f"⚠️ spaCy model '{model_name}' not found, downloading")
+            download(model_name)
+            nlp = spacy.load(model_name, disable=list(disable))
+        load_seconds = time.perf_counter() - started
+        rss_after = _current_rss_bytes()
+
+        self._models[key] = nlp
+        self._stats[key] = {
+            "model_name": model_name,
+            "version": nlp.meta.get("version"),
+            "disabled": list(disable),
+            "pipeline": list(nlp.pipe_names),
+            "load_seconds": round(load_seconds, 4),
+            "memory_bytes": max(rss_after - rss_before, 0),
+            "loaded_at": time.time(),
+        }
+        logging.info(
+            f"✅ spaCy model '{model_name}' loaded in {load_seconds:.2f}s "
+            f"(+{self._stats[key]['memory_bytes'] / 1024 / 1024:.1f} MB, disabled={list(disable)})"
+        )
+        return nlp
+
+    def preload(self, model_name: str = "en_core_web_sm", disable: Optional[Iterable[str]] = None):
+        """Load trước một pipeline (dùng khi khởi động app)."""
+        return self.get(model_name, disable)
+
+    def is_loaded(self, model_name: str = "en_core_web_sm", disable: Optional[Iterable[str]] = None) -> bool:
+        return self._make_key(model_name, disable) in self._models
+
+    def stats(self) -> Dict[str, Any]:
+        """Load time và memory footprint của các pipeline đã load."""
+        models = [dict(s) for s in self._stats.values()]
+        return {
+            "models": models,
+            "total_load_seconds": round(sum(s["load_seconds"] for s in models), 4),
+            "total_memory_bytes": sum(s["memory_bytes"] for s in models),
+            "process_rss_bytes": _current_rss_bytes(),
+        }
+
+
+# Singleton pattern cho model registry
+_model_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Lấy instance của ModelRegistry (singleton)"""
+    global _model_registry
+
+    if _model_registry is None:
+        with _registry_lock:
+            if _model_registry is None:
+                _model_registry = ModelRegistry()
+
+    return _model_registry
+
+
+def get_nlp(model_name: str = "en_core_web_sm", disable: Optional[Iterable[str]] = None):
+    """Shortcut: lấy pipeline dùng chung từ registry."""
+    return get_model_registry().get(model_name, disable)
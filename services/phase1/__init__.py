@@ -1,66 +1,201 @@
+import time
+from collections import Counter
 import uuid
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterator
+from constant import SPACY_MODEL, PHASE1_PROFILE, PHASE1_BATCH_SIZE, PHASE1_N_PROCESS, PHASE1_INSERT_BATCH_SIZE, DEDUP_ENABLED
 from database import DatabaseSession, get_database_manager
+from metrics import nlp_timer, phase, timed_commit
 from models.models import ProcessingSession
+from services.dedup import find_near_duplicates, get_minhasher
+from services.model_registry import get_nlp
+from .cache import ParseCache, get_parse_cache
 from .helpers import (
     create_processing_session,
-    save_visual_narrator_result,
-    save_to_database,
+    bulk_save_stories,
+    record_session_progress,
     update_processing_session,
     get_timestamp,
-    extract_components,
-    visual_narrator_processing,
+    analyze_story,
+    fast_path_story,
+    EXTRACTOR_VERSION,
+    parse_stories,
+    pipeline_disabled,
+    PIPELINE_PROFILES,
+    story_content_hash,
 )
 
 
 class Phase1:
-    def __init__(self, model_name: str = "en_core_web_sm", session_name: str = None):
-        import spacy
-        try:
-            self.nlp = spacy.load(model_name)
-        except OSError:
-            from spacy.cli import download
-            download(model_name)
-            self.nlp = spacy.load(model_name)
+    def __init__(self, model_name: str = SPACY_MODEL, session_name: str = None, db_manager=None,
+                 profile: str = None, entities: bool = False):
+        """
+        Args:
+            profile: profile pipeline (full | deps-only | fast), mặc định PHASE1_PROFILE
+            entities: caller cần entities của visual narrator (giữ NER bật với mọi profile)
+        """
+        # Model được load một lần và dùng chung qua ModelRegistry
+        self.model_name = model_name
+        self.profile = profile or PHASE1_PROFILE
+        disable = pipeline_disabled(self.profile, entities)
+        self.fast_path = PIPELINE_PROFILES[self.profile]["fast_path"]
+        self.nlp = get_nlp(model_name, disable=disable)
+        # Kết quả khác nhau giữa các profile nên không dùng chung cache entry
+        self.cache_label = model_name + "".join(f"-{name}" for name in disable) + ("+fast" if self.fast_path else "")
+        self.cache = get_parse_cache()
 
         self.session_name = session_name or f"phase1_session_{get_timestamp()}_{uuid.uuid4().hex}"
-        self.db_manager = get_database_manager()
-        self.db_manager.create_tables()
+        # Schema được tạo một lần khi app khởi động (xem warmup.py), không phải mỗi request
+        self.db_manager = db_manager or get_database_manager()
 
-    def process_text(self, user_stories: List[str]) -> Dict:
-        processing_session = create_processing_session(self.db_manager, self.session_name, len(user_stories))
-        results = []
+    @phase("phase1")
+    def process_text(self, user_stories: List[str], batch_size: int = None, n_process: int = None,
+                     insert_batch_size: int = None, processing_session_id: str = None,
+                     backlog_key: str = None, story_keys: List[str] = None) -> Dict:
+        """Chạy Phase1 cho danh sách user stories.
+
+        Args:
+            user_stories: danh sách story (story rỗng bị bỏ qua)
+            batch_size: số story mỗi batch nlp.pipe (<= 1 để parse tuần tự), mặc định PHASE1_BATCH_SIZE
+            n_process: số process cho nlp.pipe, mặc định PHASE1_N_PROCESS
+            insert_batch_size: số story mỗi multi-row INSERT / commit, mặc định PHASE1_INSERT_BATCH_SIZE
+            processing_session_id: dùng ProcessingSession có sẵn (vd. job bất đồng bộ) thay vì tạo mới
+            backlog_key: backlog mà các story thuộc về (cho incremental re-analysis)
+            story_keys: key ổn định của từng story (cùng độ dài với user_stories),
+                mặc định là content hash; chỉ được lưu khi có backlog_key
+        """
+        results = list(self.iter_stories(
+            user_stories,
+            batch_size=batch_size,
+            n_process=n_process,
+            insert_batch_size=insert_batch_size,
+            processing_session_id=processing_session_id,
+            backlog_key=backlog_key,
+            story_keys=story_keys,
+        ))
+        return self.build_output(results)
+
+    def iter_stories(self, user_stories: List[str], batch_size: int = None, n_process: int = None,
+                     insert_batch_size: int = None, processing_session_id: str = None,
+                     include_visual: bool = False, backlog_key: str = None,
+                     story_keys: List[str] = None) -> Iterator[Dict]:
+        """Giống process_text nhưng yield kết quả từng story ngay khi batch chứa nó đã được ghi DB.
+
+        `self.processing_session_id` có giá trị từ lần next() đầu tiên. Với
+        include_visual=True mỗi kết quả có thêm key "visual_narrator".
+        """
+        batch_size = PHASE1_BATCH_SIZE if batch_size is None else batch_size
+        n_process = PHASE1_N_PROCESS if n_process is None else n_process
+        insert_batch_size = PHASE1_INSERT_BATCH_SIZE if insert_batch_size is None else insert_batch_size
+        self.persistence_stats = {"stories": 0, "rows_written": 0, "seconds": 0.0, "rows_per_sec": None}
+        self.fast_path_stories = 0
+
+        if processing_session_id is None:
+            processing_session_id = create_processing_session(self.db_manager, self.session_name, len(user_stories)).id
+        self.processing_session_id = processing_session_id
+        self._started = time.perf_counter()
 
         try:
             with DatabaseSession(self.db_manager) as session:
-                for story in filter(str.strip, user_stories):
-                    role, action, obj = extract_components(story, self.nlp)
-                    story_id = str(uuid.uuid4())
+                if story_keys is None:
+                    story_keys = [None] * len(user_stories)
+                entries = [(story, key) for story, key in zip(user_stories, story_keys) if story.strip()]
+                stories = [story for story, _ in entries]
+                keys, cached = self._lookup_cache(stories)
 
-                    user_story_id = save_to_database(session, story_id, story.strip(), role, action, obj)
-                    visual_result = visual_narrator_processing(story, self.nlp)
+                # Chỉ parse story chưa có trong cache (mỗi text khác nhau đúng một lần) và
+                # không qua được fast path; nlp.pipe giữ nguyên thứ tự đầu vào
+                remaining = Counter(key for key, hit in zip(keys, cached) if hit is None)
+                to_parse = []
+                fast = {}
+                seen = set()
+                for story, key, hit in zip(stories, keys, cached):
+                    if hit is None and key not in seen:
+                        seen.add(key)
+                        entry = fast_path_story(story) if self.fast_path else None
+                        if entry is not None:
+                            fast[key] = entry
+                        else:
+                            to_parse.append(story)
+                self.fast_path_stories = sum(remaining[key] for key in fast)
+                docs = iter(parse_stories(to_parse, self.nlp, batch_size=batch_size, n_process=n_process))
 
-                    if visual_result:
-                        save_visual_narrator_result(session, user_story_id, visual_result, processing_session.id)
-
-                    results.append({
-                        "id": story_id,
-                        "db_id": user_story_id,
+                parsed = {}
+                new_entries = {}
+                pending = []
+                for position, (story, key, hit) in enumerate(zip(stories, keys, cached)):
+                    entry = hit
+                    if entry is None:
+                        entry = parsed.get(key)
+                        if entry is None:
+                            # Fast path rẻ hơn cache lookup nên không được ghi vào cache
+                            entry = fast.pop(key, None)
+                        if entry is None:
+                            # nlp.pipe là lazy: next(docs) là lúc story thực sự được parse
+                            with nlp_timer():
+                                role, action, obj, visual_result = analyze_story(story, self.nlp, doc=next(docs))
+                            entry = {"role": role, "action": action, "object": obj, "visual_result": visual_result}
+                            new_entries[key] = entry
+                        # Giữ lại cho các bản trùng lặp phía sau trong cùng payload
+                        remaining[key] -= 1
+                        if remaining[key] > 0:
+                            parsed[key] = entry
+                        else:
+                            parsed.pop(key, None)
+                    role, action, obj, visual_result = entry["role"], entry["action"], entry["object"], entry["visual_result"]
+                    content_hash = story_content_hash(story)
+                    pending.append({
+                        "position": position,
+                        "story_id": str(uuid.uuid4()),
                         "original_text": story.strip(),
-                        "role": role or "",
-                        "action": action or "",
-                        "object": obj or "",
+                        "role": role,
+                        "action": action,
+                        "object": obj,
+                        "visual_result": visual_result,
+                        "content_hash": content_hash,
+                        "backlog_key": backlog_key,
+                        "story_key": (entries[position][1] or content_hash) if backlog_key else None,
                     })
+                    if len(pending) >= insert_batch_size:
+                        self._store_cache(new_entries)
+                        new_entries = {}
+                        yield from self._flush(session, pending, processing_session_id, insert_batch_size, include_visual)
+                        pending = []
+                self._store_cache(new_entries)
+                yield from self._flush(session, pending, processing_session_id, insert_batch_size, include_visual)
 
-                update_processing_session(session, processing_session.id, 1, "completed")
-            logging.info(f"✅ Phase 1 completed: Processed {len(results)} user stories")
+                update_processing_session(session, processing_session_id, 1, "completed")
+            logging.info(
+                f"✅ Phase 1 completed: Processed {self.persistence_stats['stories']} user stories "
+                f"({self.persistence_stats['rows_per_sec']} rows/sec persisted)"
+            )
+        except GeneratorExit:
+            # Consumer dừng giữa chừng (vd. client streaming ngắt kết nối)
+            logging.warning(f"⚠️ Phase 1 cancelled after {self.persistence_stats['stories']} user stories")
+            with DatabaseSession(self.db_manager) as session:
+                update_processing_session(session, processing_session_id, 1, "cancelled")
+            raise
         except Exception as e:
             logging.error(f"❌ Phase 1 failed: {e}")
             with DatabaseSession(self.db_manager) as session:
-                update_processing_session(session, processing_session.id, 1, "failed")
+                update_processing_session(session, processing_session_id, 1, "failed")
             raise
 
+    def _lookup_cache(self, stories: List[str]):
+        """Cache key và kết quả cache (None nếu miss) cho từng story."""
+        # Key luôn được tính (kể cả khi tắt cache) để story trùng trong payload chỉ parse một lần
+        version = self.nlp.meta.get("version", "")
+        keys = [ParseCache.make_key(story, self.cache_label, version, str(EXTRACTOR_VERSION)) for story in stories]
+        if self.cache is None:
+            return keys, [None] * len(stories)
+        return keys, self.cache.get_many(keys)
+
+    def _store_cache(self, entries: Dict[str, Dict]):
+        if self.cache is not None and entries:
+            self.cache.set_many(entries)
+
+    def build_output(self, results: List[Dict]) -> Dict:
+        """Output của Phase1 (input cho Phase2) từ danh sách kết quả từng story."""
         roles = sorted({c["role"] for c in results if c["role"]})
         actions = sorted({c["action"] for c in results if c["action"]})
         objects = sorted({c["object"] for c in results if c["object"]})
@@ -70,9 +205,60 @@ class Phase1:
             "roles": roles,
             "actions": actions,
             "objects": objects,
-            "session_id": processing_session.id,
+            "session_id": self.processing_session_id,
         }
 
+    def _flush(self, session, pending: List[Dict], session_id: str, insert_batch_size: int,
+               include_visual: bool = False) -> List[Dict]:
+        """Bulk insert các story đã phân tích và trả về kết quả dạng output của Phase1."""
+        if not pending:
+            return []
+        if DEDUP_ENABLED:
+            hasher = get_minhasher()
+            for rec in pending:
+                rec["minhash"] = hasher.signature(rec["original_text"])
+        stats = bulk_save_stories(session, pending, session_id, batch_size=insert_batch_size)
+        totals = self.persistence_stats
+        totals["stories"] += stats["stories"]
+        totals["rows_written"] += stats["rows_written"]
+        totals["seconds"] = round(totals["seconds"] + stats["seconds"], 4)
+        totals["rows_per_sec"] = round(totals["rows_written"] / totals["seconds"], 1) if totals["seconds"] > 0 else None
+
+        # Tiến độ cho job bất đồng bộ (GET /api/analyze/jobs/{id})
+        elapsed = time.perf_counter() - self._started
+        record_session_progress(session, session_id, {
+            "stories_processed": totals["stories"],
+            "elapsed_seconds": round(elapsed, 3),
+            "stories_per_sec": round(totals["stories"] / elapsed, 1) if elapsed > 0 else None,
+        })
+        timed_commit(session)
+
+        # Story gần trùng trong toàn bộ corpus (kể cả các story khác của batch này)
+        near_duplicates = [[] for _ in pending]
+        if DEDUP_ENABLED:
+            near_duplicates = find_near_duplicates(
+                session,
+                [rec["original_text"] for rec in pending],
+                exclude_ids=[rec["db_id"] for rec in pending],
+                signatures=[rec["minhash"] for rec in pending],
+            )
+
+        results = []
+        for rec, duplicates in zip(pending, near_duplicates):
+            result = {
+                "id": rec["story_id"],
+                "db_id": rec["db_id"],
+                "concept_id": rec["concept_id"],
+                "original_text": rec["original_text"],
+                "role": rec["role"] or "",
+                "action": rec["action"] or "",
+                "object": rec["object"] or "",
+                "near_duplicates": duplicates,
+            }
+            if include_visual:
+                result["visual_narrator"] = rec["visual_result"]
+            results.append(result)
+        return results
 
     # nếu như sau này cần kết quả từ những lần phân tích trước đó thì có thể dùng hiện tại thì sẽ không
     # def load_from_database(self, session_name: str = None) -> Dict:
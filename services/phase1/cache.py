@@ -0,0 +1,167 @@
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from constant import PARSE_CACHE_ENABLED, PARSE_CACHE_MAX_ENTRIES, PARSE_CACHE_PATH, PARSE_CACHE_TTL_SECONDS
+
+
+def normalize_story(story: str) -> str:
+    """Chuẩn hoá text làm cache key (giống text được parse và lưu: bỏ khoảng trắng hai đầu)."""
+    return story.strip()
+
+
+class ParseCache:
+    """Cache kết quả extraction của Phase1, key = hash(text, model name, model version).
+
+    Hai tầng: LRU trong process và (tuỳ chọn) SQLite file trên đĩa để giữ kết quả
+    qua các lần restart. Giá trị là dict JSON-serializable
+    {"role", "action", "object", "visual_result"}.
+    """
+
+    def __init__(self, max_entries: int = PARSE_CACHE_MAX_ENTRIES, ttl_seconds: float = PARSE_CACHE_TTL_SECONDS,
+                 persistent_path: Optional[str] = PARSE_CACHE_PATH):
+        self.max_entries = max(max_entries, 1)
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._db = None
+        if persistent_path:
+            self._db = sqlite3.connect(persistent_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(story: str, model_name: str, model_version: str, extractor_version: str = "") -> str:
+        payload = "\x1f".join([model_name or "", model_version or "", extractor_version or "", normalize_story(story)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Lookup nhiều key; tầng persistent chỉ tốn một query cho các key miss ở LRU."""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and self._expired(entry[1]):
+                    del self._entries[key]
+                    self._counters["expired"] += 1
+                    entry = None
+                if entry is None:
+                    missing.setdefault(key, []).append(i)
+                    continue
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                results[i] = copy.deepcopy(entry[0])
+
+            if missing and self._db is not None:
+                expired_keys = []
+                for key, value, created_at in self._load_persistent(list(missing)):
+                    if self._expired(created_at):
+                        self._counters["expired"] += 1
+                        expired_keys.append((key,))
+                        continue
+                    parsed = json.loads(value)
+                    self._store(key, parsed, created_at)
+                    for i in missing.pop(key):
+                        self._counters["persistent_hits"] += 1
+                        results[i] = copy.deepcopy(parsed)
+                if expired_keys:
+                    self._db.executemany("DELETE FROM parse_cache WHERE key = ?", expired_keys)
+                    self._db.commit()
+
+            self._counters["misses"] += sum(len(idx) for idx in missing.values())
+        return results
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key])[0]
+
+    def _load_persistent(self, keys: List[str]):
+        rows = []
+        # SQLite giới hạn số biến trong một câu lệnh
+        for offset in range(0, len(keys), 500):
+            chunk = keys[offset:offset + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            rows.extend(self._db.execute(
+                f"SELECT key, value, created_at FROM parse_cache WHERE key IN ({placeholders})", chunk
+            ).fetchall())
+        return rows
+
+    def _store(self, key: str, value: Dict[str, Any], created_at: float):
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self.set_many({key: value})
+
+    def set_many(self, entries: Dict[str, Dict[str, Any]]):
+        """Ghi nhiều entry; tầng persistent dùng một executemany + một commit."""
+        if not entries:
+            return
+        created_at = time.time()
+        with self._lock:
+            for key, value in entries.items():
+                self._store(key, copy.deepcopy(value), created_at)
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO parse_cache (key, value, created_at) VALUES (?, ?, ?)",
+                        [(key, json.dumps(value, default=str), created_at) for key, value in entries.items()],
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"⚠️ Failed to write parse cache entries: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["persistent_hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._db is not None,
+            "hit_ratio": round((counters["hits"] + counters["persistent_hits"]) / lookups, 4) if lookups else None,
+        }
+
+
+# Singleton pattern cho parse cache
+_parse_cache: Optional[ParseCache] = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """Lấy instance của ParseCache (singleton), None nếu cache bị tắt"""
+    global _parse_cache
+
+    if not PARSE_CACHE_ENABLED:
+        return None
+    if _parse_cache is None:
+        with _parse_cache_lock:
+            if _parse_cache is None:
+                _parse_cache = ParseCache()
+
+    return _parse_cache
@@ -1,8 +1,37 @@
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, List, Iterable, Iterator
+from datetime import datetime
+import hashlib
 import logging
 import re
+import time
+import uuid
+from sqlalchemy import insert, null
+from constant import DEDUP_ENABLED
 from database import DatabaseSession, get_database_manager
+from metrics import timed_commit
 from models.models import ProcessingSession, UserStory, Concept
+from services.dedup import index_stories
+from .templates import match_story
+
+# Ngưỡng confidence để role / action của template thay kết quả parse
+TEMPLATE_CONFIDENCE_THRESHOLD = 0.8
+# Version của luật trích xuất (template, fast path, analyze_story), nằm trong key của
+# parse cache: tăng mỗi khi luật đổi để entry cũ (kể cả trên đĩa) không được dùng lại
+EXTRACTOR_VERSION = 3
+
+# Object của template chỉ trùng noun phrase mà parse trả về (subtree của dobj) khi là
+# một chuỗi từ không dấu câu, không có giới từ thường gắn vào động từ (trừ "of"),
+# không có chuỗi động từ kiểu "able to ..." và không mở đầu mệnh đề / story khác
+# (vd. "the report and as an admin, I want to edit it")
+_NOUN_PHRASE_RE = re.compile(r"[^\W_]+(?:\s+[^\W_]+)*")
+_NON_NOUN_PHRASE_WORDS = {
+    "about", "across", "after", "against", "at", "before", "by", "for", "from", "in", "into",
+    "on", "onto", "over", "through", "to", "under", "via", "with", "without", "able",
+}
+_CLAUSE_LEAD_WORDS = {
+    "and", "or", "but", "so", "because", "that", "which", "who", "when", "then", "if", "as", "i",
+    "want", "need", "can",
+}
 
 
 def create_processing_session(db_manager, session_name: str, total_stories: int) -> ProcessingSession:
@@ -18,77 +47,105 @@ def create_processing_session(db_manager, session_name: str, total_stories: int)
         return processing_session
 
 
-def save_visual_narrator_result(session, user_story_id: str, visual_result: Dict[str, Any], session_id: str):
-    try:
-        concept = session.query(Concept).filter_by(user_story_id=user_story_id).first()
-        if concept:
-            meta = concept.metadata_json or {}
-            meta.update({
-                'visual_narrator': visual_result,
-                'visual_session': session_id
-            })
-            concept.metadata_json = meta
-            session.add(concept)
-    except Exception as e:
-        logging.error(f"Failed to save visual narrator result to concept metadata: {e}")
-
-
-def save_to_database(session, story_id: str, original_text: str, role: Optional[str], action: Optional[str], obj: Optional[str]) -> str:
-    try:
-        user_story = UserStory(
-            story_id=story_id,
-            original_text=original_text
-        )
-        session.add(user_story)
-
-        # Try to flush and ensure the row exists for FK checks. If flush doesn't
-        # materialize the row for any reason, commit to guarantee persistence.
-        session.flush()
-        # verify existence
-        exists = session.query(UserStory).filter_by(id=user_story.id).first()
-        if not exists:
-            session.commit()
-            # refresh after commit
-            try:
-                session.refresh(user_story)
-            except Exception:
-                pass
-
-        # Now insert Concept referencing the persisted user_story
+def story_content_hash(text: str) -> str:
+    """sha256 của text story đã chuẩn hoá, dùng để phát hiện story thay đổi giữa các lần phân tích."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def build_story_rows(records: List[Dict[str, Any]], session_id: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Tạo rows cho user_stories và concepts, UUID sinh phía client.
+
+    Gán `db_id` và `concept_id` ngược vào từng record để các phase sau dùng.
+    """
+    now = datetime.utcnow()
+    story_rows = []
+    concept_rows = []
+    for rec in records:
+        user_story_id = str(uuid.uuid4())
+        concept_id = str(uuid.uuid4())
+        rec['db_id'] = user_story_id
+        rec['concept_id'] = concept_id
+
+        story_rows.append({
+            'id': user_story_id,
+            'story_id': rec['story_id'],
+            'original_text': rec['original_text'],
+            'processing_session_id': session_id,
+            'position': rec.get('position'),
+            'backlog_key': rec.get('backlog_key'),
+            'story_key': rec.get('story_key'),
+            'content_hash': rec.get('content_hash') or story_content_hash(rec['original_text']),
+            'created_at': now,
+        })
+        visual_result = rec.get('visual_result')
+        concept_rows.append({
+            'id': concept_id,
+            'user_story_id': user_story_id,
+            'role': rec.get('role') or None,
+            'action': rec.get('action') or None,
+            'object': rec.get('object') or None,
+            # visual narrator metadata được ghi cùng lần insert concept
+            'metadata': {'visual_narrator': visual_result, 'visual_session': session_id} if visual_result else null(),
+            'created_at': now,
+        })
+    return story_rows, concept_rows
+
+
+def bulk_save_stories(session, records: List[Dict[str, Any]], session_id: str, batch_size: int = 500) -> Dict[str, Any]:
+    """Ghi UserStory + Concept bằng multi-row INSERT, commit một lần mỗi batch.
+
+    Args:
+        session: SQLAlchemy session
+        records: dicts có story_id, original_text, role, action, object, visual_result
+            (và tuỳ chọn minhash: MinHash signature đã tính sẵn)
+        session_id: ProcessingSession id (lưu trong metadata visual narrator)
+        batch_size: số story mỗi multi-row INSERT / commit
+
+    Returns:
+        thống kê số rows đã ghi và rows/sec
+    """
+    batch_size = max(batch_size, 1)
+    started = time.perf_counter()
+    rows_written = 0
+
+    for offset in range(0, len(records), batch_size):
+        story_rows, concept_rows = build_story_rows(records[offset:offset + batch_size], session_id)
         try:
-            with session.no_autoflush:
-                concept = Concept(
-                    user_story_id=user_story.id,
-                    role=role if role else None,
-                    action=action if action else None,
-                    object=obj if obj else None
-                )
-                session.add(concept)
-        except AttributeError:
-            concept = Concept(
-                user_story_id=user_story.id,
-                role=role if role else None,
-                action=action if action else None,
-                object=obj if obj else None
-            )
-            session.add(concept)
-
-        # commit the concept so FK constraint is satisfied immediately
-        try:
-            session.commit()
+            # user_stories phải được insert trước concepts (FK)
+            session.execute(insert(UserStory.__table__).values(story_rows))
+            session.execute(insert(Concept.__table__).values(concept_rows))
+            if DEDUP_ENABLED:
+                batch = records[offset:offset + batch_size]
+                signatures = [rec['minhash'] for rec in batch] if all('minhash' in rec for rec in batch) else None
+                index_stories(session, [(rec['db_id'], rec['original_text']) for rec in batch], signatures)
+            timed_commit(session)
         except Exception:
-            # If commit fails, rollback and re-raise to let caller handle
             session.rollback()
             raise
+        rows_written += len(story_rows) + len(concept_rows)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'stories': len(records),
+        'rows_written': rows_written,
+        'seconds': round(elapsed, 4),
+        'rows_per_sec': round(rows_written / elapsed, 1) if elapsed > 0 else None,
+    }
+    if records:
+        logging.info(
+            f"💾 Phase 1 persisted {stats['stories']} stories ({rows_written} rows) "
+            f"in {elapsed:.2f}s ({stats['rows_per_sec']} rows/sec)"
+        )
+    return stats
 
-        return user_story.id
-    except Exception:
-        # Ensure any exception doesn't leave transaction open
-        try:
-            session.rollback()
-        except Exception:
-            pass
-        raise
+
+def record_session_progress(session, session_id: str, progress: Dict[str, Any]):
+    """Merge thông tin tiến độ vào ProcessingSession.metadata_info['progress']."""
+    processing_session = session.query(ProcessingSession).filter_by(id=session_id).first()
+    if processing_session:
+        meta = dict(processing_session.metadata_info or {})
+        meta['progress'] = {**meta.get('progress', {}), **progress}
+        processing_session.metadata_info = meta
 
 
 def update_processing_session(session, session_id: str, phase_completed: int, status: str):
@@ -97,55 +154,99 @@ def update_processing_session(session, session_id: str, phase_completed: int, st
         processing_session.phase_completed = phase_completed
         processing_session.status = status
         if status == "completed":
-            from datetime import datetime
             processing_session.completed_at = datetime.utcnow()
 
 
+# Profile pipeline của Phase1: component spaCy bị tắt và có dùng regex fast path hay không
+PIPELINE_PROFILES = {
+    "full": {"disable": (), "fast_path": False},
+    "deps-only": {"disable": ("ner",), "fast_path": False},
+    "fast": {"disable": ("ner",), "fast_path": True},
+}
+
+
+def pipeline_disabled(profile: str, entities: bool = False) -> Tuple[str, ...]:
+    """Component bị tắt cho profile; NER luôn bật khi caller cần entities."""
+    if profile not in PIPELINE_PROFILES:
+        raise ValueError(f"Unknown Phase1 profile: {profile} (expected one of {sorted(PIPELINE_PROFILES)})")
+    if entities:
+        return ()
+    return PIPELINE_PROFILES[profile]["disable"]
+
+
 def get_timestamp() -> str:
-    from datetime import datetime
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
-from typing import Optional, Tuple, List
-# import spacy # Đã có trong context của class Phase1
+def parse_story(story: str, nlp):
+    """Parse một story đúng một lần; Doc này được dùng chung cho mọi bước của Phase1."""
+    return nlp(story.strip())
+
+
+def parse_stories(stories: Iterable[str], nlp, batch_size: int = 1, n_process: int = 1) -> Iterator:
+    """Parse nhiều story, giữ nguyên thứ tự.
+
+    batch_size <= 1 và n_process == 1 thì parse tuần tự từng story; ngược lại
+    stream qua nlp.pipe (n_process > 1 dùng multiprocessing của spaCy).
+    """
+    if batch_size <= 1 and n_process == 1:
+        return (parse_story(story, nlp) for story in stories)
+    return nlp.pipe(
+        (story.strip() for story in stories),
+        batch_size=max(batch_size, 1),
+        n_process=n_process,
+    )
+
 
-# Giả định các hàm find_role, find_action_and_object, và visual_narrator_processing đã được định nghĩa
+def prune_advcl(doc) -> Optional[str]:
+    """Loại bỏ các mệnh đề advcl khỏi story.
 
-def extract_components(story: str, nlp) -> Tuple[Optional[str], Optional[str], Optional[str]]:
-    doc = nlp(story.strip())
-    
-    story_core_tokens: List[str] = []
-    
+    Trả về text đã rút gọn, hoặc None nếu Doc không có advcl (khi đó có thể
+    dùng thẳng Doc gốc, không cần parse lại).
+    """
     tokens_to_exclude = {token.i for token in doc if token.dep_ == "advcl"}
+    if not tokens_to_exclude:
+        return None
 
     for token in doc:
         if token.i in tokens_to_exclude:
             for child in token.subtree:
                 tokens_to_exclude.add(child.i)
 
+    story_core_tokens: List[str] = [token.text_with_ws for token in doc if token.i not in tokens_to_exclude]
+    return "".join(story_core_tokens).strip()
 
-    for token in doc:
-        if token.i not in tokens_to_exclude:
-            story_core_tokens.append(token.text_with_ws)
 
-    story_core = "".join(story_core_tokens).strip()
+def analyze_story(story: str, nlp, doc=None) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[Dict[str, Any]]]:
+    """Trích xuất (role, action, object) và kết quả visual narrator từ một Doc duy nhất.
+
+    Chỉ parse lại khi phần lõi sau khi bỏ advcl khác với story gốc.
+    """
+    if doc is None:
+        doc = parse_story(story, nlp)
 
-    doc_core = nlp(story_core)
+    story_core = prune_advcl(doc)
+    doc_core = doc if story_core is None else nlp(story_core)
     role = find_role(doc_core)
     action, obj = find_action_and_object(doc_core)
 
-    visual_narrator_result = visual_narrator_processing(story, nlp)
+    visual_narrator_result = visual_narrator_processing(story, nlp, doc=doc)
     if visual_narrator_result:
-        if visual_narrator_result.get('confidence_score', 0) > 0.8:
+        if visual_narrator_result.get('confidence_score', 0) > TEMPLATE_CONFIDENCE_THRESHOLD:
             role = visual_narrator_result.get('role') or role
             action = visual_narrator_result.get('action') or action
-            obj = visual_narrator_result.get('object') or obj
+            # Object luôn lấy từ parse (noun phrase của dobj / pobj), không lấy phần còn lại của câu
 
-    # 6. Chuẩn hóa chuỗi (Vẫn giữ nguyên)
+    # Chuẩn hóa chuỗi
     role = role.lower().strip() if role else None
     action = action.lower().strip() if action else None
     obj = obj.lower().strip() if obj else None
 
+    return role, action, obj, visual_narrator_result
+
+
+def extract_components(story: str, nlp, doc=None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    role, action, obj, _ = analyze_story(story, nlp, doc=doc)
     return role, action, obj
 
 
@@ -220,17 +321,62 @@ def find_action_and_object(doc) -> Tuple[Optional[str], Optional[str]]:
     return action, obj
 
 
-def visual_narrator_processing(story: str, nlp) -> Optional[Dict[str, Any]]:
+def standard_story_result(matched: Dict[str, Any], entities: List[Dict[str, Any]],
+                          relationships: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Kết quả visual narrator cho story khớp một template (xem templates.match_story)."""
+    components = matched['components']
+    return {
+        'role': components.get('role'),
+        'action': components.get('action'),
+        'object': components.get('object'),
+        'entities': entities,
+        'relationships': relationships,
+        'confidence_score': matched['confidence'],
+        'parsed_structure': {
+            'format': matched['format'],
+            'components': components
+        }
+    }
+
+
+def is_parse_equivalent_object(obj: str) -> bool:
+    """Object của template có phải cùng noun phrase mà find_action_and_object trả về không."""
+    if not _NOUN_PHRASE_RE.fullmatch(obj):
+        return False
+    return not any(word in _NON_NOUN_PHRASE_WORDS or word in _CLAUSE_LEAD_WORDS for word in obj.lower().split())
+
+
+def fast_path_story(story: str) -> Optional[Dict[str, Any]]:
+    """Regex-first: kết quả Phase1 của story mà không cần parse, None nếu template không đủ tin cậy.
+
+    Chỉ dùng khi template cho role, action (analyze_story cũng lấy hai giá trị này
+    từ visual narrator) và một object trùng với noun phrase của parse; visual
+    narrator không có entities / relationships.
+    """
+    matched = match_story(story.strip())
+    if not matched or matched['confidence'] <= TEMPLATE_CONFIDENCE_THRESHOLD:
+        return None
+    components = matched['components']
+    if not all(components.get(field) for field in ('role', 'action', 'object')):
+        return None
+    if not is_parse_equivalent_object(components['object']):
+        return None
+    return {
+        "role": components['role'].lower(),
+        "action": components['action'].lower(),
+        "object": components['object'].lower(),
+        "visual_result": standard_story_result(matched, [], []),
+    }
+
+
+def visual_narrator_processing(story: str, nlp, doc=None) -> Optional[Dict[str, Any]]:
     try:
-        user_story_pattern = r"As an?\s+(.*?),\s*I\s+want\s+to\s+(.*?)\s+(.*?)\s*(?:so that|in order to|because)?"
-        match = re.search(user_story_pattern, story, re.IGNORECASE)
+        if doc is None:
+            doc = parse_story(story, nlp)
 
-        if match:
-            role = match.group(1).strip()
-            action = match.group(2).strip()
-            obj = match.group(3).strip()
+        matched = match_story(story)
 
-            doc = nlp(story)
+        if matched:
             entities = []
             relationships = []
             for ent in doc.ents:
@@ -239,20 +385,8 @@ def visual_narrator_processing(story: str, nlp) -> Optional[Dict[str, Any]]:
                 if token.dep_ in ['nsubj', 'dobj', 'pobj']:
                     relationships.append({'head': token.head.text, 'relation': token.dep_, 'child': token.text})
 
-            return {
-                'role': role,
-                'action': action,
-                'object': obj,
-                'entities': entities,
-                'relationships': relationships,
-                'confidence_score': 0.9,
-                'parsed_structure': {
-                    'format': 'standard_user_story',
-                    'components': {'role': role, 'action': action, 'object': obj}
-                }
-            }
+            return standard_story_result(matched, entities, relationships)
         else:
-            doc = nlp(story)
             entities = [{'text': ent.text, 'label': ent.label_} for ent in doc.ents]
             return {
                 'role': None,
@@ -265,4 +399,4 @@ def visual_narrator_processing(story: str, nlp) -> Optional[Dict[str, Any]]:
             }
     except Exception as e:
         logging.error(f"Visual Narrator processing failed: {e}")
-        return None
\ No newline at end of file
+        return None
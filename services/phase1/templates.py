@@ -0,0 +1,65 @@
+"""Nhận dạng user story theo template bằng một regex gộp, compile một lần khi import.
+
+Mỗi template là một nhánh của alternation; group của template được đặt tên
+``<template>__<field>`` (Python không cho trùng tên group giữa các nhánh).
+Một lần ``search`` cho biết template nào khớp và các thành phần role / action /
+object (và benefit / context nếu có), không cần parse spaCy.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_VERB = r"[^\W\d_]+"
+_WANT = r"I\s+(?:want\s+to|need\s+to|would\s+like\s+to|'d\s+like\s+to|should\s+be\s+able\s+to|can)"
+_BENEFIT_LEAD = r"(?:so\s+that|in\s+order\s+to|because)"
+
+# (tên, format trong parsed_structure, confidence, pattern); thứ tự chỉ quan trọng khi
+# hai template khớp cùng vị trí
+STORY_TEMPLATES: List[Tuple[str, str, float, str]] = [
+    (
+        "in_order_to", "in_order_to_user_story", 0.9,
+        rf"\bIn\s+order\s+to\s+(?P<in_order_to__benefit>[^,]+?)\s*,\s*as\s+an?\s+(?P<in_order_to__role>[^,]+?)"
+        rf"\s*,?\s*{_WANT}\s+(?P<in_order_to__action>{_VERB})\s+(?P<in_order_to__object>.+?)"
+        rf"(?:\s*,?\s*\b{_BENEFIT_LEAD}\b.*?)?[.!]?\s*$",
+    ),
+    (
+        "as_a", "standard_user_story", 0.9,
+        rf"\bAs\s+an?\s+(?P<as_a__role>[^,]+?)\s*,?\s*{_WANT}\s+(?P<as_a__action>{_VERB})\s+(?P<as_a__object>.+?)"
+        rf"(?:\s*,?\s*\b{_BENEFIT_LEAD}\b\s*(?P<as_a__benefit>.*?))?[.!]?\s*$",
+    ),
+    (
+        # "As a ..., I need / want <object>": "need" là action như parse trả về; với "want"
+        # parse lấy động từ xcomp phía sau (vd. "the report exported") nên để parse quyết định
+        "as_a_need", "standard_user_story", 0.9,
+        rf"\bAs\s+an?\s+(?P<as_a_need__role>[^,]+?)\s*,?\s*I\s+(?:(?P<as_a_need__action>need)|want)\s+(?!to\b)"
+        rf"(?P<as_a_need__object>.+?)(?:\s*,?\s*\b{_BENEFIT_LEAD}\b\s*(?P<as_a_need__benefit>.*?))?[.!]?\s*$",
+    ),
+    (
+        "given_when_then", "given_when_then", 0.85,
+        rf"\bGiven\s+(?:(?:I\s+am|I'm)\s+)?(?:an?|the)\s+(?P<given_when_then__role>[^,]+?)"
+        rf"(?:\s+(?:is|are|am|has|have)\b[^,]*?)?\s*,?\s*when\s+(?:I|we)\s+"
+        rf"(?P<given_when_then__action>{_VERB})\s+(?P<given_when_then__object>.+?)\s*,?\s*then\s+"
+        rf"(?P<given_when_then__outcome>.+?)[.!]?\s*$",
+    ),
+]
+
+STORY_PATTERN = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, _, _, pattern in STORY_TEMPLATES),
+    re.IGNORECASE | re.DOTALL,
+)
+_TEMPLATES = {name: (story_format, confidence) for name, story_format, confidence, _ in STORY_TEMPLATES}
+
+
+def match_story(story: str) -> Optional[Dict[str, Any]]:
+    """Template đầu tiên (trái nhất) khớp với story và các thành phần của nó, None nếu không khớp."""
+    match = STORY_PATTERN.search(story)
+    if not match:
+        return None
+    name = next(name for name in _TEMPLATES if match.group(name) is not None)
+    story_format, confidence = _TEMPLATES[name]
+    prefix = f"{name}__"
+    components = {
+        key[len(prefix):]: value.strip()
+        for key, value in match.groupdict().items()
+        if key.startswith(prefix) and value is not None and value.strip()
+    }
+    return {"template": name, "format": story_format, "confidence": confidence, "components": components}
@@ -1,18 +1,28 @@
 import logging
 from typing import Dict, List
 from database import DatabaseSession, get_database_manager
-from .helpers import count_concept_frequency, attach_frequency_to_concepts, save_concepts
+from metrics import phase
+from .helpers import (
+    attach_frequency_to_concepts,
+    count_concept_frequency,
+    enrich_concepts,
+    get_concept_frequencies,
+    upsert_concept_frequencies,
+)
 from models.models import ProcessingSession
 
 
 class Phase2:
-    def __init__(self, session_id: str = None):
+    def __init__(self, session_id: str = None, db_manager=None):
         self.input_data = {}
         self.object_frequency = {}
+        self.concept_frequency = {}
+        self.global_frequency = {}
         self.final_output = []
         self.session_id = session_id
-        self.db_manager = get_database_manager()
+        self.db_manager = db_manager or get_database_manager()
 
+    @phase("phase2")
     def analyze_concepts(self, phase1_data: Dict = None) -> Dict:
         if phase1_data:
             self.input_data = phase1_data
@@ -21,12 +31,14 @@ class Phase2:
         try:
             with DatabaseSession(self.db_manager) as session:
                 concepts = self.input_data.get("concepts", [])
-                self.object_frequency = count_concept_frequency(concepts)
-                enriched = attach_frequency_to_concepts(concepts, self.object_frequency)
-                # persist concepts
-                for c in enriched:
-                    user_story_db_id = c.get('db_id') or c.get('id')
-                    save_concepts(session, user_story_db_id, [c])
+                # Tần suất trong payload theo type, cộng dồn vào counter toàn corpus
+                self.concept_frequency = count_concept_frequency(concepts)
+                self.object_frequency = self.concept_frequency.get("object", {})
+                upsert_concept_frequencies(session, self.concept_frequency)
+                self.global_frequency = get_concept_frequencies(session, self.concept_frequency)
+                enriched = attach_frequency_to_concepts(concepts, self.concept_frequency)
+                # Cập nhật metadata của Concept do Phase1 tạo, không insert thêm row
+                enrich_concepts(session, enriched)
 
                 # generate final output
                 self._generate_final_output()
@@ -41,6 +53,8 @@ class Phase2:
 
         return {
             "object_frequency": self.object_frequency,
+            "concept_frequency": self.concept_frequency,
+            "global_frequency": self.global_frequency,
             "final_output": self.final_output,
             "session_id": self.session_id
         }
@@ -96,6 +110,8 @@ class Phase2:
     def get_results(self):
         return {
             "object_frequency": self.object_frequency,
+            "concept_frequency": self.concept_frequency,
+            "global_frequency": self.global_frequency,
             "final_output": self.final_output,
             "session_id": self.session_id
         }
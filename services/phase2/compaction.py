@@ -0,0 +1,82 @@
+"""Gộp các Concept row trùng do Phase2 cũ ghi (mỗi lần chạy thêm một row / story).
+
+Mỗi story chỉ giữ Concept do Phase1 tạo; role / action / object còn trống và
+frequency trong metadata được lấy từ các row trùng trước khi xoá chúng.
+
+    python -m services.phase2.compaction
+"""
+import logging
+from typing import Dict, List
+
+from sqlalchemy import delete, func, update
+
+from models.models import Concept
+
+_CHUNK = 1000
+
+
+def _is_phase2_copy(metadata) -> bool:
+    # Row do Phase2 cũ ghi mang nguyên dict output Phase1 trong metadata
+    return isinstance(metadata, dict) and 'original_text' in metadata
+
+
+def compact_story_concepts(session, user_story_ids: List[str]) -> int:
+    """Gộp Concept của các story về một row mỗi story (không commit). Trả về số row đã xoá."""
+    rows = session.query(Concept).filter(
+        Concept.user_story_id.in_(user_story_ids)
+    ).order_by(Concept.created_at).all()
+    by_story: Dict[str, List[Concept]] = {}
+    for row in rows:
+        by_story.setdefault(row.user_story_id, []).append(row)
+
+    updates = []
+    removed = []
+    for story_rows in by_story.values():
+        if len(story_rows) < 2:
+            continue
+        keeper = next((r for r in story_rows if not _is_phase2_copy(r.metadata_json)), story_rows[0])
+        values = {'id': keeper.id, 'role': keeper.role, 'action': keeper.action, 'object': keeper.object}
+        meta = dict(keeper.metadata_json or {})
+        legacy_frequency = None
+        for row in story_rows:
+            if row is keeper:
+                continue
+            for field in ('role', 'action', 'object'):
+                values[field] = values[field] or getattr(row, field)
+            if _is_phase2_copy(row.metadata_json) and 'frequency' in row.metadata_json:
+                legacy_frequency = row.metadata_json['frequency']  # row mới nhất thắng
+            removed.append(row.id)
+        if legacy_frequency is not None:
+            meta.setdefault('frequency', legacy_frequency)
+        if meta:
+            values['metadata_json'] = meta
+        updates.append(values)
+
+    if updates:
+        session.execute(update(Concept), updates)
+    for offset in range(0, len(removed), _CHUNK):
+        session.execute(delete(Concept).where(Concept.id.in_(removed[offset:offset + _CHUNK])))
+    return len(removed)
+
+
+def compact_concepts(db_manager=None, batch_size: int = 500) -> Dict[str, int]:
+    """Gộp Concept trùng của toàn bộ DB, commit mỗi batch story."""
+    from database import DatabaseSession
+
+    stats = {'stories': 0, 'removed': 0}
+    while True:
+        with DatabaseSession(db_manager) as session:
+            story_ids = [row[0] for row in session.query(Concept.user_story_id).filter(
+                Concept.user_story_id.isnot(None)
+            ).group_by(Concept.user_story_id).having(func.count(Concept.id) > 1).limit(batch_size).all()]
+            if not story_ids:
+                break
+            stats['removed'] += compact_story_concepts(session, story_ids)
+        stats['stories'] += len(story_ids)
+        logging.info(f"💾 Compacted {stats['stories']} stories ({stats['removed']} duplicate concepts removed)")
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(compact_concepts())
@@ -1,46 +1,242 @@
-from typing import List, Dict, Any
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 from collections import Counter
-from models.models import Concept
+from sqlalchemy import case, insert, update
+from constant import CONCEPT_FREQUENCY_BATCH_SIZE, CONCEPT_FREQUENCY_TOP_N
+from models.models import Concept, ConceptFrequency
 
+CONCEPT_TYPES = ('role', 'action', 'object')
+# concept_and_domain của từng type trong final_output
+CONCEPT_DOMAINS = {'role': 'role (general)', 'action': 'feature', 'object': 'object (general)'}
+_TEXT_LENGTH = 255
+_CHUNK = 1000
 
-def count_concept_frequency(concepts: List[Dict[str, Any]]) -> Dict[str, int]:
-    # Phase2 concepts may use 'name' or 'text' as the value holder
-    names = [c.get('name') or c.get('text') for c in concepts if (c.get('name') or c.get('text'))]
-    return dict(Counter(names))
 
+def _classify(concept: Dict[str, Any]) -> Optional[str]:
+    classification = concept.get('concept_and_domain', '') or ''
+    if 'feature' in classification:
+        return 'action'
+    if 'role' in classification:
+        return 'role'
+    if 'object' in classification:
+        return 'object'
+    return None
 
-def attach_frequency_to_concepts(concepts: List[Dict[str, Any]], frequencies: Dict[str, int]) -> List[Dict[str, Any]]:
+
+def count_concept_frequency(concepts: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Tần suất trong payload theo type: {'role': {text: n}, 'action': {...}, 'object': {...}}.
+
+    Nhận cả concept của Phase1 (role / action / object) lẫn record dạng final_output
+    (text + concept_and_domain).
+    """
+    counters = {t: Counter() for t in CONCEPT_TYPES}
     for c in concepts:
-        # Phase2 may store the text under 'name' or 'text' — use either for lookup
         name = c.get('name') or c.get('text')
-        c['frequency'] = frequencies.get(name, 0)
-    return concepts
+        concept_type = _classify(c) if name else None
+        if concept_type:
+            counters[concept_type][name[:_TEXT_LENGTH]] += 1
+            continue
+        for t in CONCEPT_TYPES:
+            if c.get(t):
+                counters[t][c[t][:_TEXT_LENGTH]] += 1
+    return {t: dict(counter) for t, counter in counters.items()}
 
 
-def save_concepts(session, user_story_id: str, concepts: List[Dict[str, Any]]):
+def attach_frequency_to_concepts(concepts: List[Dict[str, Any]],
+                                 frequencies: Dict[str, Dict[str, int]]) -> List[Dict[str, Any]]:
+    """Gắn `frequency` (int như trước: tần suất của name / text với record final_output,
+    của object với concept Phase1) và `frequency_by_type` ({type: tần suất})."""
     for c in concepts:
-        # Map the generic 'name' or 'text' field from Phase2 final_output into the
-        # appropriate Concept columns (action/role/object) based on classification
+        by_type = {t: frequencies.get(t, {}).get(c[t][:_TEXT_LENGTH], 0) for t in CONCEPT_TYPES if c.get(t)}
         name = c.get('name') or c.get('text')
-        classification = c.get('concept_and_domain', '') or ''
-        role = None
-        action = None
-        obj = None
-        if 'feature' in classification:
-            action = name
-        elif 'role' in classification:
-            role = name
-        elif 'object' in classification:
-            obj = name
+        concept_type = _classify(c) if name else None
+        if concept_type:
+            c['frequency'] = frequencies.get(concept_type, {}).get(name[:_TEXT_LENGTH], 0)
+        else:
+            c['frequency'] = by_type.get('object', 0)
+        c['frequency_by_type'] = by_type
+    return concepts
+
+
+def _frequency_upsert(session, rows: List[Dict[str, Any]]):
+    """INSERT nhiều dòng, cộng dồn frequency nếu (concept_type, concept_text) đã có.
+
+    None nếu dialect không có upsert native (xem _portable_upsert).
+    """
+    table = ConceptFrequency.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update(
+            frequency=table.c.frequency + stmt.inserted.frequency,
+            updated_at=stmt.inserted.updated_at,
+        )
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
         else:
-            # fallback to action
-            action = name
-
-        concept = Concept(
-            user_story_id=user_story_id,
-            role=role,
-            action=action,
-            object=obj,
-            metadata_json=c
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=['concept_type', 'concept_text'],
+            set_={'frequency': table.c.frequency + stmt.excluded.frequency,
+                  'updated_at': stmt.excluded.updated_at},
         )
-        session.add(concept)
+    return None
+
+
+def _add_frequencies(session, concept_type: str, deltas: Dict[str, int], now: datetime):
+    """Một UPDATE cho nhiều concept cùng type: frequency += delta, không xuống dưới 0."""
+    table = ConceptFrequency.__table__
+    delta = case(deltas, value=table.c.concept_text, else_=0)
+    session.execute(
+        update(table)
+        .where(table.c.concept_type == concept_type, table.c.concept_text.in_(sorted(deltas)))
+        .values(frequency=case((table.c.frequency + delta > 0, table.c.frequency + delta), else_=0), updated_at=now)
+    )
+
+
+def _portable_upsert(session, rows: List[Dict[str, Any]]):
+    """Upsert cho dialect không có ON DUPLICATE KEY / ON CONFLICT: đọc key đã có, một
+    UPDATE (CASE) mỗi type cho key đã có và một multi-row INSERT cho key mới."""
+    table = ConceptFrequency.__table__
+    now = rows[0]['updated_at']
+    by_type: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for row in rows:
+        by_type.setdefault(row['concept_type'], {})[row['concept_text']] = row
+    new_rows = []
+    for t, texts in sorted(by_type.items()):
+        existing = {row.concept_text for row in session.query(ConceptFrequency.concept_text).filter(
+            ConceptFrequency.concept_type == t, ConceptFrequency.concept_text.in_(sorted(texts))
+        )}
+        if existing:
+            _add_frequencies(session, t, {text: texts[text]['frequency'] for text in existing}, now)
+        new_rows.extend(row for text, row in texts.items() if text not in existing)
+    if new_rows:
+        session.execute(insert(table).values(new_rows))
+
+
+def upsert_concept_frequencies(session, frequencies: Dict[str, Dict[str, int]],
+                               batch_size: int = CONCEPT_FREQUENCY_BATCH_SIZE) -> int:
+    """Cộng tần suất của payload vào counter toàn corpus (concept_frequency), không commit.
+
+    Mỗi batch là một `INSERT ... ON DUPLICATE KEY UPDATE frequency = frequency + n`
+    (ON CONFLICT với SQLite / PostgreSQL; dialect khác dùng read-then-update/insert).
+    Rows được sắp theo key để các transaction song song khoá index theo cùng thứ tự
+    (tránh deadlock).
+    """
+    now = datetime.utcnow()
+    rows = [
+        {'id': str(uuid.uuid4()), 'concept_type': t, 'concept_text': text, 'frequency': n, 'updated_at': now}
+        for t in sorted(frequencies) for text, n in sorted(frequencies[t].items()) if n > 0
+    ]
+    batch_size = max(batch_size, 1)
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        stmt = _frequency_upsert(session, batch)
+        if stmt is None:
+            _portable_upsert(session, batch)
+        else:
+            session.execute(stmt)
+    return len(rows)
+
+
+def decrement_concept_frequencies(session, frequencies: Dict[str, Dict[str, int]],
+                                  batch_size: int = CONCEPT_FREQUENCY_BATCH_SIZE) -> int:
+    """Trừ tần suất (vd. khi xoá story), không xuống dưới 0.
+
+    Một UPDATE ... SET frequency = CASE concept_text ... mỗi type và mỗi batch key.
+    """
+    now = datetime.utcnow()
+    batch_size = max(batch_size, 1)
+    updated = 0
+    for t in sorted(frequencies):
+        deltas = sorted((text, -n) for text, n in frequencies[t].items() if n > 0)
+        for offset in range(0, len(deltas), batch_size):
+            _add_frequencies(session, t, dict(deltas[offset:offset + batch_size]), now)
+        updated += len(deltas)
+    return updated
+
+
+def count_stored_concepts(session, user_story_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """Tần suất theo type của các Concept đã lưu của các story (trước khi xoá chúng)."""
+    records = []
+    for offset in range(0, len(user_story_ids), _CHUNK):
+        rows = session.query(Concept.role, Concept.action, Concept.object).filter(
+            Concept.user_story_id.in_(user_story_ids[offset:offset + _CHUNK])
+        ).all()
+        records.extend({'role': row.role, 'action': row.action, 'object': row.object} for row in rows)
+    return count_concept_frequency(records)
+
+
+def get_concept_frequencies(session, frequencies: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    """Tần suất toàn corpus của các concept có trong `frequencies`."""
+    result = {t: {} for t in CONCEPT_TYPES}
+    for t, counts in frequencies.items():
+        texts = sorted(counts)
+        for offset in range(0, len(texts), _CHUNK):
+            rows = session.query(ConceptFrequency.concept_text, ConceptFrequency.frequency).filter(
+                ConceptFrequency.concept_type == t,
+                ConceptFrequency.concept_text.in_(texts[offset:offset + _CHUNK]),
+            ).all()
+            result.setdefault(t, {}).update({row.concept_text: row.frequency for row in rows})
+    return result
+
+
+def top_concept_frequencies(session, concept_type: Optional[str] = None,
+                            limit: int = CONCEPT_FREQUENCY_TOP_N) -> Dict[str, List[Dict[str, Any]]]:
+    """Top-N concept theo frequency cho từng type, đọc thẳng từ concept_frequency
+    (index (concept_type, frequency), không phải aggregate bảng concepts)."""
+    result = {}
+    for t in ([concept_type] if concept_type else CONCEPT_TYPES):
+        rows = session.query(ConceptFrequency.concept_text, ConceptFrequency.frequency).filter(
+            ConceptFrequency.concept_type == t, ConceptFrequency.frequency > 0
+        ).order_by(ConceptFrequency.frequency.desc(), ConceptFrequency.concept_text).limit(limit).all()
+        result[t] = [{'concept': row.concept_text, 'frequency': row.frequency} for row in rows]
+    return result
+
+
+def load_phase1_concept_ids(session, user_story_ids: List[str]) -> Dict[str, str]:
+    """Id của Concept do Phase1 tạo (concept đầu tiên) cho từng story."""
+    result = {}
+    for offset in range(0, len(user_story_ids), _CHUNK):
+        rows = session.query(Concept.id, Concept.user_story_id).filter(
+            Concept.user_story_id.in_(user_story_ids[offset:offset + _CHUNK])
+        ).order_by(Concept.created_at).all()
+        for row in rows:
+            result.setdefault(row.user_story_id, row.id)
+    return result
+
+
+def enrich_concepts(session, concepts: List[Dict[str, Any]]) -> int:
+    """Gắn frequency và classification vào metadata của Concept Phase1 đã tạo (không thêm row).
+
+    Concept được xác định bằng `concept_id` trong output Phase1 (hoặc concept đầu tiên
+    của story `db_id`); metadata hiện có (vd. visual narrator) được giữ lại.
+    Ghi bằng một prefetch và một ORM bulk UPDATE theo primary key mỗi chunk.
+    """
+    missing = [c['db_id'] for c in concepts if not c.get('concept_id') and c.get('db_id')]
+    phase1_ids = load_phase1_concept_ids(session, missing) if missing else {}
+
+    enrichment = {}
+    for c in concepts:
+        concept_id = c.get('concept_id') or phase1_ids.get(c.get('db_id'))
+        if concept_id:
+            enrichment[concept_id] = {
+                'frequency': c.get('frequency', 0),
+                'frequency_by_type': c.get('frequency_by_type', {}),
+                'concept_and_domain': {t: CONCEPT_DOMAINS[t] for t in CONCEPT_TYPES if c.get(t)},
+            }
+
+    ids = sorted(enrichment)
+    for offset in range(0, len(ids), _CHUNK):
+        rows = session.query(Concept.id, Concept.metadata_json).filter(Concept.id.in_(ids[offset:offset + _CHUNK])).all()
+        updates = [{'id': row.id, 'metadata_json': {**(row.metadata_json or {}), **enrichment[row.id]}} for row in rows]
+        if updates:
+            # ORM bulk UPDATE theo primary key
+            session.execute(update(Concept), updates)
+    return len(ids)
@@ -1,19 +1,22 @@
 import logging
 from typing import Dict, List
 from database import DatabaseSession, get_database_manager
-from .helpers import generate_synonym_records, save_synonyms
+from metrics import phase
+from .helpers import generate_synonym_records, save_concept_similarities, save_concept_synonyms, save_synonyms
+from .similarity import get_similarity_engine
 from models.models import ProcessingSession
 
 
 class Phase3:
-    def __init__(self, session_id: str = None):
+    def __init__(self, session_id: str = None, db_manager=None):
         self.input_data = {}
         self.synonyms = {}
         self.similarities = []
         self.final_output = {}
         self.session_id = session_id
-        self.db_manager = get_database_manager()
+        self.db_manager = db_manager or get_database_manager()
 
+    @phase("phase3")
     def process_wordnet(self, phase2_data: Dict = None) -> Dict:
         if phase2_data:
             self.input_data = phase2_data
@@ -21,11 +24,20 @@ class Phase3:
 
         try:
             with DatabaseSession(self.db_manager) as session:
-                concepts = [r.get('text') for r in self.input_data.get('final_output', []) if r.get('text')]
-                synonym_records = generate_synonym_records([{'name': c} for c in concepts])
-                save_synonyms(session, self.session_id, synonym_records)
+                # Giữ story id (phần trước ':' của usid_text) để lookup theo từng story
+                concepts = [
+                    {'name': r.get('text'), 'story_id': r.get("usid_text", "").split(":", 1)[0].strip(),
+                     'concept_and_domain': r.get('concept_and_domain')}
+                    for r in self.input_data.get('final_output', []) if r.get('text')
+                ]
+                synonym_records = generate_synonym_records(concepts)
+                save_synonyms(session, synonym_records)
+                save_concept_synonyms(session, synonym_records)
+                self.synonyms = {rec['concept']: rec['synonyms'] for rec in synonym_records}
+
+                self.similarities = self._compute_similarities()
+                save_concept_similarities(session, self.similarities)
 
-                # simplified similarity logic left in module for future expansion
                 self._create_final_output()
                 self._update_processing_session(session, 3, "completed")
 
@@ -38,6 +50,29 @@ class Phase3:
 
         return self.final_output
 
+    def _compute_similarities(self) -> List[Dict]:
+        """Wu-Palmer similarity giữa các concept cùng loại (role / object / action)."""
+        groups = {"role": set(), "object": set(), "action": set()}
+        for r in self.input_data.get("final_output", []):
+            domain = r.get("concept_and_domain", "")
+            concept_type = "action" if domain == "feature" else "role" if "role" in domain else "object" if "object" in domain else None
+            if concept_type and r.get("text"):
+                groups[concept_type].add(r["text"])
+
+        engine = get_similarity_engine()
+        pairs = []
+        for concept_type, concepts in groups.items():
+            pos = "v" if concept_type == "action" else "n"
+            for c1, c2, score in engine.pairwise(list(concepts), pos):
+                pairs.append({
+                    "concept1": c1,
+                    "concept2": c2,
+                    "similarity": score,
+                    "similarity_type": "Wu-Palmer",
+                    "concept_type": concept_type,
+                })
+        return pairs
+
     def _create_final_output(self):
         all_records = self.input_data.get("final_output", [])
         roles = list(set([r.get("text") for r in all_records if "role" in r.get("concept_and_domain", "") and r.get("text")]))
@@ -62,8 +97,8 @@ class Phase3:
             "objects": [o for o in objects if o],
             "verbs": [v for v in verbs if v],
             "subject_verb_object": svo_relationships,
-            "pairwise_relationships": [],
-            "synonyms": {},
+            "pairwise_relationships": self.similarities,
+            "synonyms": self.synonyms,
             "session_id": self.session_id
         }
 
@@ -1,41 +1,180 @@
-from typing import List, Dict, Any
-from models.models import Concept
-from sqlalchemy import or_
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Tuple
+from constant import PHASE3_INSERT_BATCH_SIZE
+from models.models import Concept, ConceptSimilarity, ConceptSynonym, UserStory
+from sqlalchemy import insert, update
+from .wordnet_index import LemmaIndex, concept_pos, get_lemma_index
 
+# Giới hạn số id trong một mệnh đề IN
+_PREFETCH_CHUNK = 1000
 
-def generate_synonym_records(concepts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    # Accept either dicts with 'name'/'text' or plain strings
+
+def _insert_ignore(session, table, rows: List[Dict[str, Any]], index_elements: List[str]):
+    """Multi-row INSERT bỏ qua dòng trùng unique key (run song song có thể ghi cùng cặp).
+
+    ON DUPLICATE KEY UPDATE no-op với MySQL, ON CONFLICT DO NOTHING với SQLite / PostgreSQL;
+    dialect khác dùng INSERT thường (chỉ còn dựa vào bước prefetch).
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table).values(rows)
+        # Không dùng INSERT IGNORE: nó nuốt cả lỗi khác (vd. truncation)
+        return stmt.on_duplicate_key_update(id=table.c.id)
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        return dialect_insert(table).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(table).values(rows)
+
+
+def generate_synonym_records(concepts: List[Dict[str, Any]], index: LemmaIndex = None) -> List[Dict[str, Any]]:
+    """Synonyms WordNet cho từng concept (lookup memoised trong LemmaIndex).
+
+    Concept là dict có 'name'/'text' (và 'concept_and_domain' để chọn POS) hoặc string.
+    """
+    index = index or get_lemma_index()
     records = []
     for c in concepts:
+        # Accept either dicts with 'name'/'text' or plain strings
         if isinstance(c, dict):
             name = c.get('name') or c.get('text')
+            story_id = c.get('story_id')
+            pos = concept_pos(c.get('concept_and_domain'))
         else:
             name = str(c)
+            story_id = None
+            pos = 'n'
         if not name:
             continue
         records.append({
             'concept': name,
-            'synonyms': [name]
+            'story_id': story_id,
+            'pos': pos,
+            'synonyms': index.synonyms(name, pos),
         })
     return records
 
 
-def save_synonyms(session, user_story_id: str, synonym_records: List[Dict[str, Any]]):
+def load_story_concepts(session, story_ids: Iterable[str]) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """Load mọi Concept của các story trong một lần query.
+
+    Returns:
+        map (story_id, text) -> danh sách concept rows (id, metadata) có role/action/object = text
+    """
+    story_ids = sorted({sid for sid in story_ids if sid})
+    concept_map: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    rows_by_id: Dict[str, Dict[str, Any]] = {}
+
+    for offset in range(0, len(story_ids), _PREFETCH_CHUNK):
+        chunk = story_ids[offset:offset + _PREFETCH_CHUNK]
+        rows = session.query(
+            Concept.id, Concept.role, Concept.action, Concept.object, Concept.metadata_json, UserStory.story_id
+        ).join(UserStory, Concept.user_story_id == UserStory.id).filter(UserStory.story_id.in_(chunk)).all()
+
+        for concept_id, role, action, obj, metadata_json, story_id in rows:
+            row = rows_by_id.setdefault(concept_id, {'id': concept_id, 'metadata_json': metadata_json})
+            for text in {role, action, obj}:
+                if text:
+                    concept_map.setdefault((story_id, text), []).append(row)
+
+    return concept_map
+
+
+def save_synonyms(session, synonym_records: List[Dict[str, Any]]):
+    """Gắn synonyms vào metadata của concept rows bằng một lần prefetch và một bulk UPDATE."""
+    concept_map = load_story_concepts(session, (rec.get('story_id') for rec in synonym_records))
+
+    updates: Dict[str, Dict[str, Any]] = {}
     for rec in synonym_records:
         concept_text = rec.get('concept')
         if not concept_text:
             continue
-        # Find concept row where any of role/action/object matches the concept text
-        concept = session.query(Concept).filter(
-            Concept.user_story_id == user_story_id,
-            or_(
-                Concept.action == concept_text,
-                Concept.role == concept_text,
-                Concept.object == concept_text,
-            )
-        ).first()
-        if concept:
-            meta = concept.metadata_json or {}
+        for row in concept_map.get((rec.get('story_id'), concept_text), []):
+            meta = dict(row['metadata_json'] or {})
             meta['synonyms'] = rec.get('synonyms', [])
-            concept.metadata_json = meta
-            session.add(concept)
+            row['metadata_json'] = meta
+            updates[row['id']] = row
+
+    if updates:
+        # ORM bulk UPDATE theo primary key
+        session.execute(update(Concept), list(updates.values()))
+    return len(updates)
+
+
+def save_concept_synonyms(session, synonym_records: List[Dict[str, Any]],
+                          batch_size: int = PHASE3_INSERT_BATCH_SIZE) -> int:
+    """Ghi các cặp (concept, synonym) chưa có vào concept_synonyms bằng multi-row INSERT.
+
+    Cặp đã lưu được bỏ trước khi insert; cặp do run khác ghi cùng lúc bị unique index
+    (original_concept, synonym) chặn và được bỏ qua.
+    """
+    pairs = {}
+    for rec in synonym_records:
+        for synonym in rec.get('synonyms', []):
+            pairs.setdefault((rec['concept'], synonym), None)
+    if not pairs:
+        return 0
+
+    # Bỏ các cặp đã lưu từ những lần chạy trước
+    concepts = sorted({concept for concept, _ in pairs})
+    for offset in range(0, len(concepts), _PREFETCH_CHUNK):
+        rows = session.query(ConceptSynonym.original_concept, ConceptSynonym.synonym).filter(
+            ConceptSynonym.original_concept.in_(concepts[offset:offset + _PREFETCH_CHUNK])
+        ).all()
+        for row in rows:
+            pairs.pop((row.original_concept, row.synonym), None)
+
+    now = datetime.utcnow()
+    rows = [
+        {'id': str(uuid.uuid4()), 'original_concept': concept, 'synonym': synonym,
+         'source': 'wordnet', 'created_at': now}
+        for concept, synonym in pairs
+    ]
+    batch_size = max(batch_size, 1)
+    for offset in range(0, len(rows), batch_size):
+        session.execute(_insert_ignore(
+            session, ConceptSynonym.__table__, rows[offset:offset + batch_size], ['original_concept', 'synonym']
+        ))
+    return len(rows)
+
+
+def save_concept_similarities(session, pairs: List[Dict[str, Any]], similarity_type: str = 'Wu-Palmer',
+                              batch_size: int = PHASE3_INSERT_BATCH_SIZE) -> int:
+    """Ghi các cặp concept chưa có vào concept_similarities bằng multi-row INSERT.
+
+    Mỗi pair là dict có concept1, concept2, similarity. Cặp do run khác ghi cùng lúc
+    bị unique index (concept1, concept2, similarity_type) chặn và được bỏ qua.
+    """
+    scores = {(p['concept1'], p['concept2']): p['similarity'] for p in pairs}
+    if not scores:
+        return 0
+
+    # Bỏ các cặp đã lưu từ những lần chạy trước
+    concepts = sorted({c1 for c1, _ in scores})
+    for offset in range(0, len(concepts), _PREFETCH_CHUNK):
+        rows = session.query(ConceptSimilarity.concept1, ConceptSimilarity.concept2).filter(
+            ConceptSimilarity.concept1.in_(concepts[offset:offset + _PREFETCH_CHUNK]),
+            ConceptSimilarity.similarity_type == similarity_type,
+        ).all()
+        for row in rows:
+            scores.pop((row.concept1, row.concept2), None)
+
+    now = datetime.utcnow()
+    rows = [
+        {'id': str(uuid.uuid4()), 'concept1': c1, 'concept2': c2, 'similarity_score': score,
+         'similarity_type': similarity_type, 'created_at': now}
+        for (c1, c2), score in scores.items()
+    ]
+    batch_size = max(batch_size, 1)
+    for offset in range(0, len(rows), batch_size):
+        session.execute(_insert_ignore(
+            session, ConceptSimilarity.__table__, rows[offset:offset + batch_size],
+            ['concept1', 'concept2', 'similarity_type'],
+        ))
+    return len(rows)
@@ -0,0 +1,150 @@
+"""Wu-Palmer similarity giữa các concept của Phase3, tính theo block bằng NumPy.
+
+Mỗi concept được map về sense phổ biến nhất trong LemmaIndex. Với hai synset s1, s2:
+
+    wup(s1, s2) = 2 * depth(lcs) / (depth(s1) + depth(s2))
+
+trong đó depth tính từ root (root = 1) theo đường hypernym dài nhất và lcs là
+hypernym chung sâu nhất. Thay vì gọi `wup_similarity` cho từng cặp, depth của lcs
+được tính cho cả block từ bảng ancestor theo depth (synset x depth x slot): ở mỗi
+depth (từ sâu nhất) một phép so sánh vectorised cho biết cặp nào có ancestor chung
+ở depth đó. Chỉ giữ cặp có score >= threshold và tối đa top_k cặp mỗi concept.
+"""
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from constant import SIMILARITY_BLOCK_SIZE, SIMILARITY_THRESHOLD, SIMILARITY_TOP_K
+from .wordnet_index import LemmaIndex, get_lemma_index
+
+
+class SimilarityEngine:
+    def __init__(self, index: Optional[LemmaIndex] = None, block_size: int = SIMILARITY_BLOCK_SIZE):
+        self.index = index or get_lemma_index()
+        self.block_size = max(block_size, 1)
+        self.depth = lru_cache(maxsize=None)(self._depth)
+        self.ancestors = lru_cache(maxsize=100000)(self._ancestors)
+
+    def _depth(self, pos: str, offset: int) -> int:
+        parents = self.index.hypernyms.get((pos, offset), ())
+        return 1 + max((self.depth(pos, p) for p in parents), default=0)
+
+    def _ancestors(self, pos: str, offset: int) -> frozenset:
+        """Synset và mọi hypernym (trực tiếp / gián tiếp) của nó."""
+        result = {offset}
+        for parent in self.index.hypernyms.get((pos, offset), ()):
+            result |= self.ancestors(pos, parent)
+        return frozenset(result)
+
+    def pairwise(self, concepts: List[str], pos: str = "n", threshold: float = SIMILARITY_THRESHOLD,
+                 top_k: Optional[int] = SIMILARITY_TOP_K) -> List[Tuple[str, str, float]]:
+        """Các cặp (concept1, concept2, score) với concept1 < concept2, score giảm dần.
+
+        Concept WordNet không có bị bỏ qua; các concept cùng synset có score 1.0.
+        """
+        by_synset: Dict[int, List[str]] = {}
+        for concept in sorted(set(concepts)):
+            offset = self.index.first_synset(concept, pos)
+            if offset is not None:
+                by_synset.setdefault(offset, []).append(concept)
+        if not by_synset:
+            return []
+
+        synsets = list(by_synset)
+        synset_pairs = self._synset_pairs(synsets, pos, threshold, top_k)
+
+        pairs: Dict[Tuple[str, str], float] = {}
+        for offset, group in by_synset.items():
+            for i, a in enumerate(group):
+                for b in group[i + 1:]:
+                    pairs[(a, b)] = 1.0
+        for i, j, score in synset_pairs:
+            for a in by_synset[synsets[i]]:
+                for b in by_synset[synsets[j]]:
+                    key = (a, b) if a < b else (b, a)
+                    pairs[key] = max(score, pairs.get(key, 0.0))
+
+        result = [(a, b, round(score, 4)) for (a, b), score in pairs.items()]
+        result.sort(key=lambda r: (-r[2], r[0], r[1]))
+        return result
+
+    def _synset_pairs(self, synsets: List[int], pos: str, threshold: float,
+                      top_k: Optional[int]) -> List[Tuple[int, int, float]]:
+        """(i, j, score) theo chỉ số trong `synsets`, i < j."""
+        n = len(synsets)
+        if n < 2:
+            return []
+
+        # Bảng ancestor theo depth: labels[i, d, k] = id của ancestor thứ k (ở depth d + 1) của synset i.
+        # Trong cây hypernym mỗi depth chỉ có một ancestor; K > 1 chỉ khi có đa kế thừa.
+        ancestor_sets = [self.ancestors(pos, s) for s in synsets]
+        column_of = {a: c for c, a in enumerate(sorted(set().union(*ancestor_sets)))}
+        per_depth = []
+        for ancestors in ancestor_sets:
+            levels: Dict[int, List[int]] = {}
+            for a in ancestors:
+                levels.setdefault(self.depth(pos, a), []).append(column_of[a])
+            per_depth.append(levels)
+        max_depth = max(max(levels) for levels in per_depth)
+        slots = max(len(ids) for levels in per_depth for ids in levels.values())
+
+        # Padding khác nhau cho hai phía để ô trống không bao giờ bằng nhau
+        left = np.full((n, max_depth, slots), -1, dtype=np.int32)
+        right = np.full((n, max_depth, slots), -2, dtype=np.int32)
+        for i, levels in enumerate(per_depth):
+            for d, ids in levels.items():
+                left[i, d - 1, :len(ids)] = ids
+                right[i, d - 1, :len(ids)] = ids
+        depth = np.array([self.depth(pos, s) for s in synsets], dtype=np.float32)
+
+        found = {}
+        for start in range(0, n, self.block_size):
+            stop = min(start + self.block_size, n)
+            lcs_depth = np.zeros((stop - start, n), dtype=np.float32)
+            # lcs nông hơn mức này không thể cho score >= threshold với bất kỳ cặp nào trong block
+            min_useful = threshold * (depth[start:stop].min() + depth.min()) / 2
+            for d in range(max_depth, 0, -1):
+                if d < min_useful:
+                    break
+                shared = np.zeros((stop - start, n), dtype=bool)
+                for k1 in range(slots):
+                    for k2 in range(slots):
+                        shared |= left[start:stop, d - 1, k1][:, None] == right[:, d - 1, k2][None, :]
+                lcs_depth[(lcs_depth == 0) & shared] = d
+                if lcs_depth.all():
+                    break
+
+            scores = 2.0 * lcs_depth / (depth[start:stop, None] + depth[None, :])
+            scores[lcs_depth == 0] = -1.0  # không có hypernym chung (vd. động từ khác root)
+            scores[np.arange(stop - start), np.arange(start, stop)] = -1.0  # bỏ chính nó
+            scores[scores < threshold] = -1.0
+            if top_k is not None and top_k < n - 1:
+                keep = np.argpartition(-scores, top_k, axis=1)[:, :top_k]
+                mask = np.zeros_like(scores, dtype=bool)
+                np.put_along_axis(mask, keep, True, axis=1)
+                scores[~mask] = -1.0
+
+            rows, cols = np.nonzero(scores >= 0)
+            for r, c in zip(rows.tolist(), cols.tolist()):
+                i, j = start + r, c
+                key = (i, j) if i < j else (j, i)
+                found[key] = max(float(scores[r, c]), found.get(key, 0.0))
+
+        logging.info(f"✅ Similarity: {n} synsets ({pos}), {len(found)} pairs >= {threshold}")
+        return [(i, j, score) for (i, j), score in found.items()]
+
+
+# Singleton pattern cho similarity engine
+_similarity_engine: Optional[SimilarityEngine] = None
+
+
+def get_similarity_engine() -> SimilarityEngine:
+    """Lấy instance của SimilarityEngine (singleton, dùng chung lemma index)"""
+    global _similarity_engine
+
+    if _similarity_engine is None:
+        _similarity_engine = SimilarityEngine()
+
+    return _similarity_engine
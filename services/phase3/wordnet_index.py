@@ -0,0 +1,259 @@
+"""Lemma -> synonyms index dựng một lần từ WordNet (nltk) cho Phase3.
+
+Index chỉ gồm danh từ và động từ (role / object là danh từ, action là động từ).
+Lookup chỉ là vài dict lookup và được memoise theo (concept, pos), nên Phase3
+không phải gọi `wn.synsets()` (đọc file data của WordNet) cho mỗi concept.
+"""
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from constant import WORDNET_INDEX_PATH, WORDNET_MAX_SYNONYMS, WORDNET_RETRY_SECONDS
+
+INDEX_POS = ("n", "v")
+_INDEX_FORMAT = 2
+
+# Quy tắc bỏ hậu tố của WordNet (giống WordNetCorpusReader.MORPHOLOGICAL_SUBSTITUTIONS)
+_SUFFIX_RULES = {
+    "n": [("s", ""), ("ses", "s"), ("ves", "f"), ("xes", "x"), ("zes", "z"),
+          ("ches", "ch"), ("shes", "sh"), ("men", "man"), ("ies", "y")],
+    "v": [("s", ""), ("ies", "y"), ("es", "e"), ("es", ""), ("ed", "e"), ("ed", ""),
+          ("ing", "e"), ("ing", "")],
+}
+
+# Từ không mang nghĩa khi tìm head word của cụm từ
+_SKIP_WORDS = {
+    "a", "an", "the", "my", "our", "your", "their", "his", "her", "its", "this", "that",
+    "these", "those", "all", "some", "any", "each", "every", "i", "me", "we", "us", "it",
+}
+_PREPOSITIONS = {"of", "for", "in", "on", "with", "to", "from", "by", "about", "at", "into", "via"}
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+
+def concept_pos(concept_and_domain: str) -> str:
+    """POS WordNet cho concept của Phase2: feature (action) là động từ, còn lại là danh từ."""
+    return "v" if (concept_and_domain or "") == "feature" else "n"
+
+
+def head_word(words: List[str], pos: str) -> Optional[str]:
+    """Head của cụm từ: động từ đầu tiên (cụm động từ) hoặc danh từ cuối trước giới từ đầu tiên."""
+    words = [w for w in words if w not in _SKIP_WORDS]
+    if not words:
+        return None
+    if pos == "v":
+        return words[0]
+    for i, word in enumerate(words):
+        if word in _PREPOSITIONS and i > 0:
+            return words[i - 1]
+    return words[-1]
+
+
+class LemmaIndex:
+    """Index lemma -> synsets (theo thứ tự sense của WordNet), synset -> lemma names
+    và synset -> hypernyms (dùng cho similarity)."""
+
+    def __init__(self, lemma_synsets: Dict[str, Dict[str, Tuple[int, ...]]],
+                 synset_lemmas: Dict[Tuple[str, int], Tuple[str, ...]],
+                 exceptions: Optional[Dict[str, Dict[str, str]]] = None,
+                 hypernyms: Optional[Dict[Tuple[str, int], Tuple[int, ...]]] = None,
+                 max_synonyms: int = WORDNET_MAX_SYNONYMS):
+        self.lemma_synsets = lemma_synsets
+        self.synset_lemmas = synset_lemmas
+        self.exceptions = exceptions or {}
+        self.hypernyms = hypernyms or {}
+        self.max_synonyms = max_synonyms
+        self.build_seconds = None
+        self._lookup = lru_cache(maxsize=100000)(self._synonyms)
+
+    @property
+    def available(self) -> bool:
+        return bool(self.lemma_synsets)
+
+    @classmethod
+    def from_wordnet(cls, wordnet=None, **kwargs) -> "LemmaIndex":
+        """Dựng index từ WordNet corpus của nltk (đọc tuần tự file data một lần)."""
+        if wordnet is None:
+            from nltk.corpus import wordnet
+
+        synset_lemmas = {}
+        hypernyms = {}
+        lemma_synsets: Dict[str, Dict[str, List[int]]] = {}
+        for pos in INDEX_POS:
+            for synset in wordnet.all_synsets(pos):
+                names = tuple(dict.fromkeys(n.replace("_", " ").lower() for n in synset.lemma_names()))
+                synset_lemmas[(pos, synset.offset())] = names
+                parents = synset.hypernyms() + synset.instance_hypernyms()
+                if parents:
+                    hypernyms[(pos, synset.offset())] = tuple(h.offset() for h in parents)
+                for name in names:
+                    lemma_synsets.setdefault(name, {}).setdefault(pos, []).append(synset.offset())
+
+        # Thứ tự sense (synset phổ biến trước) lấy từ index.* của WordNet nếu reader có
+        sense_order = getattr(wordnet, "_lemma_pos_offset_map", None) or {}
+        for name, by_pos in lemma_synsets.items():
+            ordered = sense_order.get(name.replace(" ", "_"), {})
+            for pos, offsets in by_pos.items():
+                if ordered.get(pos):
+                    rank = {offset: i for i, offset in enumerate(ordered[pos])}
+                    offsets.sort(key=lambda o: rank.get(o, len(rank)))
+
+        exception_map = getattr(wordnet, "_exception_map", None) or {}
+        exceptions = {
+            pos: {form.replace("_", " "): bases[0].replace("_", " ")
+                  for form, bases in exception_map.get(pos, {}).items() if bases}
+            for pos in INDEX_POS
+        }
+        frozen = {name: {pos: tuple(offsets) for pos, offsets in by_pos.items()}
+                  for name, by_pos in lemma_synsets.items()}
+        return cls(frozen, synset_lemmas, exceptions, hypernyms, **kwargs)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump((_INDEX_FORMAT, self.lemma_synsets, self.synset_lemmas, self.exceptions, self.hypernyms), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "LemmaIndex":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data[0] != _INDEX_FORMAT:
+            raise ValueError(f"unsupported WordNet index format {data[0]}")
+        return cls(*data[1:], **kwargs)
+
+    def base_form(self, word: str, pos: str) -> Optional[str]:
+        """Dạng lemma có trong index (exception list rồi tới quy tắc hậu tố), None nếu không có."""
+        if pos in self.lemma_synsets.get(word, {}):
+            return word
+        base = self.exceptions.get(pos, {}).get(word)
+        if base and pos in self.lemma_synsets.get(base, {}):
+            return base
+        for suffix, replacement in _SUFFIX_RULES.get(pos, []):
+            if word.endswith(suffix):
+                candidate = word[:len(word) - len(suffix)] + replacement
+                if candidate and pos in self.lemma_synsets.get(candidate, {}):
+                    return candidate
+        return None
+
+    def resolve(self, concept: str, pos: str = "n") -> Optional[str]:
+        """Lemma dùng để tra synonyms: cả cụm nếu WordNet có (vd. "log in"), ngược lại head word."""
+        words = _WORD_RE.findall((concept or "").lower())
+        if not words:
+            return None
+        lemma = self.base_form(" ".join(words), pos)
+        if lemma is None and len(words) > 1:
+            head = head_word(words, pos)
+            lemma = self.base_form(head, pos) if head else None
+        return lemma
+
+    def first_synset(self, concept: str, pos: str = "n") -> Optional[int]:
+        """Offset của sense phổ biến nhất của concept, None nếu WordNet không có."""
+        lemma = self.resolve(concept, pos)
+        offsets = self.lemma_synsets[lemma].get(pos, ()) if lemma else ()
+        return offsets[0] if offsets else None
+
+    def synonyms(self, concept: str, pos: str = "n") -> List[str]:
+        """Synonyms của concept (không gồm chính lemma), tối đa max_synonyms; memoised."""
+        return list(self._lookup(concept, pos))
+
+    def _synonyms(self, concept: str, pos: str) -> Tuple[str, ...]:
+        lemma = self.resolve(concept, pos)
+        if lemma is None:
+            return ()
+        result = {}
+        for offset in self.lemma_synsets[lemma].get(pos, ()):
+            for name in self.synset_lemmas.get((pos, offset), ()):
+                if name != lemma:
+                    result.setdefault(name, None)
+                    if len(result) >= self.max_synonyms:
+                        return tuple(result)
+        return tuple(result)
+
+    def stats(self) -> Dict:
+        info = self._lookup.cache_info()
+        return {
+            "available": self.available,
+            "lemmas": len(self.lemma_synsets),
+            "synsets": len(self.synset_lemmas),
+            "build_seconds": self.build_seconds,
+            "memo_hits": info.hits,
+            "memo_misses": info.misses,
+            "memo_size": info.currsize,
+        }
+
+
+def build_lemma_index(path: Optional[str] = WORDNET_INDEX_PATH) -> LemmaIndex:
+    """Load index từ file (nếu có), ngược lại dựng từ WordNet và ghi ra file.
+
+    WordNet chưa được cài thì thử nltk.download một lần; vẫn không có thì trả về
+    index rỗng (available=False: Phase3 vẫn chạy, chỉ không có synonyms).
+    """
+    started = time.perf_counter()
+    if path and os.path.exists(path):
+        try:
+            index = LemmaIndex.load(path)
+            index.build_seconds = round(time.perf_counter() - started, 4)
+            logging.info(f"✅ WordNet lemma index loaded from {path} in {index.build_seconds}s")
+            return index
+        except Exception as e:
+            logging.warning(f"⚠️ Failed to load WordNet index from {path}, rebuilding: {e}")
+
+    try:
+        index = LemmaIndex.from_wordnet()
+    except LookupError:
+        import nltk
+
+        logging.warning("⚠️ WordNet corpus not found, downloading...")
+        if not nltk.download("wordnet", quiet=True):
+            logging.error("❌ WordNet corpus unavailable: Phase3 synonyms disabled")
+            return LemmaIndex({}, {})
+        index = LemmaIndex.from_wordnet()
+
+    index.build_seconds = round(time.perf_counter() - started, 4)
+    logging.info(
+        f"✅ WordNet lemma index built: {len(index.lemma_synsets)} lemmas in {index.build_seconds}s"
+    )
+    if path:
+        try:
+            index.save(path)
+        except OSError as e:
+            logging.warning(f"⚠️ Failed to write WordNet index to {path}: {e}")
+    return index
+
+
+# Singleton pattern cho lemma index
+_lemma_index: Optional[LemmaIndex] = None
+_lemma_index_lock = threading.Lock()
+# Index rỗng khi WordNet chưa có: không cache làm singleton, chỉ dùng tới lúc thử lại
+_unavailable_index: Optional[LemmaIndex] = None
+_retry_at = 0.0
+
+
+def get_lemma_index() -> LemmaIndex:
+    """Lấy instance của LemmaIndex (singleton, dựng ở lần gọi đầu tiên).
+
+    Index rỗng (WordNet chưa có) không được giữ làm singleton: sau
+    WORDNET_RETRY_SECONDS lần gọi tiếp theo sẽ dựng lại.
+    """
+    global _lemma_index, _unavailable_index, _retry_at
+
+    if _lemma_index is not None:
+        return _lemma_index
+
+    with _lemma_index_lock:
+        if _lemma_index is not None:
+            return _lemma_index
+        if _unavailable_index is not None and time.monotonic() < _retry_at:
+            return _unavailable_index
+        index = build_lemma_index()
+        if index.available:
+            _lemma_index = index
+            _unavailable_index = None
+        else:
+            _unavailable_index = index
+            _retry_at = time.monotonic() + WORDNET_RETRY_SECONDS
+        return index
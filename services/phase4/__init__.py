@@ -1,45 +1,60 @@
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from metrics import phase
 
 
 class Phase4:
     """Phase4: persist phase outputs into Neo4j using provided GraphDB instance."""
 
-    def persist_graph(self, phase1_output: Dict[str, Any], phase3_output: Dict[str, Any], graph):
+    @phase("phase4")
+    def persist_graph(self, phase1_output: Dict[str, Any], phase3_output: Dict[str, Any], graph,
+                      removed_story_ids: Optional[List[str]] = None):
         """Persist phase1 user stories and phase3 SVO relationships into graph DB.
 
+        Nodes and relationships are written with the GraphDB batch API
+        (UNWIND ... MERGE), so the whole payload costs a handful of round trips.
+
         Args:
             phase1_output: result from Phase1.process_text (expects key 'concepts')
             phase3_output: result from Phase3.process_wordnet (expects key 'subject_verb_object')
-            graph: GraphDB instance with create_node / create_relationship methods
+            graph: GraphDB instance with merge_nodes / merge_relationships methods
+            removed_story_ids: UserStory db ids whose nodes should be deleted first
+                (incremental re-analysis sends only the delta)
         """
+        # 0. Drop nodes of removed / superseded user stories
+        if removed_story_ids:
+            graph.delete_nodes("UserStory", "id", removed_story_ids)
+
         # 1. Persist user stories (from phase1 output)
-        for us in phase1_output.get("concepts", []):
-            story_uuid = str(uuid.uuid4())
-            story_text = us.get("original_text")
+        story_rows = [
+            # node id is the UserStory db id so later incremental runs can address it;
             # phase1 may provide an id for the phase1 concept; preserve as phase1_id
-            phase1_id = us.get("id")
-            graph.create_node(
-                "UserStory",
-                {"id": story_uuid, "phase1_id": phase1_id, "text": story_text},
-                key="id"
-            )
+            {"id": us.get("db_id") or str(uuid.uuid4()), "phase1_id": us.get("id"), "text": us.get("original_text")}
+            for us in phase1_output.get("concepts", [])
+        ]
+        graph.merge_nodes("UserStory", "id", story_rows)
 
         # 2. Persist Role - Action - Object relationships (from phase3 output)
+        roles = {}
+        objects = {}
+        relationships = []
         for svo in phase3_output.get("subject_verb_object", []):
             subj = svo.get("subject")
             verb = svo.get("verb")
             obj = svo.get("object")
 
             if subj and obj and verb:
-                # Create role and object nodes (merge by name)
-                graph.create_node("Role", {"name": subj}, key="name")
-                graph.create_node("Object", {"name": obj}, key="name")
-
-                # Create relationship with verb stored in relationship properties
-                graph.create_relationship(
-                    start_label="Role", start_key="name", start_val=subj,
-                    rel_type="ACTION",
-                    end_label="Object", end_key="name", end_val=obj,
-                    props={"verb": verb}
-                )
+                # Role and object nodes are merged by name
+                roles[subj] = {"name": subj}
+                objects[obj] = {"name": obj}
+                # verb stored in relationship properties
+                relationships.append({"start": subj, "end": obj, "props": {"verb": verb}})
+
+        graph.merge_nodes("Role", "name", list(roles.values()))
+        graph.merge_nodes("Object", "name", list(objects.values()))
+        graph.merge_relationships(
+            start_label="Role", start_key="name",
+            rel_type="ACTION",
+            end_label="Object", end_key="name",
+            rows=relationships
+        )
@@ -0,0 +1,202 @@
+"""Profiling theo request cho POST /api/analyze.
+
+Hai chế độ, kết quả lưu trong PROFILE_DIR theo ProcessingSession id (hoặc một id sinh
+ra nếu run lỗi trước khi có kết quả):
+
+- ``cprofile``: cProfile của worker thread chạy pipeline -> ``{session_id}.prof``
+  (đọc bằng ``python -m pstats`` hoặc snakeviz).
+- ``sample``: lấy mẫu stack của worker thread mỗi PROFILE_SAMPLE_INTERVAL giây ->
+  ``{session_id}.collapsed.txt`` (collapsed stacks, dùng trực tiếp với flamegraph.pl
+  hoặc speedscope). Overhead thấp hơn cProfile, phù hợp với payload lớn.
+
+PROFILE_DIR được dọn sau mỗi lần lưu: giữ tối đa PROFILE_MAX_FILES file, bỏ file cũ
+hơn PROFILE_MAX_AGE_SECONDS.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from constant import PROFILE_DIR, PROFILE_MAX_AGE_SECONDS, PROFILE_MAX_FILES, PROFILE_SAMPLE_INTERVAL
+
+PROFILE_MODES = {"cprofile": ".prof", "sample": ".collapsed.txt"}
+
+# Chỉ một cProfile được active trong process (Python 3.12+ ném lỗi nếu có hai)
+_cprofile_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Đang có một request khác chạy cProfile."""
+
+
+class StackSampler:
+    """Lấy mẫu stack của một thread, đếm theo collapsed stack ``a;b;c``."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = max(interval, 0.001)
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._collapse(frame)] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _session_id(result: Any) -> Optional[str]:
+    if isinstance(result, dict):
+        return (result.get("phase1") or {}).get("session_id")
+    return None
+
+
+def get_profile_path(session_id: str) -> Optional[Tuple[str, str]]:
+    """(path, mode) của profile đã lưu cho session, None nếu không có."""
+    try:
+        session_id = str(uuid.UUID(session_id))  # chặn path traversal
+    except ValueError:
+        return None
+    for mode, ext in PROFILE_MODES.items():
+        path = os.path.join(PROFILE_DIR, f"{session_id}{ext}")
+        if os.path.isfile(path):
+            return path, mode
+    return None
+
+
+def _save_profile_info(session_id: str, info: Dict[str, Any]):
+    """Ghi thông tin profile vào ProcessingSession.metadata_info['profile']."""
+    from database import DatabaseSession
+    from models.models import ProcessingSession
+
+    try:
+        with DatabaseSession() as session:
+            processing_session = session.query(ProcessingSession).filter_by(id=session_id).first()
+            if processing_session:
+                meta = dict(processing_session.metadata_info or {})
+                meta["profile"] = info
+                processing_session.metadata_info = meta
+    except Exception as e:
+        logging.warning(f"⚠️ Failed to store profile info for session {session_id}: {e}")
+
+
+def prune_profiles(max_files: int = None, max_age_seconds: float = None) -> int:
+    """Xoá profile cũ trong PROFILE_DIR (quá tuổi, hoặc ngoài max_files file mới nhất); trả về số file đã xoá."""
+    max_files = PROFILE_MAX_FILES if max_files is None else max_files
+    max_age_seconds = PROFILE_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(tuple(PROFILE_MODES.values()))]
+    except OSError:
+        return 0
+    files = []
+    for name in names:
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    files.sort(reverse=True)
+
+    cutoff = time.time() - max_age_seconds if max_age_seconds > 0 else None
+    removed = 0
+    for i, (mtime, path) in enumerate(files):
+        if (max_files > 0 and i >= max_files) or (cutoff is not None and mtime < cutoff):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logging.warning(f"⚠️ Failed to remove old profile {path}: {e}")
+    return removed
+
+
+def _store_profile(mode: str, dump: Callable[[str], None], session_id: Optional[str], seconds: float,
+                   completed: bool) -> Optional[Dict[str, Any]]:
+    """Ghi profile ra PROFILE_DIR (theo session id, hoặc id mới nếu không có) rồi dọn thư mục."""
+    profile_id = session_id or str(uuid.uuid4())
+    path = os.path.join(PROFILE_DIR, f"{profile_id}{PROFILE_MODES[mode]}")
+    try:
+        dump(path)
+    except Exception as e:
+        # Không che lỗi gốc của pipeline
+        logging.error(f"❌ Failed to write {mode} profile {path}: {e}")
+        return None
+
+    info = {"mode": mode, "seconds": seconds, "url": f"/api/analyze/{profile_id}/profile"}
+    if session_id:
+        _save_profile_info(session_id, {**info, "path": path})
+    if completed:
+        logging.info(f"💾 Stored {mode} profile for session {profile_id} ({seconds}s)")
+    else:
+        logging.error(f"❌ Profiled run failed after {seconds}s, {mode} profile stored as {info['url']}")
+    prune_profiles()
+    return info
+
+
+def run_profiled(mode: str, fn: Callable, *args, **kwargs) -> Any:
+    """Chạy fn (trong worker thread hiện tại) dưới profiler và lưu profile theo session id.
+
+    Kết quả của fn được trả về nguyên vẹn, thêm key ``profile`` (mode, download url).
+    Profile được lưu cả khi fn raise (id sinh mới, xem log).
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    if mode == "cprofile":
+        if not _cprofile_lock.acquire(blocking=False):
+            raise ProfilerBusyError("Another request is being profiled with cprofile, retry later")
+        profiler = cProfile.Profile()
+        dump = profiler.dump_stats
+    else:
+        sampler = StackSampler(threading.get_ident())
+        dump = sampler.dump
+
+    started = time.perf_counter()
+    result = None
+    completed = False
+    try:
+        if mode == "cprofile":
+            try:
+                result = profiler.runcall(fn, *args, **kwargs)
+            finally:
+                _cprofile_lock.release()
+        else:
+            with sampler:
+                result = fn(*args, **kwargs)
+        completed = True
+    finally:
+        seconds = round(time.perf_counter() - started, 4)
+        info = _store_profile(mode, dump, _session_id(result), seconds, completed)
+
+    if info is not None and isinstance(result, dict):
+        result["profile"] = info
+    return result
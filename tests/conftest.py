@@ -0,0 +1,134 @@
+import os
+import re
+
+# Test luôn chạy trên backend trong process, không cần MySQL / Neo4j
+# (đặt trước khi constant.py được import)
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["GRAPH_BACKEND"] = "memory"
+os.environ.pop("DATABASE_URL", None)
+
+import pytest
+import spacy
+from spacy.language import Language
+from spacy.tokens import Doc
+
+_VERBS = {"want", "like", "reset", "view", "approve", "login", "export", "upload", "edit", "save", "need", "click", "see"}
+_DETERMINERS = {"a", "an", "the", "my", "our", "every"}
+_PRONOUNS = {"i", "we"}
+_CLAUSE_MARKERS = {"when", "so", "because", "if"}
+
+
+def stub_parse(doc) -> Doc:
+    """Parser luật đơn giản cho câu user story, để test Phase1 không cần model spaCy.
+
+    Gán POS / dependency giống en_core_web_sm ở các điểm Phase1 dùng: "as" (prep) -> role
+    (pobj), chủ ngữ (nsubj), động từ chính (ROOT) -> xcomp, dobj và mệnh đề advcl
+    ("when / so that ...").
+    """
+    words = [t.text for t in doc]
+    spaces = [bool(t.whitespace_) for t in doc]
+    lower = [w.lower() for w in words]
+    pos = []
+    for w in lower:
+        if not re.match(r"\w", w):
+            pos.append("PUNCT")
+        elif w in _VERBS:
+            pos.append("VERB")
+        elif w in _PRONOUNS:
+            pos.append("PRON")
+        elif w in _DETERMINERS:
+            pos.append("DET")
+        elif w in ("as", "to", "that", "can", "of", "on") or w in _CLAUSE_MARKERS:
+            pos.append("ADP")
+        else:
+            pos.append("NOUN")
+
+    # Mệnh đề phụ: từ marker đến dấu câu / hết câu, nếu có động từ
+    clause = [None] * len(words)
+    i = 0
+    while i < len(words):
+        if lower[i] in _CLAUSE_MARKERS and i > 0:
+            end = i
+            while end < len(words) and pos[end] != "PUNCT":
+                end += 1
+            verbs = [k for k in range(i, end) if pos[k] == "VERB"]
+            if verbs:
+                for k in range(i, end):
+                    clause[k] = verbs[0]
+            i = end
+        i += 1
+
+    main = [k for k in range(len(words)) if pos[k] == "VERB" and clause[k] is None]
+    root = main[0] if main else 0
+    heads = [root] * len(words)
+    deps = ["dep"] * len(words)
+    deps[root] = "ROOT" if main else "dep"
+    action = root
+    if len(main) > 1 and lower[main[1] - 1] == "to":
+        action = main[1]
+        deps[action] = "xcomp"
+
+    for k, w in enumerate(lower):
+        if clause[k] is not None:
+            if k == clause[k]:
+                deps[k] = "advcl"
+            else:
+                heads[k] = clause[k]
+            continue
+        if w in _PRONOUNS and k < root:
+            deps[k] = "nsubj"
+        elif w == "as" and k < root:
+            deps[k] = "prep"
+            noun = next((j for j in range(k + 1, len(words)) if pos[j] == "NOUN"), None)
+            if noun is not None:
+                heads[noun] = k
+                deps[noun] = "pobj"
+                for j in range(k + 1, noun):
+                    heads[j] = noun
+    # Không có "I": danh từ cuối trước động từ chính là chủ ngữ
+    if main and "nsubj" not in deps:
+        subject = next((k for k in range(root - 1, -1, -1) if pos[k] == "NOUN" and deps[k] == "dep"), None)
+        if subject is not None:
+            deps[subject] = "nsubj"
+            for j in range(subject - 1, -1, -1):
+                if pos[j] != "DET":
+                    break
+                heads[j] = subject
+    # dobj: cụm danh từ ngay sau động từ action (det + noun liền nhau, noun cuối là head)
+    if main:
+        start = action + 1
+        end = start
+        while end < len(words) and pos[end] in ("DET", "NOUN") and clause[end] is None:
+            end += 1
+        if any(pos[j] == "NOUN" for j in range(start, end)):
+            head = end - 1
+            heads[head] = action
+            deps[head] = "dobj"
+            for j in range(start, head):
+                heads[j] = head
+    lemmas = lower
+    return Doc(doc.vocab, words=words, spaces=spaces, heads=heads, deps=deps, pos=pos, lemmas=lemmas)
+
+
+class StubParser:
+    """Component spaCy bọc stub_parse, đếm số lần parse."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, doc):
+        self.calls += 1
+        return stub_parse(doc)
+
+
+@Language.factory("stub_parser")
+def create_stub_parser(nlp, name):
+    return StubParser()
+
+
+@pytest.fixture
+def stub_nlp():
+    """spacy.blank("en") + stub parser; số lần parse: nlp.get_pipe("stub_parser").calls."""
+    nlp = spacy.blank("en")
+    nlp.add_pipe("stub_parser")
+    return nlp
@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import constant
+from database import DatabaseManager, DatabaseSession, get_database_manager
+from graphdb import InMemoryGraphDB, get_graph_db
+from migrations import load_migrations, pending_migrations, run_migrations
+from models.models import ProcessingSession
+
+
+@pytest.fixture
+def graph():
+    graph = InMemoryGraphDB()
+    graph.ensure_schema()
+    return graph
+
+
+def test_memory_backends_are_selected():
+    assert constant.STORAGE_BACKEND == "memory"
+    assert constant.DATABASE_URL == "sqlite://"
+    assert get_database_manager().engine.dialect.name == "sqlite"
+    assert isinstance(get_graph_db(), InMemoryGraphDB)
+
+
+def test_merge_nodes_by_key(graph):
+    assert graph.merge_nodes("Role", "name", [{"name": "user", "count": 1}, {"name": "admin"}]) == 2
+    graph.merge_nodes("Role", "name", [{"name": "user", "count": 2, "note": None}, {"name": None}])
+    graph.create_node("Role", {"name": "admin", "count": 5}, key="name")
+
+    roles = sorted(graph.list_nodes("Role"), key=lambda n: n["name"])
+    assert roles == [{"name": "admin", "count": 5}, {"name": "user", "count": 2}]
+    assert graph.get_node("Role", "name", "user") == {"name": "user", "count": 2}
+    assert graph.update_node("Role", "name", "missing", {"count": 1}) is None
+
+
+def test_relationships_only_between_existing_nodes(graph):
+    graph.merge_nodes("UserStory", "id", [{"id": "s1"}, {"id": "s2"}])
+    graph.merge_nodes("Role", "name", [{"name": "user"}])
+    graph.merge_relationships("UserStory", "id", "HAS_ROLE", "Role", "name", [
+        {"start": "s1", "end": "user", "props": {"weight": 1}},
+        {"start": "s2", "end": "admin"},  # Role admin chưa có: bỏ qua như MATCH ... MERGE
+        {"start": "s3", "end": "user"},
+    ])
+    # MERGE lần nữa không tạo quan hệ trùng, chỉ cập nhật properties
+    graph.create_relationship("UserStory", "id", "s1", "HAS_ROLE", "Role", "name", "user", {"weight": 2})
+
+    assert graph.list_relationships("UserStory", "Role") == [
+        {"start": {"id": "s1"}, "relationship": {"weight": 2}, "end": {"name": "user"}},
+    ]
+
+
+def test_delete_is_detach_delete(graph):
+    graph.merge_nodes("UserStory", "id", [{"id": "s1"}, {"id": "s2"}])
+    graph.merge_nodes("Role", "name", [{"name": "user"}])
+    graph.merge_nodes("Object", "name", [{"name": "report"}])
+    for story in ("s1", "s2"):
+        graph.create_relationship("UserStory", "id", story, "HAS_ROLE", "Role", "name", "user")
+    graph.create_relationship("UserStory", "id", "s1", "HAS_OBJECT", "Object", "name", "report")
+
+    assert graph.delete_nodes("UserStory", "id", ["s1", None, "missing"]) == 2
+    assert [n["id"] for n in graph.list_nodes("UserStory")] == ["s2"]
+    assert [(r["start"]["id"], r["end"]) for r in graph.list_relationships()] == [("s2", {"name": "user"})]
+
+    assert graph.delete_node("Role", "name", "user") == 1
+    assert graph.delete_node("Role", "name", "user") == 0
+    assert graph.list_relationships() == []
+    assert graph.list_nodes("Object") == [{"name": "report"}]
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "file"])
+def test_migrations_apply_on_sqlite(tmp_path, url):
+    if url == "file":
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_engine(url, **DatabaseManager._engine_options(url))
+
+    applied = run_migrations(engine)
+
+    # 0003 (BINARY(16) UUID) chỉ áp dụng cho MySQL với UUID_STORAGE=binary
+    assert applied == [m.VERSION for m in load_migrations() if m.VERSION != "0003"]
+    assert run_migrations(engine) == []
+    assert [m.VERSION for m in pending_migrations(engine)] == ["0003"]
+
+    inspector = inspect(engine)
+    for table in ("user_stories", "concepts", "processing_sessions", "concept_frequency",
+                  "concept_synonyms", "concept_similarities", "story_minhashes", "story_lsh_buckets"):
+        assert inspector.has_table(table)
+    unique = {ix["name"] for table in ("concept_frequency", "concept_synonyms", "concept_similarities")
+              for ix in inspector.get_indexes(table) if ix["unique"]}
+    assert {"uq_concept_frequency_type_text", "uq_concept_synonyms_concept_synonym",
+            "uq_concept_similarities_pair"} <= unique
+
+
+def test_database_manager_in_memory_shares_one_database():
+    db_manager = DatabaseManager("sqlite://")
+    db_manager.create_tables()
+    with DatabaseSession(db_manager) as session:
+        session.add(ProcessingSession(session_name="s", total_stories=1, phase_completed=0, status="started"))
+    # Session khác (connection khác của pool) vẫn thấy dữ liệu nhờ StaticPool
+    with db_manager.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM processing_sessions")).scalar() == 1
@@ -0,0 +1,96 @@
+import pytest
+
+from database import DatabaseManager, DatabaseSession
+from services.phase2 import helpers
+from services.phase2.helpers import (
+    attach_frequency_to_concepts,
+    count_concept_frequency,
+    decrement_concept_frequencies,
+    get_concept_frequencies,
+    top_concept_frequencies,
+    upsert_concept_frequencies,
+)
+
+
+@pytest.fixture(params=["native", "portable"])
+def db_manager(request, monkeypatch):
+    """SQLite in-memory; "portable" ép đường read-then-update/insert cho dialect không có upsert."""
+    if request.param == "portable":
+        monkeypatch.setattr(helpers, "_frequency_upsert", lambda session, rows: None)
+    db_manager = DatabaseManager("sqlite://")
+    db_manager.create_tables()
+    return db_manager
+
+
+def _stored(db_manager):
+    with DatabaseSession(db_manager) as session:
+        return get_concept_frequencies(session, {
+            "role": {"user": 0, "admin": 0},
+            "action": {"view": 0, "edit": 0},
+            "object": {"report": 0, "user": 0},
+        })
+
+
+def test_upsert_adds_counts_across_runs(db_manager):
+    with DatabaseSession(db_manager) as session:
+        assert upsert_concept_frequencies(session, {"role": {"user": 2, "admin": 1}, "action": {"view": 1}}) == 3
+    with DatabaseSession(db_manager) as session:
+        # batch_size=1: mỗi row một câu lệnh; n = 0 bị bỏ qua
+        upsert_concept_frequencies(session, {"role": {"user": 3}, "action": {"view": 1, "edit": 0},
+                                             "object": {"user": 4}}, batch_size=1)
+
+    assert _stored(db_manager) == {
+        "role": {"user": 5, "admin": 1},
+        "action": {"view": 2},
+        "object": {"user": 4},
+    }
+
+
+def test_decrement_clamps_at_zero(db_manager):
+    with DatabaseSession(db_manager) as session:
+        upsert_concept_frequencies(session, {"role": {"user": 3, "admin": 1}, "object": {"report": 2}})
+    with DatabaseSession(db_manager) as session:
+        decrement_concept_frequencies(session, {"role": {"user": 1, "admin": 5}, "object": {"report": 2, "missing": 1}},
+                                      batch_size=1)
+
+    assert _stored(db_manager) == {"role": {"user": 2, "admin": 0}, "action": {}, "object": {"report": 0}}
+    with DatabaseSession(db_manager) as session:
+        top = top_concept_frequencies(session, limit=10)
+    assert top == {"role": [{"concept": "user", "frequency": 2}], "action": [], "object": []}
+
+    # Tăng lại sau khi về 0
+    with DatabaseSession(db_manager) as session:
+        upsert_concept_frequencies(session, {"role": {"admin": 1}})
+    assert _stored(db_manager)["role"] == {"user": 2, "admin": 1}
+
+
+def test_attach_frequency_keeps_int_and_adds_by_type():
+    phase1_concepts = [
+        {"role": "user", "action": "view", "object": "report"},
+        {"role": "user", "action": "edit", "object": "report"},
+        {"role": "admin", "action": "view", "object": ""},
+    ]
+    records = [
+        {"text": "user", "concept_and_domain": "role (general)"},
+        {"name": "view", "concept_and_domain": "feature"},
+        {"text": "report", "concept_and_domain": "object (general)"},
+        {"text": "unknown", "concept_and_domain": "object (general)"},
+    ]
+    frequencies = count_concept_frequency(phase1_concepts + records)
+    assert frequencies == {
+        "role": {"user": 3, "admin": 1},
+        "action": {"view": 3, "edit": 1},
+        "object": {"report": 3, "unknown": 1},
+    }
+
+    attach_frequency_to_concepts(phase1_concepts, frequencies)
+    attach_frequency_to_concepts(records, frequencies)
+
+    # Concept Phase1: frequency là của object
+    assert [c["frequency"] for c in phase1_concepts] == [3, 3, 0]
+    assert phase1_concepts[0]["frequency_by_type"] == {"role": 3, "action": 3, "object": 3}
+    assert phase1_concepts[2]["frequency_by_type"] == {"role": 1, "action": 3}
+    # Record final_output: frequency là của name / text theo type của nó
+    assert [r["frequency"] for r in records] == [3, 3, 3, 1]
+    assert all(isinstance(c["frequency"], int) for c in phase1_concepts + records)
+    assert records[0]["frequency_by_type"] == {}
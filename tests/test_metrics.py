@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+
+
+def test_failed_statements_are_recorded_and_do_not_leak():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    run = metrics.RunMetrics()
+    run.phase = "phase1"
+    token = metrics._current_run.set(run)
+    try:
+        with engine.connect() as conn:
+            for _ in range(2):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM missing_table"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info["query_started"] == []
+    finally:
+        metrics._current_run.reset(token)
+
+    stats = run.to_dict()["phases"]["phase1"]
+    assert (stats["db_queries"], stats["db_errors"]) == (3, 2)
+    assert 'db_query_errors_total{phase="phase1"}' in metrics.REGISTRY.render()
@@ -0,0 +1,52 @@
+import pytest
+
+from database import DatabaseManager
+from services.phase1 import Phase1
+
+STORIES = [
+    "As a user, I want to reset my password so that I can login",
+    "As a manager, I want to approve requests when I login",
+    "Password reset page",
+    "As a user, I want to view the report",
+    "",
+    "As an admin, I want to upload a document.",
+    "As a user, I want to reset my password so that I can login",
+    "The admin can view every report",
+    "As a customer, I want to edit my profile because I want to save time",
+    "As a user, I want to view the report",
+    "As a user, I want to export the data",
+]
+
+
+@pytest.fixture
+def phase1(stub_nlp):
+    db_manager = DatabaseManager("sqlite://")
+    db_manager.create_tables()
+    phase = Phase1(model_name="blank:en", db_manager=db_manager, profile="full")
+    phase.nlp = stub_nlp
+    # Không dùng parse cache để cả hai chế độ đều thực sự parse
+    phase.cache = None
+    return phase
+
+
+def _concepts(output):
+    return [(c["original_text"], c["role"], c["action"], c["object"]) for c in output["concepts"]]
+
+
+@pytest.mark.parametrize("batch_size, insert_batch_size", [(4, 3), (64, 500)])
+def test_sequential_and_batched_give_same_concepts(phase1, batch_size, insert_batch_size):
+    sequential = phase1.process_text(STORIES, batch_size=1, n_process=1, insert_batch_size=insert_batch_size)
+    batched = phase1.process_text(STORIES, batch_size=batch_size, n_process=1, insert_batch_size=insert_batch_size)
+
+    assert _concepts(batched) == _concepts(sequential)
+    assert [c["original_text"] for c in sequential["concepts"]] == [s.strip() for s in STORIES if s.strip()]
+    for key in ("roles", "actions", "objects"):
+        assert batched[key] == sequential[key]
+
+
+def test_duplicate_stories_are_parsed_once(phase1, stub_nlp):
+    parser = stub_nlp.get_pipe("stub_parser")
+    phase1.process_text(STORIES, batch_size=4, n_process=1)
+    distinct = {s for s in STORIES if s.strip()}
+    with_advcl = {s for s in distinct if any(w in s for w in (" when ", " so that ", " because "))}
+    assert parser.calls == len(distinct) + len(with_advcl)
@@ -0,0 +1,68 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from services import profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_save_profile_info", lambda session_id, info: None)
+    return tmp_path
+
+
+def _pipeline(session_id):
+    sum(i * i for i in range(20000))
+    return {"phase1": {"session_id": session_id}}
+
+
+@pytest.mark.parametrize("mode", sorted(profiling.PROFILE_MODES))
+def test_profile_is_stored_by_session_id(profile_dir, mode):
+    session_id = str(uuid.uuid4())
+    result = profiling.run_profiled(mode, _pipeline, session_id)
+
+    assert result["profile"]["url"] == f"/api/analyze/{session_id}/profile"
+    path, found_mode = profiling.get_profile_path(session_id)
+    assert found_mode == mode
+    assert os.path.dirname(path) == str(profile_dir)
+
+
+@pytest.mark.parametrize("mode", sorted(profiling.PROFILE_MODES))
+def test_failed_run_is_still_profiled(profile_dir, mode):
+    def failing():
+        sum(i * i for i in range(20000))
+        raise RuntimeError("phase2 failed")
+
+    with pytest.raises(RuntimeError, match="phase2 failed"):
+        profiling.run_profiled(mode, failing)
+
+    files = os.listdir(profile_dir)
+    assert len(files) == 1
+    profile_id = files[0][:-len(profiling.PROFILE_MODES[mode])]
+    assert profiling.get_profile_path(profile_id) == (str(profile_dir / files[0]), mode)
+    # cProfile được giải phóng cho request sau
+    assert profiling._cprofile_lock.acquire(blocking=False)
+    profiling._cprofile_lock.release()
+
+
+def test_prune_profiles_keeps_newest_and_drops_old(profile_dir):
+    now = time.time()
+    for i in range(5):
+        path = profile_dir / f"{uuid.uuid4()}.prof"
+        path.write_text("x")
+        os.utime(path, (now - i * 60, now - i * 60))
+    old = profile_dir / f"{uuid.uuid4()}.collapsed.txt"
+    old.write_text("x")
+    os.utime(old, (now - 3600, now - 3600))
+    (profile_dir / "notes.txt").write_text("kept")
+
+    assert profiling.prune_profiles(max_files=0, max_age_seconds=1800) == 1
+    assert not old.exists()
+    assert profiling.prune_profiles(max_files=3, max_age_seconds=0) == 2
+    kept = sorted(os.listdir(profile_dir))
+    assert len(kept) == 4 and "notes.txt" in kept
+    newest = max((p for p in profile_dir.iterdir() if p.suffix == ".prof"), key=os.path.getmtime)
+    assert newest.name in kept
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from services.phase3.similarity import SimilarityEngine
+from services.phase3.wordnet_index import LemmaIndex
+
+
+def _random_dag(seed, size=60, roots=2):
+    """LemmaIndex giả: synset i (>= roots) có 1-2 hypernym ngẫu nhiên trong các synset trước nó."""
+    rng = random.Random(seed)
+    hypernyms = {}
+    for offset in range(roots, size):
+        parents = rng.sample(range(offset), k=min(offset, rng.choice((1, 1, 2))))
+        hypernyms[("n", offset)] = tuple(parents)
+    lemma_synsets = {f"c{offset}": {"n": (offset,)} for offset in range(size)}
+    # Vài concept dùng chung synset
+    for alias, offset in (("alias one", 7), ("alias two", 7), ("alias three", size - 1)):
+        lemma_synsets[alias] = {"n": (offset,)}
+    synset_lemmas = {("n", offset): (f"c{offset}",) for offset in range(size)}
+    return LemmaIndex(lemma_synsets, synset_lemmas, hypernyms=hypernyms)
+
+
+def _brute_force(index, concepts, threshold):
+    """Wu-Palmer theo định nghĩa, từng cặp một."""
+    def depth(offset):
+        return 1 + max((depth(p) for p in index.hypernyms.get(("n", offset), ())), default=0)
+
+    def ancestors(offset):
+        result = {offset}
+        for parent in index.hypernyms.get(("n", offset), ()):
+            result |= ancestors(parent)
+        return result
+
+    synset_of = {c: index.first_synset(c, "n") for c in concepts}
+    result = {}
+    names = sorted(set(concepts))
+    for i, a in enumerate(names):
+        for b in names[i + 1:]:
+            shared = ancestors(synset_of[a]) & ancestors(synset_of[b])
+            if not shared:
+                continue
+            score = 2.0 * max(depth(s) for s in shared) / (depth(synset_of[a]) + depth(synset_of[b]))
+            if score >= threshold:
+                result[(a, b)] = round(score, 4)
+    return result
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("threshold", [0.0, 0.5, 0.8])
+@pytest.mark.parametrize("block_size", [1, 7, 1000])
+def test_pairwise_matches_brute_force(seed, threshold, block_size):
+    index = _random_dag(seed)
+    concepts = list(index.lemma_synsets)
+    engine = SimilarityEngine(index=index, block_size=block_size)
+
+    pairs = engine.pairwise(concepts, pos="n", threshold=threshold, top_k=None)
+
+    assert {(a, b): score for a, b, score in pairs} == _brute_force(index, concepts, threshold)
+    assert all(a < b for a, b, _ in pairs)
+    assert [score for _, _, score in pairs] == sorted((score for _, _, score in pairs), reverse=True)
+
+
+def test_pairwise_top_k_keeps_best_pairs():
+    index = _random_dag(4)
+    concepts = [f"c{offset}" for offset in range(60)]
+    engine = SimilarityEngine(index=index, block_size=16)
+    reference = _brute_force(index, concepts, 0.3)
+
+    pairs = engine.pairwise(concepts, pos="n", threshold=0.3, top_k=3)
+
+    for a, b, score in pairs:
+        assert reference[(a, b)] == score
+    # Mỗi concept có ít nhất một cặp tốt nhất của nó trong kết quả
+    kept = {(a, b) for a, b, _ in pairs}
+    for concept in concepts:
+        own = {pair: score for pair, score in reference.items() if concept in pair}
+        if own:
+            best = max(own.values())
+            assert any(pair in kept for pair, score in own.items() if score == best)
+
+
+def test_unknown_concepts_are_skipped():
+    index = _random_dag(5, size=10)
+    engine = SimilarityEngine(index=index)
+    assert engine.pairwise(["not in wordnet", "missing"], pos="n") == []
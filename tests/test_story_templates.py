@@ -0,0 +1,56 @@
+import pytest
+
+from services.phase1.helpers import fast_path_story
+from services.phase1.templates import match_story
+
+
+@pytest.mark.parametrize("story, template, expected", [
+    ("As a user, I want to view the report so that I can save time",
+     "as_a", {"role": "user", "action": "view", "object": "the report", "benefit": "I can save time"}),
+    ("As an admin I would like to upload a document.",
+     "as_a", {"role": "admin", "action": "upload", "object": "a document"}),
+    ("As a manager, I can approve requests",
+     "as_a", {"role": "manager", "action": "approve", "object": "requests"}),
+    ("As a user, I need a dashboard showing sales.",
+     "as_a_need", {"role": "user", "action": "need", "object": "a dashboard showing sales"}),
+    ("As a user, I want the report exported",
+     "as_a_need", {"role": "user", "object": "the report exported"}),
+    ("In order to plan stock, as a buyer, I want to view the sales report so that I can order",
+     "in_order_to", {"benefit": "plan stock", "role": "buyer", "action": "view", "object": "the sales report"}),
+    ("Given I am a registered member, when I click the export button, then the invoice is downloaded",
+     "given_when_then", {"role": "registered member", "action": "click", "object": "the export button",
+                         "outcome": "the invoice is downloaded"}),
+    ("Given the admin is logged in, when I open the dashboard then I see charts",
+     "given_when_then", {"role": "admin", "action": "open", "object": "the dashboard", "outcome": "I see charts"}),
+])
+def test_match_story_components(story, template, expected):
+    matched = match_story(story)
+    assert matched["template"] == template
+    assert matched["components"] == expected
+
+
+@pytest.mark.parametrize("story", [
+    "Export invoices as PDF",
+    "The admin can view every report",
+    "As a user, I want to login",
+])
+def test_match_story_no_template(story):
+    assert match_story(story) is None
+
+
+def test_fast_path_uses_noun_phrase_object():
+    result = fast_path_story("As a User, I want to view the Monthly Report so that I can save time")
+    assert (result["role"], result["action"], result["object"]) == ("user", "view", "the monthly report")
+    assert result["visual_result"]["confidence_score"] > 0.8
+
+
+@pytest.mark.parametrize("story", [
+    "As a user, I want to view the report and as an admin, I want to edit it",
+    "As a user, I want to view the report and edit it",
+    "As a manager, I want to be able to export data, so that I can plan",
+    "As an admin, I want to comment on the ticket.",
+    "As a user, I want the report exported",
+    "Export invoices as PDF",
+])
+def test_fast_path_falls_back_to_parse(story):
+    assert fast_path_story(story) is None
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from constant import PHASE1_PROFILE, PRELOAD_NLP_MODELS, SPACY_MODEL
+
+
+def _warm_database():
+    """Áp dụng migrations và mở sẵn connection pool."""
+    from database import init_database
+
+    db_manager = init_database()
+    if not db_manager.test_connection():
+        raise RuntimeError("database connection test failed")
+
+
+def _warm_graph():
+    """Kết nối Neo4j và đảm bảo constraint cho các key MERGE."""
+    from graphdb import get_graph_db
+
+    graph = get_graph_db()
+    graph.verify_connectivity()
+    graph.ensure_schema()
+
+
+def _warm_nlp():
+    """Load spaCy model vào ModelRegistry (pipeline của PHASE1_PROFILE và pipeline đầy đủ cho streaming)."""
+    from services.model_registry import get_model_registry
+    from services.phase1.helpers import pipeline_disabled
+
+    if PRELOAD_NLP_MODELS:
+        registry = get_model_registry()
+        registry.preload(SPACY_MODEL, pipeline_disabled(PHASE1_PROFILE))
+        registry.preload(SPACY_MODEL)
+
+
+def _warm_wordnet():
+    """Dựng (hoặc load từ file) lemma index WordNet cho Phase3."""
+    from services.phase3.wordnet_index import get_lemma_index
+
+    if not get_lemma_index().available:
+        # Phase3 vẫn chạy (không có synonyms) nhưng bước này không được tính là ready
+        raise RuntimeError("WordNet corpus unavailable: Phase3 synonyms disabled")
+
+
+# Bước warm-up phải ready trước khi nhận request pipeline: schema phải được migrate
+# (Phase1 không còn gọi create_tables trong request path)
+SERVING_STEPS = ("database",)
+
+
+class WarmupState:
+    """Trạng thái warm-up của các dependency (database, Neo4j, spaCy, WordNet) khi app khởi động."""
+
+    def __init__(self, steps: Dict[str, Callable[[], None]]):
+        self.steps = steps
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"ready": False, "seconds": None, "error": None} for name in steps
+        }
+        self.running = False
+        self._lock = threading.Lock()
+
+    def _claim(self) -> bool:
+        """Đánh dấu đang warm-up; False nếu đã có một lần warm-up khác đang chạy."""
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            return True
+
+    def run(self, names: Optional[list] = None) -> bool:
+        """Chạy các bước warm-up (mặc định: những bước chưa ready); False nếu đang có warm-up khác chạy."""
+        if not self._claim():
+            return False
+        self._run_steps(names)
+        return True
+
+    def _run_steps(self, names: Optional[list] = None):
+        try:
+            for name in names or [n for n, c in self.components.items() if not c["ready"]]:
+                self._run_step(name)
+        finally:
+            with self._lock:
+                self.running = False
+
+    def _run_step(self, name: str):
+        started = time.perf_counter()
+        try:
+            self.steps[name]()
+            self.components[name] = {"ready": True, "seconds": round(time.perf_counter() - started, 4), "error": None}
+            logging.info(f"✅ Warm-up '{name}' done in {self.components[name]['seconds']}s")
+        except Exception as e:
+            self.components[name] = {"ready": False, "seconds": round(time.perf_counter() - started, 4), "error": str(e)}
+            logging.error(f"❌ Warm-up '{name}' failed: {e}")
+
+    def start_background(self) -> Optional[threading.Thread]:
+        """Warm-up trong thread riêng để app vẫn trả lời health check trong lúc khởi động.
+
+        `running` được đặt trước khi trả về nên request tới ngay sau đó đã thấy trạng thái
+        warming up; trả về None nếu đang có warm-up khác chạy.
+        """
+        if not self._claim():
+            return None
+        thread = threading.Thread(target=self._run_steps, name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, names: Optional[Iterable[str]] = None) -> bool:
+        """Tất cả các bước (hoặc các bước `names`) đã ready."""
+        names = self.components if names is None else names
+        return all(self.components[name]["ready"] for name in names)
+
+    def can_serve(self) -> bool:
+        """Pipeline chỉ chạy khi không warm-up và các bước bắt buộc (SERVING_STEPS) đã ready."""
+        return not self.running and self.is_ready(SERVING_STEPS)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "warming_up": self.running,
+            "components": {name: dict(c) for name, c in self.components.items()},
+        }
+
+
+# Singleton pattern cho warm-up state
+_warmup_state: Optional[WarmupState] = None
+
+
+def get_warmup_state() -> WarmupState:
+    """Lấy instance của WarmupState (singleton)"""
+    global _warmup_state
+
+    if _warmup_state is None:
+        _warmup_state = WarmupState({
+            "database": _warm_database,
+            "graph": _warm_graph,
+            "nlp": _warm_nlp,
+            "wordnet": _warm_wordnet,
+        })
+
+    return _warmup_state